@@ -0,0 +1,278 @@
+"""Бенчмарк: задержка распознавания речи, пока параллельно разбираются веб-страницы.
+
+Сценарий «веб-поиск, а пользователь продолжает говорить». Звук подаётся
+блоками в реальном темпе. Распознаватель — заглушка: на блок тратит
+--decode-ms вне GIL (как Vosk в C) и завершает фразу каждые
+--phrase-blocks блоков. Одновременно --parse-threads потоков без перерыва
+разбирают HTML: extract_visible_text (BeautifulSoup), а если веб-стек не
+установлен — html.parser из стандартной библиотеки (тоже чистый Python под GIL).
+
+Режимы:
+  idle      — распознавание без нагрузки (эталон);
+  threads   — как агент по умолчанию: очередь блоков и распознаватель в
+              главном потоке, разбор в потоках загрузки того же процесса;
+  processes — SpeechProcess с кольцевым буфером в общей памяти, разбор в
+              пуле из --parse-workers процессов.
+
+Задержка — от записи последнего блока фразы до получения её текста главным
+потоком.
+
+Запуск из корня проекта:
+    python -m bench.concurrent_load [--seconds 10] [--parse-threads 4] [--parse-workers 2]
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from html.parser import HTMLParser
+from typing import Callable, Optional
+
+from main.speech_process import SpeechProcess
+
+SAMPLERATE = 16000
+BLOCK_MS = 100
+BLOCK_BYTES = SAMPLERATE * 2 * BLOCK_MS // 1000
+
+
+class BenchRecognizer:
+    """Заглушка KaldiRecognizer: время декодирования пропорционально длине звука."""
+
+    def __init__(self, samplerate: int, decode_ms: float, phrase_bytes: int):
+        self._decode_sec = decode_ms / 1000.0
+        self._phrase_bytes = phrase_bytes
+        self._bytes = 0
+        self._emitted = 0
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        time.sleep(self._decode_sec * len(data) / BLOCK_BYTES)
+        self._bytes += len(data)
+        return self._bytes // self._phrase_bytes > self._emitted
+
+    def Result(self) -> str:
+        self._emitted = self._bytes // self._phrase_bytes
+        return json.dumps({"text": f"фраза {self._emitted}"}, ensure_ascii=False)
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": ""})
+
+
+class _TextExtractor(HTMLParser):
+    _SKIP = {"script", "style", "noscript", "header", "footer", "nav", "aside"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts: list[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+
+def stdlib_visible_text(html: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    return " ".join(extractor.parts)
+
+
+def _make_page(kb: int) -> str:
+    rows, size, i = [], 0, 0
+    while size < kb * 1024:
+        row = (f"<div class='card'><h2>Раздел {i}</h2><p>Курс на {i % 28 + 1}.03 составил {90 + i % 7},{i % 100} "
+               f"рубля, <b>рост {i % 5}%</b>.</p><ul><li>пункт {i}</li><li>пункт {i + 1}</li></ul>"
+               f"<table><tr><td>{i}</td><td>значение {i * 3}</td></tr></table>"
+               f"<script>var x{i} = {i};</script></div>")
+        rows.append(row)
+        size += len(row.encode("utf-8"))
+        i += 1
+    return f"<html><head><style>p{{}}</style></head><body><nav>меню</nav><main>{''.join(rows)}</main></body></html>"
+
+
+def _parser() -> tuple[str, Callable[[str], str], Optional[Callable[[str], str]]]:
+    """(название, разбор в потоке, разбор в пуле web.parse_pool или None)."""
+    try:
+        from web.web_utils import extract_visible_text
+        from web.parse_pool import visible_text
+        return "web.web_utils.extract_visible_text", extract_visible_text, visible_text
+    except ImportError:
+        return "html.parser (стандартная библиотека)", stdlib_visible_text, None
+
+
+class _ParseLoad:
+    """Потоки, которые без перерыва разбирают страницу, пока не остановлены."""
+
+    def __init__(self, parse: Callable[[str], str], html: str, threads: int):
+        self._stop = threading.Event()
+        self.pages = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, args=(parse, html), daemon=True)
+                         for _ in range(threads)]
+
+    def _run(self, parse, html):
+        while not self._stop.is_set():
+            parse(html)
+            with self._lock:
+                self.pages += 1
+
+    def __enter__(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+
+
+def _produce(write: Callable[[bytes], None], blocks: int, phrase_blocks: int, written: dict) -> None:
+    """Пишет блоки тишины в реальном темпе и отмечает момент окончания каждой фразы."""
+    block = b"\0" * BLOCK_BYTES
+    t0 = time.perf_counter()
+    for i in range(blocks):
+        delay = t0 + i * BLOCK_MS / 1000 - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if (i + 1) % phrase_blocks == 0:
+            written[(i + 1) // phrase_blocks] = time.perf_counter()
+        write(block)
+
+
+def _phrase_id(text: str) -> int:
+    return int(text.rsplit(" ", 1)[-1])
+
+
+def _run_in_process(blocks: int, phrase_blocks: int, decode_ms: float) -> list[float]:
+    """Режимы idle и threads: распознаватель в главном потоке, как в run_main_loop."""
+    rec = BenchRecognizer(SAMPLERATE, decode_ms, phrase_blocks * BLOCK_BYTES)
+    audio: queue.Queue = queue.Queue()
+    written: dict[int, float] = {}
+    producer = threading.Thread(target=_produce, args=(audio.put, blocks, phrase_blocks, written), daemon=True)
+    producer.start()
+    latencies = []
+    for _ in range(blocks):
+        if rec.AcceptWaveform(audio.get()):
+            phrase = _phrase_id(json.loads(rec.Result())["text"])
+            latencies.append((time.perf_counter() - written[phrase]) * 1000)
+        else:
+            json.loads(rec.PartialResult())
+    producer.join()
+    return latencies
+
+
+def _run_speech_process(blocks: int, phrase_blocks: int, decode_ms: float) -> list[float]:
+    factory = partial(BenchRecognizer, decode_ms=decode_ms, phrase_bytes=phrase_blocks * BLOCK_BYTES)
+    speech = SpeechProcess("", SAMPLERATE, capture=False, recognizer_factory=factory)
+    speech.start()
+    written: dict[int, float] = {}
+    producer = threading.Thread(target=_produce, args=(speech.ring.write, blocks, phrase_blocks, written),
+                                daemon=True)
+    producer.start()
+    latencies = []
+    expected = blocks // phrase_blocks
+    deadline = time.monotonic() + blocks * BLOCK_MS / 1000 + 30
+    try:
+        while len(latencies) < expected and time.monotonic() < deadline:
+            event = speech.get(timeout=1.0)
+            if event is None or event[0] != "final":
+                continue
+            received = time.perf_counter()
+            latencies.append((received - written[_phrase_id(event[1])]) * 1000)
+    finally:
+        producer.join()
+        speech.shutdown()
+    return latencies
+
+
+def _summary(latencies: list[float], pages: int, seconds: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "phrases": len(ordered),
+        "latency_ms": {
+            "p50": round(statistics.median(ordered), 1) if ordered else None,
+            "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else None,
+            "max": round(ordered[-1], 1) if ordered else None,
+        },
+        "pages_parsed": pages,
+        "pages_per_sec": round(pages / seconds, 1),
+    }
+
+
+def run(seconds: float, phrase_blocks: int, decode_ms: float, parse_threads: int,
+        parse_workers: int, page_kb: int) -> dict:
+    blocks = int(seconds * 1000 / BLOCK_MS)
+    html = _make_page(page_kb)
+    parser_name, parse_local, parse_pooled = _parser()
+    results = {}
+
+    t0 = time.perf_counter()
+    results["idle"] = _summary(_run_in_process(blocks, phrase_blocks, decode_ms), 0, time.perf_counter() - t0)
+
+    with _ParseLoad(parse_local, html, parse_threads) as load:
+        t0 = time.perf_counter()
+        latencies = _run_in_process(blocks, phrase_blocks, decode_ms)
+        elapsed = time.perf_counter() - t0
+    results["threads"] = _summary(latencies, load.pages, elapsed)
+
+    if parse_pooled is not None:
+        from web.parse_pool import set_parse_workers, shutdown_parse_pool
+        set_parse_workers(parse_workers)
+        pool = None
+        parse_remote = parse_pooled
+    else:
+        pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        parse_remote = lambda page: pool.submit(stdlib_visible_text, page).result()
+    try:
+        parse_remote(html)  # запуск процессов пула до замера
+        with _ParseLoad(parse_remote, html, parse_threads) as load:
+            t0 = time.perf_counter()
+            latencies = _run_speech_process(blocks, phrase_blocks, decode_ms)
+            elapsed = time.perf_counter() - t0
+        results["processes"] = _summary(latencies, load.pages, elapsed)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        else:
+            shutdown_parse_pool()
+
+    return {
+        "seconds": seconds,
+        "block_ms": BLOCK_MS,
+        "phrase_blocks": phrase_blocks,
+        "decode_ms": decode_ms,
+        "parse_threads": parse_threads,
+        "parse_workers": parse_workers,
+        "page_kb": page_kb,
+        "parser": parser_name,
+        "modes": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--phrase-blocks", type=int, default=5)
+    parser.add_argument("--decode-ms", type=float, default=15.0)
+    parser.add_argument("--parse-threads", type=int, default=4)
+    parser.add_argument("--parse-workers", type=int, default=2)
+    parser.add_argument("--page-kb", type=int, default=70)
+    args = parser.parse_args()
+    print(json.dumps(run(args.seconds, args.phrase_blocks, args.decode_ms, args.parse_threads,
+                         args.parse_workers, args.page_kb), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
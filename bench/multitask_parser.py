@@ -0,0 +1,197 @@
+"""Бенчмарк и сверка предкомпилированного разбора составных команд.
+
+Сравнивает parse_multitask с прежней реализацией, которая собирала регулярки
+при каждом вызове, на эталонном корпусе и случайных комбинациях фрагментов,
+затем меряет скорость разбора типичных фраз: без кэша (только таблицы) и
+с кэшем, как при повторном разборе подкоманд из route_command.
+
+Прежний разбор оставлял разделитель «а также» с несколькими пробелами внутри
+отдельной «командой» (сравнение со списком разделителей шло после strip());
+новый его отбрасывает, такие расхождения считаются отдельно.
+
+Запуск из корня проекта:
+    python -m bench.multitask_parser [--phrases 2000] [--fuzz 5000] [--seed 1]
+"""
+import argparse
+import json
+import random
+import re
+import time
+from typing import List
+
+from main.lang_ru import NUM_WORDS
+from main.multitask import _parse_multitask, parse_multitask
+
+
+# --- Прежняя реализация (эталон поведения) ---------------------------------
+
+def _legacy_is_math_expression(text: str) -> bool:
+    num_words_pattern = "|".join(re.escape(w) for w in NUM_WORDS.keys())
+    number_pattern = rf"(?:\d+|(?:{num_words_pattern})(?:\s+(?:{num_words_pattern}))?)"
+    operators = r"(?:плюс|минус|умножить(?:\s+на)?|разделить(?:\s+на)?|делить(?:\s+на)?|на)"
+    math_pattern = rf"{number_pattern}\s+{operators}\s+{number_pattern}"
+    return bool(re.search(math_pattern, text.lower()))
+
+
+def _legacy_expand_implicit_commands(commands: List[str]) -> List[str]:
+    expanded = []
+    last_action = None
+    for cmd in commands:
+        cmd = cmd.strip()
+        has_action = re.search(
+            r"\b(открой|запусти|закрой|выключи|включи|установи|поставь|"
+            r"создай|удали|найди|покажи|скажи|расскажи|проверь|измерь|"
+            r"сделай|сверни|разверни|переключись|перезагрузи|громкость|"
+            r"яркость|таймер|напомни)\b",
+            cmd
+        )
+        if has_action:
+            last_action = has_action.group(1)
+            expanded.append(cmd)
+        elif last_action and last_action in ["открой", "запусти", "закрой", "выключи"]:
+            expanded.append(f"{last_action} {cmd}")
+        else:
+            expanded.append(cmd)
+    return expanded
+
+
+_SEPARATOR_ARTIFACT = re.compile(r"а\s+также")
+
+
+def _legacy_parse_multitask(text: str, drop_artifacts: bool = False) -> List[str]:
+    """drop_artifacts — прежний разбор без «команд» из одного разделителя «а также»."""
+    text = re.sub(r"^\s*Вера[,\s]+", "", text.lower().strip(), flags=re.IGNORECASE)
+    is_math = _legacy_is_math_expression(text)
+    separators = [r"\s+и\s+", r"\s+а\s+также\s+"]
+    if not is_math:
+        separators.append(r"\s+плюс\s+")
+    separators.extend([r"\s+ещё\s+", r"\s+потом\s+"])
+    separator_pattern = "|".join(f"({p})" for p in separators)
+    parts = re.split(separator_pattern, text)
+    commands = []
+    for part in parts:
+        if part and not part.strip() in ["и", "а также", "плюс", "ещё", "потом"]:
+            part = part.strip()
+            if drop_artifacts and _SEPARATOR_ARTIFACT.fullmatch(part):
+                continue
+            if part:
+                commands.append(part)
+    if len(commands) > 1:
+        return _legacy_expand_implicit_commands(commands)
+    if m := re.match(r"(открой|запусти|закрой|выключи)\s+(.+)", text):
+        action = m.group(1)
+        targets_str = m.group(2)
+        if " и " in targets_str:
+            targets = [t.strip() for t in re.split(r"\s+и\s+", targets_str) if t.strip()]
+            if len(targets) > 1:
+                return [f"{action} {target}" for target in targets]
+    return [text]
+
+
+# --- Эталонный корпус -------------------------------------------------------
+
+GOLDEN = [
+    "",
+    "   ",
+    "который час",
+    "Вера, открой телеграм и браузер",
+    "вера открой блокнот и калькулятор и проводник",
+    "погода в москве и курс доллара и открой телеграм",
+    "сколько будет два плюс два",
+    "пять умножить на семь",
+    "двадцать пять разделить на пять и открой калькулятор",
+    "открой браузер плюс громкость на 50",
+    "закрой хром а также включи музыку",
+    "поставь таймер на 5 минут потом напомни позвонить маме",
+    "открой почту ещё телеграм",
+    "выключи звук и и открой хром",
+    "и",
+    "открой и закрой",
+    "найди файл отчёт и покажи его",
+    "Вера,   сделай скриншот   и  сверни все окна",
+    "запусти steam и discord потом закрой браузер",
+    "три плюс четыре и погода",
+    "100 на 5",
+    "ВЕРА КОТОРЫЙ ЧАС И КАКОЕ СЕГОДНЯ ЧИСЛО",
+    "скажи анекдот плюс погода в сочи",
+    "открой\tтелеграм\nи браузер",
+]
+
+_FRAGMENTS = [
+    "вера", "Вера,", "открой", "закрой", "запусти", "выключи", "громкость", "таймер", "напомни",
+    "телеграм", "браузер", "блокнот", "погода", "курс", "доллара", "в", "москве", "и", "а", "также",
+    "плюс", "минус", "ещё", "потом", "два", "три", "двадцать", "пять", "на", "умножить", "разделить",
+    "10", "5", "найди", "покажи", "скажи", ",", "  ", "\t",
+]
+
+
+def _random_text(rng: random.Random, words: int) -> str:
+    parts = []
+    for _ in range(words):
+        parts.append(rng.choice(_FRAGMENTS))
+        parts.append(rng.choice([" ", " ", " ", "  ", ""]))
+    return "".join(parts)
+
+
+def check(seed: int, fuzz_cases: int) -> dict:
+    mismatches = []
+    for text in GOLDEN:
+        if parse_multitask(text) != _legacy_parse_multitask(text):
+            mismatches.append(text)
+    rng = random.Random(seed)
+    fuzz_mismatches = fixed_artifacts = 0
+    for _ in range(fuzz_cases):
+        text = _random_text(rng, rng.randint(1, 12))
+        result = parse_multitask(text)
+        if result == _legacy_parse_multitask(text):
+            continue
+        if result == _legacy_parse_multitask(text, drop_artifacts=True):
+            fixed_artifacts += 1
+            continue
+        fuzz_mismatches += 1
+        mismatches.append(text)
+    return {"golden": len(GOLDEN), "fuzz": fuzz_cases, "fuzz_mismatches": fuzz_mismatches,
+            "fixed_separator_artifacts": fixed_artifacts, "mismatches": mismatches[:10]}
+
+
+def _bench(fn, corpus: list[str]) -> dict:
+    t0 = time.perf_counter()
+    for text in corpus:
+        fn(text)
+    elapsed = time.perf_counter() - t0
+    return {"ms": elapsed * 1000, "us_per_phrase": elapsed / len(corpus) * 1e6}
+
+
+def throughput(phrases: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    # Фраза и её подкоманды: route_command разбирает каждую подкоманду ещё раз
+    corpus = []
+    while len(corpus) < phrases:
+        text = rng.choice(GOLDEN[2:])
+        corpus.append(text)
+        corpus.extend(_legacy_parse_multitask(text))
+    corpus = corpus[:phrases]
+    _parse_multitask.cache_clear()
+    result = {
+        "phrases": len(corpus),
+        "legacy": _bench(_legacy_parse_multitask, corpus),
+        "compiled": _bench(_parse_multitask.__wrapped__, corpus),
+        "compiled_cached": _bench(parse_multitask, corpus),
+    }
+    result["speedup"] = result["legacy"]["ms"] / result["compiled"]["ms"]
+    result["speedup_cached"] = result["legacy"]["ms"] / result["compiled_cached"]["ms"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phrases", type=int, default=2000)
+    parser.add_argument("--fuzz", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    report = {"check": check(args.seed, args.fuzz), "throughput": throughput(args.phrases, args.seed)}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
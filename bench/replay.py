@@ -0,0 +1,728 @@
+"""Офлайн-бенчмарк всего конвейера команд: воспроизведение записанных фраз.
+
+Фразы из корпуса (bench/fixtures/replay/corpus.jsonl) проходят через
+route_command, а затем через run_main_loop как события распознавания.
+Окружение подменяется целиком, поэтому бенчмарк запускается на Linux без
+микрофона, модели и сети:
+
+  * модули Windows (win32*, winreg, winsound, msvcrt, pycaw, comtypes),
+    которых нет в системе, заменяются заглушками;
+  * llama_cpp — MockLlama: заготовленный ответ с заданной скоростью обработки
+    промпта и генерации (--prompt-tps, --llm-tps);
+  * сеть закрыта: внешние имена не резолвятся, а запросы requests уходят на
+    локальный HTTP-сервер с записанными страницами
+    (bench/fixtures/replay/pages.json);
+  * запуск процессов, os.startfile и webbrowser.open только записываются;
+  * TTS — синтез и плеер без звука, агент работает с копией data/ во
+    временной папке.
+
+Строка корпуса: {"text": "вера который час"} — то, что услышал распознаватель,
+со словом активации. Необязательные поля: "followup" — команда следующей
+фразой после одного слова активации, "llm_reply" — ответ MockLlama,
+"intent" — ожидаемое намерение по last_intent() (фразы, ушедшие в другую
+ветку, перечисляются в intent_mismatches отчёта), "wav" — путь к записи
+(16 бит, моно) относительно корпуса; запись распознаётся Vosk
+(--vosk-model), а без Vosk используется "text".
+
+Отчёт (JSON в stdout, журнал агента — в stderr): пропускная способность,
+задержки route_command по намерениям, p50/p95 этапов и каждого
+обработчика по трассам main.tracing, память по tracemalloc (пик и
+оставшиеся блоки на фразу, самые «тяжёлые» строки), обращения к сети и
+перехваченные побочные эффекты.
+
+Запуск из корня проекта:
+    python -m bench.replay [--repeat 2] [--llm-tps 20] [--prompt-tps 400] [--parse-workers 0] > replay.json
+"""
+import argparse
+import contextlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import wave
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+from urllib.parse import parse_qs, unquote, urlsplit, urlunsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "replay"
+
+_WINDOWS_MODULES = (
+    "win32api", "win32con", "win32gui", "win32process", "win32com", "win32com.client",
+    "winreg", "winsound", "msvcrt", "pycaw", "pycaw.pycaw", "comtypes",
+)
+_LOCAL_HOSTS = {None, "", "localhost", "127.0.0.1", "::1"}
+
+
+# --- Заглушки модулей Windows ----------------------------------------------
+
+class _Stub:
+    """Любой атрибут и вызов возвращают заглушку; в числовом и логическом контексте — 0 и False."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str) -> "_Stub":
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return _Stub(f"{self._name}.{attr}")
+
+    def __call__(self, *args, **kwargs) -> "_Stub":
+        return _Stub(f"{self._name}()")
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __int__(self) -> int:
+        return 0
+
+    __index__ = __int__
+
+    def __float__(self) -> float:
+        return 0.0
+
+    def __iter__(self):
+        return iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __repr__(self) -> str:
+        return f"<stub {self._name}>"
+
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, attr: str):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return _Stub(f"{self.__name__}.{attr}")
+
+
+def _install_windows_stubs() -> list[str]:
+    """Заглушки для модулей Windows, которых нет в системе. Возвращает их имена."""
+    # subprocess выбирает реализацию по наличию msvcrt: он уже импортирован выше
+    installed = []
+    for name in _WINDOWS_MODULES:
+        parent = name.rpartition(".")[0]
+        if parent in installed:
+            found = False
+        else:
+            try:
+                found = importlib.util.find_spec(name) is not None
+            except (ImportError, ValueError):
+                found = False
+        if found:
+            continue
+        module = _StubModule(name)
+        # Пакет со спецификацией: from pycaw.pycaw import ..., importlib.util.find_spec("win32com")
+        module.__path__ = []
+        module.__spec__ = importlib.machinery.ModuleSpec(name, None, is_package=True)
+        sys.modules[name] = module
+        if parent:
+            setattr(sys.modules[parent], name.rpartition(".")[2], module)
+        installed.append(name)
+    return installed
+
+
+# --- MockLlama --------------------------------------------------------------
+
+class MockLlama:
+    """Замена llama_cpp.Llama: заготовленный ответ с заданной скоростью.
+
+    Время вызова — prompt_tokens / prompt_tps + completion_tokens / tps
+    (0 — без задержки), токен — примерно 4 байта UTF-8. Ответ для следующего вызова задаёт
+    бенчмарк (reply), иначе используется default_reply.
+    """
+
+    tokens_per_sec = 20.0
+    prompt_tokens_per_sec = 400.0
+    default_reply = "Это ответ тестовой модели для бенчмарка."
+    reply: Optional[str] = None
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model_path: str = "", n_ctx: int = 4096, **kwargs):
+        self._n_ctx = n_ctx
+
+    @classmethod
+    def configure(cls, tokens_per_sec: float, prompt_tokens_per_sec: float) -> None:
+        cls.tokens_per_sec = tokens_per_sec
+        cls.prompt_tokens_per_sec = prompt_tokens_per_sec
+
+    def tokenize(self, data: bytes, add_bos: bool = True, special: bool = False) -> list[int]:
+        return [1] * (int(add_bos) + max(1, len(data) // 4))
+
+    def detokenize(self, tokens) -> bytes:
+        return b"x" * (4 * len(tokens))
+
+    def token_eos(self) -> int:
+        return 2
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def create_chat_completion(self, messages: list, max_tokens: Optional[int] = None, **kwargs) -> dict:
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        prompt_tokens = len(self.tokenize(prompt.encode("utf-8")))
+        with MockLlama._lock:
+            text = MockLlama.reply or MockLlama.default_reply
+            MockLlama.calls += 1
+        completion_tokens = len(self.tokenize(text.encode("utf-8"), add_bos=False))
+        if max_tokens and max_tokens > 0 and completion_tokens > max_tokens:
+            completion_tokens = max_tokens
+            text = text[:max_tokens * 2]
+        delay = 0.0
+        if self.prompt_tokens_per_sec > 0:
+            delay += prompt_tokens / self.prompt_tokens_per_sec
+        if self.tokens_per_sec > 0:
+            delay += completion_tokens / self.tokens_per_sec
+        time.sleep(delay)
+        return {
+            "id": f"mock-{MockLlama.calls}",
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+def _install_mock_llama() -> None:
+    module = types.ModuleType("llama_cpp")
+    module.Llama = MockLlama
+    module.LogitsProcessorList = list
+    # Грамматика MockLlama не нужна: ответ и так заготовлен
+    module.LlamaGrammar = types.SimpleNamespace(from_string=lambda gbnf, verbose=False: gbnf)
+    sys.modules["llama_cpp"] = module
+
+
+# --- Сеть: локальный сервер с записанными страницами -------------------------
+
+_CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".json": "application/json; charset=utf-8",
+                  ".js": "application/javascript; charset=utf-8", ".txt": "text/plain; charset=utf-8"}
+
+
+class FixtureServer:
+    """HTTP-сервер на 127.0.0.1: путь /<хост><путь>?<запрос> ищется в pages.json.
+
+    Запись совпадает, если совпал хост, путь начинается с "path", а в запросе
+    (раскодированном) есть подстрока "query"; берётся первая подходящая.
+    """
+
+    def __init__(self, manifest: Path):
+        self._pages = json.loads(manifest.read_text(encoding="utf-8"))
+        self._dir = manifest.parent / "pages"
+        self.requests = 0
+        self.not_found: list[str] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _match(self, host: str, path: str, query: str) -> Optional[dict]:
+        for page in self._pages:
+            if page["host"] == host and path.startswith(page.get("path", "/")) \
+                    and page.get("query", "") in query:
+                return page
+        return None
+
+    def _serve(self, request: BaseHTTPRequestHandler) -> None:
+        parts = urlsplit(request.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = unquote("/" + path)
+        query = " ".join(v for values in parse_qs(parts.query).values() for v in values)
+        page = self._match(host, path, query)
+        with self._lock:
+            self.requests += 1
+            if page is None:
+                self.not_found.append(f"{host}{path}")
+        if page is None:
+            request.send_error(404)
+            return
+        body = (self._dir / page["file"]).read_bytes()
+        request.send_response(200)
+        request.send_header("Content-Type", page.get("content_type")
+                            or _CONTENT_TYPES.get(Path(page["file"]).suffix, "application/octet-stream"))
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def _isolate_network(port: int) -> bool:
+    """Закрывает внешнюю сеть и направляет requests на FixtureServer. False — requests не установлен."""
+    resolve = socket.getaddrinfo
+
+    def local_only(host, *args, **kwargs):
+        if host not in _LOCAL_HOSTS:
+            raise socket.gaierror(socket.EAI_NONAME, f"сеть отключена бенчмарком: {host}")
+        return resolve(host, *args, **kwargs)
+    socket.getaddrinfo = local_only
+    os.environ["NO_PROXY"] = "127.0.0.1,localhost"
+
+    try:
+        import requests.sessions
+    except ImportError:
+        return False
+    send = requests.sessions.Session.request
+
+    def to_fixture(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        if parts.hostname not in _LOCAL_HOSTS:
+            url = urlunsplit(("http", f"127.0.0.1:{port}", f"/{parts.hostname}{parts.path or '/'}",
+                              parts.query, ""))
+        return send(self, method, url, *args, **kwargs)
+    requests.sessions.Session.request = to_fixture
+    return True
+
+
+# --- Побочные эффекты команд -----------------------------------------------
+
+class _RecordedProcess:
+    """Вместо запущенного процесса: команда записана, код возврата 0."""
+
+    returncode = 0
+    pid = 0
+    stdout = stderr = stdin = None
+
+    def __init__(self, args, *rest, **kwargs):
+        _side_effects.append({"call": "subprocess", "args": args if isinstance(args, str) else list(map(str, args))})
+
+    def communicate(self, input=None, timeout=None):
+        return "", ""
+
+    def wait(self, timeout=None) -> int:
+        return 0
+
+    def poll(self) -> int:
+        return 0
+
+    def kill(self) -> None:
+        pass
+
+    terminate = kill
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_side_effects: list[dict] = []
+
+
+def _sandbox_side_effects() -> None:
+    """Команды агента не запускают программы, не открывают браузер и не выключают компьютер."""
+    subprocess.Popen = _RecordedProcess
+    os.startfile = lambda path, *args: _side_effects.append({"call": "os.startfile", "args": [str(path)]})
+
+    def open_url(url, *args, **kwargs):
+        _side_effects.append({"call": "webbrowser.open", "args": [url]})
+        return True
+    webbrowser.open = open_url
+
+
+# --- TTS без звука ------------------------------------------------------------
+
+class _SilentEngine:
+    """Движок pyttsx3 без звука: пишет короткий WAV тишины."""
+
+    def __init__(self):
+        self._jobs: list[str] = []
+
+    def setProperty(self, name, value) -> None:
+        pass
+
+    def getProperty(self, name):
+        return []
+
+    def save_to_file(self, text: str, path: str) -> None:
+        self._jobs.append(path)
+
+    def say(self, text: str) -> None:
+        pass
+
+    def runAndWait(self) -> None:
+        for path in self._jobs:
+            with wave.open(path, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(16000)
+                wav.writeframes(b"\0\0" * 160)
+        self._jobs.clear()
+
+    def stop(self) -> None:
+        pass
+
+
+class _SilentPlayer:
+    def play(self, wav) -> float:
+        return 0.0
+
+    def stop(self) -> None:
+        pass
+
+
+# --- Корпус -------------------------------------------------------------------
+
+def load_corpus(path: Path) -> list[dict]:
+    corpus = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            corpus.append(json.loads(line))
+    for utt in corpus:
+        if utt.get("wav"):
+            utt["wav"] = str((path.parent / utt["wav"]).resolve())
+    return corpus
+
+
+def _wav_events(path: str, model, fallback: str) -> Iterator[tuple[str, str]]:
+    """События Vosk по записи; без модели — один финальный результат из текста корпуса."""
+    if model is None:
+        yield "partial", fallback
+        yield "final", fallback
+        return
+    import vosk
+    with wave.open(path, "rb") as wav:
+        rec = vosk.KaldiRecognizer(model, wav.getframerate())
+        while True:
+            data = wav.readframes(4000)
+            if not data:
+                break
+            if rec.AcceptWaveform(data):
+                yield "final", json.loads(rec.Result())["text"]
+            else:
+                yield "partial", json.loads(rec.PartialResult()).get("partial", "")
+    yield "final", json.loads(rec.FinalResult())["text"]
+
+
+def _speech_events(corpus: list[dict], repeat: int, vosk_model) -> Callable[[], Iterator[tuple[str, str]]]:
+    """Замена agent._local_speech_events: фразы корпуса как события распознавания."""
+    def events():
+        for _ in range(repeat):
+            for utt in corpus:
+                MockLlama.reply = utt.get("llm_reply")
+                if utt.get("wav"):
+                    yield from _wav_events(utt["wav"], vosk_model, utt["text"])
+                else:
+                    words = utt["text"].split()
+                    for i in range(1, len(words) + 1):
+                        yield "partial", " ".join(words[:i])
+                    yield "final", utt["text"]
+                if utt.get("followup"):
+                    yield "final", utt["followup"]
+    return events
+
+
+# --- Подготовка агента ----------------------------------------------------------
+
+def _prepare_root(parse_workers: int, caches: bool) -> Path:
+    """Временный корень проекта с копией data/ и настройками для замера."""
+    root = Path(tempfile.mkdtemp(prefix="vera_replay_"))
+    shutil.copytree(ROOT / "data", root / "data",
+                    ignore=shutil.ignore_patterns("tts_cache", "traces.jsonl*", "model_server.key"))
+    config_path = root / "data" / "config.json"
+    data = json.loads(config_path.read_text(encoding="utf-8"))
+    overrides = {
+        "model": {"warmup_enabled": False},
+        "memory": {"summary_enabled": False},
+        "tts": {"cache_enabled": False},
+        "model_server": {"enabled": False},
+        "processes": {"speech": False, "web_parse_workers": parse_workers},
+        "config_reload": {"enabled": False},
+        "tracing": {"enabled": True, "max_mb": 64},
+        "response_cache": {"enabled": caches, "embedding_model": ""},
+        "web_search": {"cache_ttl_sec": None if caches else 0},
+    }
+    for section, values in overrides.items():
+        target = data.setdefault(section, {})
+        for key, value in values.items():
+            if value is not None:
+                target[key] = value
+    config_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return root
+
+
+def _load_vosk_model(path: Optional[str]):
+    if not path:
+        return None
+    try:
+        import vosk
+        return vosk.Model(path)
+    except Exception as e:
+        print(f"[BENCH] Vosk недоступен ({e}), записи заменяются текстом корпуса", file=sys.stderr)
+        return None
+
+
+# --- Статистика -----------------------------------------------------------------
+
+def _percentiles(values: list[float]) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "p50": round(statistics.median(ordered), 2),
+        "p95": round(ordered[round(0.95 * (len(ordered) - 1))], 2),
+        "max": round(ordered[-1], 2),
+        "mean": round(statistics.fmean(ordered), 2),
+    }
+
+
+def _trace_stages(path: Path, source: str) -> dict:
+    """p50/p95 этапов по трассам с данным source; поздние этапы (tts_first_audio) — по trace_id."""
+    sources: dict[str, str] = {}
+    durations: dict[str, list[float]] = {}
+    entries = []
+    if path.exists():
+        with path.open(encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        if "source" in entry:
+            sources[entry["trace_id"]] = entry["source"]
+    for entry in entries:
+        if sources.get(entry["trace_id"]) != source:
+            continue
+        if "total_ms" in entry:
+            durations.setdefault("total", []).append(entry["total_ms"])
+        for sp in entry.get("spans", ()):
+            durations.setdefault(sp["stage"], []).append(sp["ms"])
+    stages = {stage: _percentiles(values) for stage, values in durations.items()}
+    return dict(sorted(stages.items(), key=lambda item: item[1].get("p95", 0), reverse=True))
+
+
+def _split_handlers(stages: dict) -> tuple[dict, dict]:
+    handlers = {k[len("handler."):]: v for k, v in stages.items() if k.startswith("handler.")}
+    return {k: v for k, v in stages.items() if not k.startswith("handler.")}, handlers
+
+
+# --- Прогоны --------------------------------------------------------------------
+
+def _commands(agent, corpus: list[dict]) -> list[tuple[dict, str, str]]:
+    """(фраза, команда без слова активации, профиль) — как их выделяет главный цикл."""
+    commands = []
+    for utt in corpus:
+        profile, command = agent._activation.match(utt["text"].lower().strip())
+        command = utt.get("followup") or command or utt["text"]
+        commands.append((utt, command, profile or "default"))
+    return commands
+
+
+def _route(agent, tracing, utt: dict, command: str, profile: str, source: str) -> tuple[str, float]:
+    MockLlama.reply = utt.get("llm_reply")
+    t0 = time.perf_counter()
+    with tracing.trace(source=source, text=command, profile=profile), agent._llm_lock:
+        agent.route_command(command, profile)
+    return agent.last_intent(), (time.perf_counter() - t0) * 1000
+
+
+def replay_route(agent, tracing, corpus: list[dict], repeat: int) -> dict:
+    commands = _commands(agent, corpus)
+    latencies: list[float] = []
+    by_intent: dict[str, list[float]] = {}
+    first: dict[str, float] = {}
+    mismatches: list[dict] = []
+    t0 = time.perf_counter()
+    for n in range(repeat):
+        for utt, command, profile in commands:
+            intent, ms = _route(agent, tracing, utt, command, profile, "replay.route")
+            latencies.append(ms)
+            by_intent.setdefault(intent or "none", []).append(ms)
+            first.setdefault(command, round(ms, 2))
+            # Фраза, ушедшая не в ту ветку, замеряет чужой обработчик
+            if n == 0 and utt.get("intent") and utt["intent"] != intent:
+                mismatches.append({"command": command, "expected": utt["intent"], "intent": intent})
+    elapsed = time.perf_counter() - t0
+    for m in mismatches:
+        print(f"[BENCH] «{m['command']}»: ожидалось намерение {m['expected']}, получено {m['intent'] or 'none'}",
+              file=sys.stderr)
+    return {
+        "commands": len(latencies),
+        "wall_sec": round(elapsed, 3),
+        "throughput_per_sec": round(len(latencies) / elapsed, 2),
+        "latency_ms": _percentiles(latencies),
+        "first_pass_ms": first,
+        "by_intent": {intent: _percentiles(values) for intent, values in sorted(by_intent.items())},
+        "intent_mismatches": mismatches,
+    }
+
+
+def replay_allocations(agent, tracing, corpus: list[dict], top: int) -> dict:
+    """Отдельный проход под tracemalloc (он замедляет код, поэтому не смешивается с замером времени).
+
+    tracemalloc видит только живые блоки: на фразу считаются пик памяти во
+    время обработки и блоки, оставшиеся после неё (кэши, история, утечки).
+    """
+    commands = _commands(agent, corpus)
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    tracemalloc.start(1)
+    try:
+        start = tracemalloc.take_snapshot().filter_traces(filters)
+        per_command = []
+        for utt, command, profile in commands:
+            before = tracemalloc.take_snapshot().filter_traces(filters)
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            intent, ms = _route(agent, tracing, utt, command, profile, "replay.alloc")
+            peak = tracemalloc.get_traced_memory()[1]
+            after = tracemalloc.take_snapshot().filter_traces(filters)
+            diff = after.compare_to(before, "filename")
+            per_command.append({
+                "command": command,
+                "intent": intent,
+                "peak_kb": round((peak - base) / 1024, 1),
+                "retained_blocks": sum(d.count_diff for d in diff),
+                "retained_kb": round(sum(d.size_diff for d in diff) / 1024, 1),
+            })
+        end = tracemalloc.take_snapshot().filter_traces(filters)
+    finally:
+        tracemalloc.stop()
+    sites = end.compare_to(start, "lineno")[:top]
+    return {
+        "per_command": per_command,
+        "retained_blocks_total": sum(c["retained_blocks"] for c in per_command),
+        "retained_kb_total": round(sum(c["retained_kb"] for c in per_command), 1),
+        "top_sites": [{"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                       "size_kb": round(s.size_diff / 1024, 1), "blocks": s.count_diff} for s in sites],
+    }
+
+
+def replay_main_loop(agent, corpus: list[dict], repeat: int, vosk_model) -> dict:
+    """run_main_loop целиком: события распознавания из корпуса, ответы — в беззвучный TTS."""
+    agent._local_speech_events = _speech_events(corpus, repeat, vosk_model)
+    agent._stdin_listener = lambda: None
+    t0 = time.perf_counter()
+    try:
+        agent.run_main_loop()
+    except SystemExit:
+        pass
+    elapsed = time.perf_counter() - t0
+    # Последний ответ успевает зазвучать (tts_first_audio)
+    deadline = time.monotonic() + 2
+    while agent._tts.is_speaking() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return {"utterances": len(corpus) * repeat, "wall_sec": round(elapsed, 3)}
+
+
+def run(corpus_path: Path, repeat: int, llm_tps: float, prompt_tps: float, parse_workers: int,
+        caches: bool, vosk_model_path: Optional[str], top_sites: int) -> dict:
+    corpus = load_corpus(corpus_path)
+    stubs = _install_windows_stubs()
+    _install_mock_llama()
+    MockLlama.configure(llm_tps, prompt_tps)
+    _sandbox_side_effects()
+    root = _prepare_root(parse_workers, caches)
+    vosk_model = _load_vosk_model(vosk_model_path) if any(u.get("wav") for u in corpus) else None
+
+    try:
+        with FixtureServer(FIXTURES / "pages.json") as server:
+            has_requests = _isolate_network(server.port)
+
+            import main.config_manager as config_manager
+            config_manager._get_project_root = lambda: root
+            from main import agent, tracing
+            from main.tts import TTSWorker
+
+            agent._start_tts = lambda: _started(TTSWorker(agent.cfg["tts"], engine_factory=_SilentEngine,
+                                                          player=_SilentPlayer(), on_audio_start=tracing.complete))
+            agent._load_vosk = lambda: (None, None)
+
+            t0 = time.perf_counter()
+            agent.startup()
+            startup_sec = time.perf_counter() - t0
+            traces = root / "data" / "traces.jsonl"
+
+            route = replay_route(agent, tracing, corpus, repeat)
+            route["stages"], route["handlers"] = _split_handlers(_trace_stages(traces, "replay.route"))
+            allocations = replay_allocations(agent, tracing, corpus, top_sites)
+            loop = replay_main_loop(agent, corpus, repeat, vosk_model)
+            loop["stages"], loop["handlers"] = _split_handlers(_trace_stages(traces, "voice"))
+            # Команда — трасса главного цикла (фраза с одним словом активации её не открывает)
+            loop["commands"] = loop["stages"].get("total", {}).get("count", 0)
+            loop["throughput_per_sec"] = round(loop["commands"] / loop["wall_sec"], 2) if loop["wall_sec"] else None
+            agent._safe_shutdown()
+            network = {"requests_module": has_requests, "requests": server.requests,
+                       "not_found": sorted(set(server.not_found))}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "corpus": str(corpus_path),
+        "utterances": len(corpus),
+        "repeat": repeat,
+        "mock_llm": {"tokens_per_sec": llm_tps, "prompt_tokens_per_sec": prompt_tps, "calls": MockLlama.calls},
+        "parse_workers": parse_workers,
+        "caches": caches,
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "stubbed_modules": stubs,
+            "vosk": vosk_model is not None,
+        },
+        "startup_sec": round(startup_sec, 3),
+        "route_command": route,
+        "allocations": allocations,
+        "main_loop": loop,
+        "network": network,
+        "side_effects": _side_effects,
+    }
+
+
+def _started(worker):
+    worker.start()
+    return worker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=FIXTURES / "corpus.jsonl")
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--llm-tps", type=float, default=20.0, help="скорость генерации MockLlama, токенов/с (0 — без задержки)")
+    parser.add_argument("--prompt-tps", type=float, default=400.0, help="скорость обработки промпта, токенов/с")
+    parser.add_argument("--parse-workers", type=int, default=0, help="processes.web_parse_workers")
+    parser.add_argument("--caches", action="store_true", help="не выключать кэш ответов и веб-поиска")
+    parser.add_argument("--vosk-model", default=None, help="модель Vosk для фраз с полем wav")
+    parser.add_argument("--top-sites", type=int, default=10)
+    parser.add_argument("--quiet", action="store_true", help="не выводить журнал агента в stderr")
+    args = parser.parse_args()
+    log = open(os.devnull, "w", encoding="utf-8") if args.quiet else sys.stderr
+    with contextlib.redirect_stdout(log):
+        report = run(args.corpus, args.repeat, args.llm_tps, args.prompt_tps, args.parse_workers,
+                     args.caches, args.vosk_model, args.top_sites)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
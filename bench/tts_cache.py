@@ -0,0 +1,121 @@
+"""Бенчмарк: синтез речи против воспроизведения из дискового кэша.
+
+Работает на Linux без SAPI: движок pyttsx3 заменён фейком, который тратит
+время пропорционально длине текста и пишет тишину в WAV, плеер только
+фиксирует момент старта воспроизведения.
+
+Запуск из корня проекта:
+    python -m bench.tts_cache [--per-char-ms 4] [--rounds 5]
+"""
+import argparse
+import io
+import json
+import statistics
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+
+from main.tts import TTSWorker
+from main.tts_cache import AudioCache
+
+PHRASES = [
+    "Сейчас 14:05.",
+    "Команды выполнены.",
+    "Таймер на 5 минут установлен.",
+    "Курс доллара 92 рубля 40 копеек.",
+    "Запланированный запуск: телеграм",
+    "В Москве сейчас плюс три, облачно, ощущается как минус один.",
+]
+
+
+def _silence_wav(seconds: float, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\0\0" * int(rate * seconds))
+    return buf.getvalue()
+
+
+class FakeEngine:
+    """Имитация pyttsx3/SAPI: задержка синтеза пропорциональна длине текста."""
+
+    def __init__(self, per_char_ms: float):
+        self.per_char_ms = per_char_ms
+        self.calls = 0
+        self._pending = None
+
+    def getProperty(self, name):
+        return []
+
+    def setProperty(self, name, value):
+        pass
+
+    def save_to_file(self, text, path):
+        self._pending = (text, path)
+
+    def runAndWait(self):
+        text, path = self._pending
+        self.calls += 1
+        time.sleep(len(text) * self.per_char_ms / 1000.0)
+        Path(path).write_bytes(_silence_wav(0.05))
+
+
+class FakePlayer:
+    def __init__(self):
+        self.started = threading.Event()
+
+    def play(self, wav) -> float:
+        self.started.set()
+        return 0.0
+
+    def stop(self) -> None:
+        pass
+
+
+def _time_to_audio(worker: TTSWorker, player: FakePlayer, text: str) -> float:
+    player.started.clear()
+    t0 = time.perf_counter()
+    worker.speak(text)
+    player.started.wait(10)
+    return (time.perf_counter() - t0) * 1000
+
+
+def run(per_char_ms: float, rounds: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = FakeEngine(per_char_ms)
+        player = FakePlayer()
+        cache = AudioCache(Path(tmp) / "tts_cache")
+        settings = {"voice_index": 0, "rate": 180, "volume": 0.8}
+        worker = TTSWorker(settings, stock_phrases=(), engine_factory=lambda: engine,
+                           player=player, cache=cache)
+        worker.start()
+
+        cold = [_time_to_audio(worker, player, p) for p in PHRASES]
+        synth_calls = engine.calls
+        warm = [_time_to_audio(worker, player, p) for _ in range(rounds) for p in PHRASES]
+        worker.shutdown()
+
+    return {
+        "phrases": len(PHRASES),
+        "per_char_ms": per_char_ms,
+        "synthesis_ms": {"mean": statistics.mean(cold), "max": max(cold)},
+        "cached_ms": {"mean": statistics.mean(warm), "max": max(warm)},
+        "synth_calls_cold": synth_calls,
+        "synth_calls_warm": engine.calls - synth_calls,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-char-ms", type=float, default=4.0)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.per_char_ms, args.rounds), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Бенчмарк и сверка однопроходного нормализатора текста для TTS.
+
+Сравнивает normalize_for_tts с прежней реализацией (_clean_for_tts из agent.py
+и convert_years_in_text до оптимизации) на эталонном корпусе и случайных
+комбинациях фрагментов (в том числе со ссылками рядом с годами), затем
+меряет пропускную способность на длинных ответах веб-поиска.
+
+Запуск из корня проекта:
+    python -m bench.tts_normalizer [--answers 200] [--fuzz 5000] [--seed 1]
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from main.lang_ru import convert_years_in_text, normalize_for_tts, year_to_text
+
+
+# --- Прежняя реализация (эталон поведения) ---------------------------------
+
+def _legacy_convert_years(text: str) -> str:
+    result = text
+
+    def prepositional(match, prefix="в "):
+        return prefix + year_to_text(int(match.group(1)), "prepositional")
+
+    result = re.sub(r'\bв\s+((?:19|20)\d{2})\s+году\b', prepositional, result, flags=re.IGNORECASE)
+    context_patterns = [
+        r'\b(родил[ас]я|родился|родилась|появил[ас]я|появился|появилась)\s+в\s+((?:19|20)\d{2})\b',
+        r'\b(вышел|вышла|вышло|выпущен|выпущена|выпущено|создан|создана|создано|основан|основана|основано)\s+в\s+((?:19|20)\d{2})\b',
+        r'\b(умер|умерла|скончал[ас]я|скончался|скончалась)\s+в\s+((?:19|20)\d{2})\b',
+    ]
+    for pattern in context_patterns:
+        result = re.sub(
+            pattern,
+            lambda m: f"{m.group(1)} в {year_to_text(int(m.group(2)), 'prepositional')}",
+            result, flags=re.IGNORECASE,
+        )
+    result = re.sub(r'\bв\s+((?:19|20)\d{2})\b(?!\s+году)', prepositional, result, flags=re.IGNORECASE)
+    result = re.sub(r'\b((?:19|20)\d{2})\s+года\b',
+                    lambda m: year_to_text(int(m.group(1)), "genitive"), result, flags=re.IGNORECASE)
+    result = re.sub(r'\b((?:19|20)\d{2})\s+год\b',
+                    lambda m: year_to_text(int(m.group(1)), "nominative"), result, flags=re.IGNORECASE)
+    result = re.sub(r'(?<!в\s)(?<!года\s)(?<!году\s)\b((?:19|20)\d{2})\b(?!\s+году)(?!\s+года)',
+                    lambda m: year_to_text(int(m.group(0)), "nominative"), result)
+    return result
+
+
+def _legacy_clean_for_tts(text: str) -> str:
+    s = text or ""
+    s = re.sub(r"\s*\(источники?:.*?\)\s*$", "", s, flags=re.IGNORECASE | re.DOTALL)
+    s = re.sub(r"\bисточники?:.*$", "", s, flags=re.IGNORECASE)
+    s = re.sub(r"https?://\S+", "", s)
+    s = re.sub(r"\s{2,}", " ", s).strip()
+    return _legacy_convert_years(s)
+
+
+# --- Эталонный корпус -------------------------------------------------------
+
+GOLDEN = [
+    "",
+    "   ",
+    "Сейчас 14:05.",
+    "Фильм вышел в 1999 году.",
+    "В 2020 году прошла олимпиада.",
+    "Он родился в 1985, а умер в 2011.",
+    "Компания основана в 1998 и выпущена в 2003 году.",
+    "Событие 2001 года изменило всё.",
+    "2024 год был високосным.",
+    "С 1990 по 2000 многое изменилось.",
+    "Между 1945 года и 1950 году.",
+    "Звоните 2000 1999 раз.",
+    "Номер 12345 и 20201 не годы.",
+    "в 1900 году и в 2099",
+    "Скончался в 1953 году, родилась в 1901.",
+    "Ответ: Москва основана в 1147 году. (источники: https://ru.wikipedia.org/wiki/Москва)",
+    "Курс вырос. Источники: https://cbr.ru, https://rbc.ru",
+    "Подробнее: https://example.com/page?x=1  и   https://example.org  тут.",
+    "Строка\nс переносами\n\nи  пробелами  2015",
+    "Текст с ссылкой https://a.ru\n(источники: https://b.ru\nhttps://c.ru)",
+    "Источник: https://one.ru",
+    "Версия 2.0 вышла 2019-05-01, релиз в 2019.",
+    "годы 2000-е и 1990-х",
+    "В  2005  году и в\t2006 года",
+    "года 2010 году 2011 в 2012",
+    "Погода: плюс 5, ветер 3 м/с. (Источники: https://gismeteo.ru)",
+    "ссылка https://x.ru/a,https://y.ru/b конец",
+    "https://x.ru в начале, 1999 в середине",
+    "Вышел в https://x.ru 2020 году.",
+    "родился в http://a.ru 1990, а 2001 https://b.ru года",
+]
+
+_FRAGMENTS = [
+    "Москва", "основана", "в", "В", "1147", "1999", "2000", "2024", "2099", "1900", "году", "года",
+    "год", "родился", "вышел", "умерла", "по", "и", ",", ".", "https://ru.wikipedia.org/wiki/X",
+    "http://example.com", "источники:", "Источник:", "(источники:", ")", "\n", "  ", "\t", "курс",
+    "12345", "2019-05-01", "годы",
+]
+
+
+def _random_text(rng: random.Random, words: int) -> str:
+    parts = []
+    for _ in range(words):
+        parts.append(rng.choice(_FRAGMENTS))
+        parts.append(rng.choice([" ", " ", " ", "  ", "\n", ""]))
+    return "".join(parts)
+
+
+def _web_answer(rng: random.Random) -> str:
+    """Длинный ответ в стиле веб-поиска: несколько абзацев с годами, ссылками и источниками."""
+    sentences = []
+    for _ in range(rng.randint(15, 30)):
+        year = rng.randint(1900, 2099)
+        sentences.append(rng.choice([
+            f"Компания основана в {year} году и выросла в несколько раз.",
+            f"По данным на {year} год показатель составил {rng.randint(1, 999)} единиц.",
+            f"Подробности доступны по ссылке https://example.com/{rng.randint(1, 10 ** 6)} .",
+            f"Автор родился в {year}, а первая книга вышла в {year + 1}.",
+            f"События {year} года описаны в  нескольких   источниках.",
+        ]))
+    urls = ", ".join(f"https://site{i}.ru/article/{rng.randint(1, 10 ** 6)}" for i in range(3))
+    return " ".join(sentences) + f"\n(источники: {urls})"
+
+
+def check(seed: int, fuzz_cases: int) -> dict:
+    mismatches = []
+    for text in GOLDEN:
+        if normalize_for_tts(text) != _legacy_clean_for_tts(text):
+            mismatches.append(text)
+        if convert_years_in_text(text) != _legacy_convert_years(text):
+            mismatches.append(text)
+    rng = random.Random(seed)
+    fuzz_mismatches = 0
+    for _ in range(fuzz_cases):
+        text = _random_text(rng, rng.randint(1, 12))
+        if (convert_years_in_text(text) != _legacy_convert_years(text)
+                or normalize_for_tts(text) != _legacy_clean_for_tts(text)):
+            fuzz_mismatches += 1
+            mismatches.append(text)
+    return {"golden": len(GOLDEN), "fuzz": fuzz_cases, "fuzz_mismatches": fuzz_mismatches,
+            "mismatches": mismatches[:10]}
+
+
+def throughput(answers: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    corpus = [_web_answer(rng) for _ in range(answers)]
+    total_chars = sum(len(t) for t in corpus)
+    result = {"answers": answers, "chars": total_chars}
+    outputs = {}
+    for name, fn in (("legacy", _legacy_clean_for_tts), ("single_pass", normalize_for_tts)):
+        t0 = time.perf_counter()
+        outputs[name] = [fn(t) for t in corpus]
+        elapsed = time.perf_counter() - t0
+        result[name] = {"ms": elapsed * 1000, "chars_per_s": total_chars / elapsed}
+    result["outputs_equal"] = outputs["legacy"] == outputs["single_pass"]
+    result["speedup"] = result["legacy"]["ms"] / result["single_pass"]["ms"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--answers", type=int, default=200)
+    parser.add_argument("--fuzz", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    report = {"check": check(args.seed, args.fuzz), "throughput": throughput(args.answers, args.seed)}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
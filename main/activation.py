@@ -0,0 +1,139 @@
+import difflib
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Mapping, NamedTuple, Optional
+
+# Частые искажения слова активации в выдаче Vosk (small-ru).
+# Ключ — слово активации в нижнем регистре.
+_KNOWN_MISHEARINGS = {
+    "вера": ("веро", "вира", "вэра", "виера", "фера"),
+}
+
+_RU_ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+
+def _spelling_variants(target: str, threshold: float) -> set[str]:
+    """Все написания на расстоянии одной правки, которые прошли бы порог SequenceMatcher."""
+    variants = {target}
+    candidates = set()
+    for i in range(len(target) + 1):
+        for ch in _RU_ALPHABET:
+            candidates.add(target[:i] + ch + target[i:])  # вставка
+    for i in range(len(target)):
+        candidates.add(target[:i] + target[i + 1:])  # удаление
+        for ch in _RU_ALPHABET:
+            candidates.add(target[:i] + ch + target[i + 1:])  # замена
+    for c in candidates:
+        if c and difflib.SequenceMatcher(None, c, target).ratio() >= threshold:
+            variants.add(c)
+    return variants
+
+
+class _LevenshteinAutomaton:
+    """Автомат Левенштейна для проверки расстояния <= max_dist без полной DP-матрицы."""
+
+    def __init__(self, target: str, max_dist: int):
+        self.target = target
+        self.max_dist = max_dist
+
+    def _start(self) -> list[int]:
+        return list(range(min(len(self.target), self.max_dist) + 1))
+
+    def _step(self, state: list[int], ch: str) -> list[int]:
+        # Состояние — строка DP, обрезанная до первой недостижимой позиции
+        new_state = [state[0] + 1]
+        for i in range(len(state) - 1):
+            cost = 0 if self.target[i] == ch else 1
+            new_state.append(min(new_state[i] + 1, state[i] + cost, state[i + 1] + 1))
+        if len(state) <= len(self.target):
+            i = len(state) - 1
+            cost = 0 if self.target[i] == ch else 1
+            new_state.append(min(new_state[i] + 1, state[i] + cost))
+        while new_state and new_state[-1] > self.max_dist:
+            new_state.pop()
+        return new_state
+
+    def accepts(self, word: str) -> bool:
+        if abs(len(word) - len(self.target)) > self.max_dist:
+            return False
+        state = self._start()
+        for ch in word:
+            state = self._step(state, ch)
+            if not state or min(state) > self.max_dist:
+                return False
+        return len(state) > len(self.target) and state[len(self.target)] <= self.max_dist
+
+
+class WakeMatch(NamedTuple):
+    profile: Optional[str]  # Профиль маршрутизации найденного слова (None — активации нет)
+    command: str            # Фраза без слов активации
+
+
+class ActivationMatcher:
+    """Предрасчитанный нечёткий поиск слов активации.
+
+    Поддерживает несколько слов сразу: написания всех слов собираются в один
+    словарь "написание -> профиль", поэтому проверка токена — один поиск по словарю.
+    Длинные слова дополнительно проверяются автоматом с ограниченным расстоянием
+    правки. Результат разбора каждой распознанной строки кэшируется.
+    """
+
+    def __init__(self, wake_words: Mapping[str, str],
+                 extra_variants: Optional[Mapping[str, Iterable[str]]] = None,
+                 threshold: float = 0.8, cache_size: int = 512):
+        extra_variants = extra_variants or {}
+        self._spellings: dict[str, str] = {}
+        self._automata: list[tuple[_LevenshteinAutomaton, str]] = []
+        for word, profile in wake_words.items():
+            target = word.lower().strip()
+            if not target:
+                continue
+            spellings = (
+                _spelling_variants(target, threshold)
+                | set(_KNOWN_MISHEARINGS.get(target, ()))
+                | {v.lower().strip() for v in extra_variants.get(word, ()) if v and v.strip()}
+            )
+            for sp in spellings:
+                # При конфликте написаний побеждает слово, указанное раньше
+                self._spellings.setdefault(sp, profile)
+            # Более одной правки допускается только для длинных слов (как и порог ratio)
+            max_dist = int(len(target) * (1 - threshold) + 1e-9)
+            if max_dist >= 2:
+                self._automata.append((_LevenshteinAutomaton(target, max_dist), profile))
+        self._cache: "OrderedDict[str, WakeMatch]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = Lock()
+
+    def profile_of(self, word: str) -> Optional[str]:
+        """Профиль слова активации или None, если токен им не является."""
+        profile = self._spellings.get(word)
+        if profile is not None:
+            return profile
+        for automaton, profile in self._automata:
+            if automaton.accepts(word):
+                return profile
+        return None
+
+    def match(self, text: str) -> WakeMatch:
+        """Возвращает профиль первого найденного слова активации и команду без слов активации."""
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+
+        found: Optional[str] = None
+        kept = []
+        for token in text.split():
+            profile = self.profile_of(token)
+            if profile is None:
+                kept.append(token)
+            elif found is None:
+                found = profile
+        result = WakeMatch(found, " ".join(kept).strip())
+
+        with self._lock:
+            self._cache[text] = result
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
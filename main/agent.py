@@ -1,3 +1,4 @@
+import contextvars
 import json
 import os
 import re
@@ -5,31 +6,47 @@ import queue
 import threading
 import sys
 import time
+import zlib
 from pathlib import Path
 from collections import deque
-import difflib
-import sounddevice as sd
-import vosk
-import pyttsx3
-from llama_cpp import Llama
 from typing import Optional
 import ctypes
 import msvcrt
 from functools import partial
-from web.web_search import web_search_answer, execute_wikipedia_command
-from web.weather import execute_weather_command
-from web.currency import execute_currency_command
-from .lang_ru import convert_years_in_text
-from .multitask import execute_multitask
+from .startup import StartupProfiler, format_offenders, import_offenders, lazy_function, profiling_requested
+from .lang_ru import normalize_for_tts
+from .activation import ActivationMatcher
+from .context_builder import ContextBuilder
+from .summarizer import ConversationSummarizer
+from .model_lock import PreemptibleLock, SerializedModel, preemption_logits_processor
+from .warmup import ModelWarmup
+from .llm_tuning import build_llama_kwargs
+from .response_cache import ResponseCache, is_context_dependent, is_open_ended
+from .intent_classifier import (HANDLER_INTENTS, INTENT_COMMANDS, LLM_INTENT, WEB_SEARCH_INTENT, load_or_train,
+                                routed_intent)
+from .tts import TTSWorker
+from .tts_cache import AudioCache
+from .multitask import execute_multitask, parse_multitask
+from . import tracing
 from .commands import HANDLERS, set_speak_callback, set_last_search_urls_ref, execute_user_name_command, stop_timer_ring, is_timer_ringing
 from .commands import start_app_scheduler, set_scheduled_speak_callback, set_open_app_callback, set_close_app_callback
 from .commands import set_reminder_shutdown_event, set_app_scheduler_shutdown_event
 from .commands.time_commands import start_scheduler
-from .commands.app_control import open_app_by_name, close_app_by_name
+from .commands.app_control import open_app_by_name, close_app_by_name, load_index
 from user.tasks import TaskManager, execute_task_command
 from user.user_profile import UserProfile, execute_profile_command
 from user.history_logger import HistoryLogger, execute_history_command
-from .tools import TOOLS
+from .tools import TOOLS, TOOL_SCHEMAS
+from .doc_summarizer import DocumentSummarizer
+from web.parse_pool import set_parse_workers, shutdown_parse_pool
+from .tool_grammar import WEB_SEARCH_SCHEMA, build_tool_call_grammar, parse_tool_call_reply
+
+# Веб-стек (requests, BeautifulSoup) и чтение документов импортируются при первом вызове
+web_search_answer = lazy_function("web.web_search", "web_search_answer")
+execute_wikipedia_command = lazy_function("web.web_search", "execute_wikipedia_command")
+execute_weather_command = lazy_function("web.weather", "execute_weather_command")
+execute_currency_command = lazy_function("web.currency", "execute_currency_command")
+read_document = lazy_function("main.tools.read_document", "read_document")
 
 def _enable_windows_ansi():
     try:
@@ -100,36 +117,43 @@ def _safe_shutdown():
     _shutdown_requested = True
     _shutdown_event.set()  # Сигнал всем scheduler'ам
     
-    # Очищаем очередь TTS и останавливаем поток
-    try:
-        while True:
-            _tts_queue.get_nowait()
-    except queue.Empty:
-        pass
-    _tts_queue.put({'cmd': 'quit'})
-    
-    # Даем время на завершение потока TTS
-    time.sleep(0.5)
+    # Очищаем очередь TTS и останавливаем поток (ждём не более 0.5 с)
+    if _tts is not None:
+        _tts.shutdown(timeout=0.5)
+    if _summarizer is not None:
+        _summarizer.shutdown()
+    if _warmup is not None:
+        _warmup.shutdown()
+    if _doc_summarizer is not None:
+        _doc_summarizer.shutdown()
+    # Сервер моделей продолжает работать: следующий запуск агента подключится к нему
+    if _model_client is not None:
+        if rec is not None:
+            rec.close()  # RemoteRecognizer со своим соединением
+        _model_client.close()
+    if _speech is not None:
+        _speech.shutdown()
+    shutdown_parse_pool()
     
-    # Сохраняем все данные пользователя (безопасный доступ через globals)
+    # Сохраняем все данные пользователя (менеджеры появляются в startup())
     print("Сохранение данных...")
     g = globals()
     
-    if 'task_manager' in g:
+    if g.get('task_manager') is not None:
         try:
             g['task_manager']._save()
             print("[SAVE] Задачи сохранены")
         except Exception as e:
             print(f"[SAVE] Ошибка сохранения задач: {e}")
     
-    if 'user_profile' in g:
+    if g.get('user_profile') is not None:
         try:
             g['user_profile']._save()
             print("[SAVE] Профиль сохранен")
         except Exception as e:
             print(f"[SAVE] Ошибка сохранения профиля: {e}")
     
-    if 'history_logger' in g:
+    if g.get('history_logger') is not None:
         try:
             g['history_logger']._save()
             print("[SAVE] История сохранена")
@@ -162,6 +186,8 @@ def _stdin_listener():
                     print("  /color reset — сбросить цвет по умолчанию")
                     print("  /mute — выключить микрофон (распознавание речи)")
                     print("  /unmute — включить микрофон (распознавание речи)")
+                    print("  /reload — перечитать config.json")
+                    print("  /stats — задержки по этапам обработки (p50/p95)")
                     print("  /exit — завершить работу агента")
                     print("  Введите текст без слеша — выполнить команду в текстовом режиме (ответ только в консоли)")
                     continue
@@ -180,13 +206,24 @@ def _stdin_listener():
                 if line == "/mute":
                     with _mic_muted_lock:
                         _mic_muted = True
+                    if _speech is not None:
+                        _speech.set_muted(True)
                     print("[MIC] Микрофон выключен.")
                     continue
                 if line == "/unmute":
                     with _mic_muted_lock:
                         _mic_muted = False
+                    if _speech is not None:
+                        _speech.set_muted(False)
                     print("[MIC] Микрофон включен.")
                     continue
+                if line == "/reload":
+                    if not config.reload():
+                        print("[КОНФИГ] Изменений нет.")
+                    continue
+                if line == "/stats":
+                    print(tracing.format_stats(tracing.stage_stats()))
+                    continue
                 if line == "/exit":
                     _safe_shutdown()
                 # неизвестная команда с префиксом /
@@ -194,7 +231,8 @@ def _stdin_listener():
                 continue
             # Текстовый режим: любая строка без префикса '/' — это команда/запрос
             try:
-                response = route_command(line)
+                with tracing.trace(source="text", text=line), _llm_lock:
+                    response = route_command(line)
             except Exception as e:
                 response = f"Ошибка обработки запроса: {e}"
             print(f"[Вера] {response}")
@@ -203,9 +241,11 @@ def _stdin_listener():
             try:
                 _push_history("user", line)
                 _push_history("assistant", response)
-                history_logger.add_entry(line, response, command_type="text")
+                history_logger.add_entry(line, response, command_type="text", intent=last_intent())
             except Exception as e:
                 print(f"[HISTORY] Ошибка логирования: {e}")
+            _summarizer.touch()
+            _warmup.touch()
         except Exception as e:
             retry_count += 1
             print(f"[STDIN] Ошибка чтения команд (попытка {retry_count}/{max_retries}): {e}")
@@ -241,45 +281,99 @@ except Exception as e:
     print(f"[ERROR] Не удалось загрузить конфигурацию: {e}")
     sys.exit(1)
 
-# Функция проверки активационного слова с учётом возможных искажений
+# Профили маршрутизации для слов активации:
+#   default — обычная маршрутизация (обработчики, затем LLM)
+#   local   — только локальные обработчики, без LLM
+#   web     — сразу веб-поиск
+ROUTE_PROFILES = ("default", "local", "web")
+
+def _load_wake_words() -> tuple[dict[str, str], dict[str, list[str]]]:
+    """Читает таблицу слов активации из config.json (wake_words) с фолбэком на activation_word."""
+    table: dict[str, str] = {}
+    variants: dict[str, list[str]] = {}
+    for entry in cfg.get("wake_words") or []:
+        word = str(entry.get("word", "")).strip()
+        profile = entry.get("profile", "default")
+        if not word:
+            continue
+        if profile not in ROUTE_PROFILES:
+            print(f"[WAKE] Неизвестный профиль '{profile}' для слова '{word}', используется default")
+            profile = "default"
+        table[word] = profile
+        variants[word] = list(entry.get("variants", []))
+    activation_word = cfg["activation_word"]
+    table.setdefault(activation_word, "default")
+    variants.setdefault(activation_word, [])
+    variants[activation_word] += list(cfg.get("activation_variants", []))
+    return table, variants
+
+# Предрасчитанный поиск слов активации с учётом возможных искажений
+_activation = ActivationMatcher(*_load_wake_words())
+
 def _is_activation(fragment: str) -> bool:
-    target = cfg["activation_word"].lower()
-    for word in fragment.split():
-        if difflib.SequenceMatcher(None, word, target).ratio() >= 0.8:
-            return True
-    return False
+    return _activation.match(fragment).profile is not None
 
 def _remove_activation_words(text: str) -> str:
-    target = cfg["activation_word"].lower()
-    tokens = text.split()
-    kept = []
-    for t in tokens:
-        if difflib.SequenceMatcher(None, t, target).ratio() >= 0.8:
-            continue
-        kept.append(t)
-    return " ".join(kept).strip()
+    return _activation.match(text).command
 
-llama_kwargs = {
-    "model_path": cfg["model"]["path"],
-    "n_ctx": cfg["model"]["ctx_size"],
-    "verbose": False,
-}
-if "chat_format" in cfg["model"]:
-    llama_kwargs["chat_format"] = cfg["model"]["chat_format"]
+# Параметры llama.cpp: путь, контекст, формат чата и секция model.runtime
+llama_kwargs = build_llama_kwargs(cfg["model"])
 
-try:
-    llm = Llama(**llama_kwargs)
-except Exception as e:
-    print(f"[ERROR] Не удалось загрузить модель: {e}")
-    sys.exit(1)
+# Модели, фоновые службы и менеджеры создаются в startup(); импорт модуля ничего не загружает
+llm = None  # SerializedModel
+_yield_processor = None
+
+# llama.cpp не потокобезопасен: запросы пользователя вытесняют фоновую работу с моделью
+# (прогрев, сжатие истории), а не ждут её окончания
+_llm_lock = PreemptibleLock()
+
+
+def _load_llm():
+    print("[LLM] Загрузка модели...")
+    try:
+        from llama_cpp import Llama
+        # Параллельные подкоманды мультизадачи могут вызвать модель одновременно — генерации идут по одной
+        return SerializedModel(Llama(**llama_kwargs))
+    except Exception as e:
+        print(f"[ERROR] Не удалось загрузить модель: {e}")
+        raise SystemExit(1)
+
+# Модели в отдельном долгоживущем процессе (main/model_server.py): перезапуск агента их не перезагружает
+_model_server_cfg = cfg.get("model_server", {})
+_model_client = None  # ModelServerClient
 
-_print_banner_and_tips(cfg["activation_word"])
+def _connect_model_server():
+    """Подключение к серверу моделей: клиент, удалённая модель и распознаватель Vosk."""
+    from .model_server import RemoteLlama, RemoteRecognizer, connect
+    try:
+        client = connect(_model_server_cfg)
+    except Exception as e:
+        print(f"[ERROR] Сервер моделей недоступен: {e}")
+        raise SystemExit(1)
+    # Распознаватель не нужен, если речь распознаёт отдельный процесс (processes.speech)
+    recognizer = None if _processes_cfg.get("speech", False) else RemoteRecognizer(client, samplerate)
+    return client, SerializedModel(RemoteLlama(client)), recognizer
 
 # Простая краткосрочная память диалога (в пределах процесса)
-# Используем deque для автоматического управления размером
-_HISTORY_MAX_TURNS = 8
+# Используем deque для автоматического управления размером;
+# сколько реплик реально попадёт в промпт, решает ContextBuilder по бюджету токенов
+_HISTORY_MAX_TURNS = 32
 CONV_HISTORY: deque = deque(maxlen=_HISTORY_MAX_TURNS * 2)
 
+def _context_budget() -> int:
+    """Бюджет токенов на промпт: model.context_budget или ctx_size минус запас на ответ."""
+    mcfg = cfg["model"]
+    # Размер контекста загруженной модели: ctx_size из перечитанного конфига применится только после перезапуска
+    ctx_size = int(llama_kwargs["n_ctx"])
+    max_tokens = int(mcfg.get("max_tokens", 0) or 0)
+    reserve = max_tokens if max_tokens > 0 else 1024
+    budget = int(mcfg.get("context_budget", 0) or 0)
+    if budget <= 0:
+        budget = ctx_size - reserve
+    return max(256, min(budget, ctx_size - 64))
+
+_context: Optional[ContextBuilder] = None
+
 def _push_history(role: str, content: str) -> None:
     if not content:
         return
@@ -292,117 +386,79 @@ def _last_by_role(role: str) -> Optional[str]:
             return msg["content"]
     return None
 
-_tts_queue: "queue.Queue[dict]" = queue.Queue()
-_tts_thread: Optional[threading.Thread] = None
+# Фоновый поток TTS: событийная очередь реплик, предсинтез и кэш стандартных фраз
+_tts: Optional[TTSWorker] = None
 
-def _tts_worker():
-    retry_count = 0
-    max_retries = 3
-    
-    while retry_count < max_retries:
-        try:
-            engine = pyttsx3.init()
-            voices = engine.getProperty('voices')
-            voice_index = cfg["tts"]["voice_index"]
-            if 0 <= voice_index < len(voices):
-                engine.setProperty('voice', voices[voice_index].id)
-            engine.setProperty('rate', cfg["tts"]["rate"])
-            engine.setProperty('volume', cfg["tts"]["volume"])
-
-            # Непрерывный цикл обработки без повторного запуска run loop
-            engine.startLoop(False)
-            while True:
-                # Обрабатываем команды из очереди (блокируем с таймаутом вместо busy-wait)
-                try:
-                    cmd = _tts_queue.get(timeout=0.05)
-                except queue.Empty:
-                    cmd = None
-
-                if cmd is not None:
-                    action = cmd.get('cmd')
-                    if action == 'say':
-                        text = cmd.get('text', '')
-                        if text:
-                            engine.say(text)
-                    elif action == 'stop':
-                        try:
-                            engine.stop()
-                        except Exception:
-                            pass
-                    elif action == 'quit':
-                        try:
-                            engine.endLoop()
-                        except Exception:
-                            pass
-                        return  # Нормальное завершение
-
-                # Один тик цикла движка
-                try:
-                    engine.iterate()
-                except Exception as e:
-                    print(f"[TTS] Ошибка в цикле: {e}")
-        except Exception as e:
-            retry_count += 1
-            print(f"[TTS] Критическая ошибка TTS потока (попытка {retry_count}/{max_retries}): {e}")
-            if retry_count >= max_retries:
-                print("[TTS] ФАТАЛЬНО: TTS поток остановлен после множественных сбоев")
-                print("[TTS] Агент продолжит работу, но озвучивание недоступно")
-                break
-            time.sleep(1)  # Пауза перед повторной попыткой
-
-# Запускаем фоновый поток TTS один раз
-_tts_thread = threading.Thread(target=_tts_worker, daemon=True)
-_tts_thread.start()
+def _start_tts() -> TTSWorker:
+    cache = None
+    if cfg["tts"].get("cache_enabled", True):
+        cache = AudioCache(
+            get_data_dir() / "tts_cache",
+            max_bytes=int(cfg["tts"].get("cache_max_mb", 64)) * 1024 * 1024,
+        )
+    worker = TTSWorker(cfg["tts"], cache=cache, on_audio_start=tracing.complete)
+    worker.start()
+    return worker
 
 def _clean_for_tts(text: str) -> str:
     """Удаляет из ответа источники и ссылки, чтобы TTS их не зачитывал. Преобразует годы в правильное произношение."""
     try:
-        s = text or ""
-        # Удаляем блок вида "(источники: ... )" в конце
-        s = re.sub(r"\s*\(источники?:.*?\)\s*$", "", s, flags=re.IGNORECASE | re.DOTALL)
-        # Удаляем строки, начинающиеся с "источники:"
-        s = re.sub(r"\bисточники?:.*$", "", s, flags=re.IGNORECASE)
-        # Удаляем URL
-        s = re.sub(r"https?://\S+", "", s)
-        # Сжимаем пробелы
-        s = re.sub(r"\s{2,}", " ", s).strip()
-        # Преобразуем годы в правильное произношение
-        s = convert_years_in_text(s)
-        return s
+        return normalize_for_tts(text)
     except Exception:
         return text
 
-def speak(text: str):
-    try:
-        while True:
-            _tts_queue.get_nowait()
-    except queue.Empty:
-        pass
-
-    _tts_queue.put({'cmd': 'stop'})
-    safe_text = _clean_for_tts(text)
-    _tts_queue.put({'cmd': 'say', 'text': safe_text})
-    return _tts_thread
+def speak(text: str) -> int:
+    """Прерывает текущую речь и озвучивает текст. Возвращает id реплики для отмены."""
+    return _tts.speak(_clean_for_tts(text))
 
 def interrupt_speech():
-    _tts_queue.put({'cmd': 'stop'})
+    _tts.stop()
 
-print("Загрузка модели Vosk...")
-try:
-    # Читаем путь к модели из конфигурации
-    vosk_cfg = cfg.get("vosk", {})
+# Читаем путь к модели из конфигурации
+vosk_cfg = cfg.get("vosk", {})
+samplerate = vosk_cfg.get("samplerate", 16000)
+vosk_model = None
+rec = None
+
+def _load_vosk():
+    """Модель Vosk и распознаватель (в отдельном потоке, параллельно с LLM)."""
     model_path = vosk_cfg.get("model_path", "vosk-model-small-ru-0.22")  # Fallback для совместимости
-    samplerate = vosk_cfg.get("samplerate", 16000)
-    
-    print(f"[VOSK] Загрузка модели из: {model_path}")
-    vosk_model = vosk.Model(model_path)
-    print(f"[VOSK] Модель успешно загружена")
-except Exception as e:
-    print(f"[ERROR] Ошибка загрузки модели Vosk из '{model_path}': {e}")
-    print(f"[ERROR] Убедитесь, что путь к модели указан правильно в config.json")
-    sys.exit(1)
+    try:
+        import vosk
+        print(f"[VOSK] Загрузка модели из: {model_path}")
+        model = vosk.Model(model_path)
+        print(f"[VOSK] Модель успешно загружена")
+    except Exception as e:
+        print(f"[ERROR] Ошибка загрузки модели Vosk из '{model_path}': {e}")
+        print(f"[ERROR] Убедитесь, что путь к модели указан правильно в config.json")
+        raise SystemExit(1)
+    return model, vosk.KaldiRecognizer(model, samplerate)
+
+# Захват звука и Vosk в отдельном процессе, разбор веб-страниц в пуле процессов
+_processes_cfg = cfg.get("processes", {})
+_speech = None  # SpeechProcess
+
+def _start_speech_process():
+    from .speech_process import SpeechProcess
+    speech = SpeechProcess(vosk_cfg.get("model_path", "vosk-model-small-ru-0.22"), samplerate)
+    try:
+        pid = speech.start()
+    except Exception as e:
+        print(f"[ERROR] Не удалось запустить процесс распознавания: {e}")
+        raise SystemExit(1)
+    print(f"[VOSK] Распознавание речи в процессе {pid}")
+    return speech
 
-rec = vosk.KaldiRecognizer(vosk_model, samplerate)
+def _local_speech_events():
+    """События распознавания в процессе агента: микрофон -> очередь -> KaldiRecognizer."""
+    import sounddevice as sd
+    with sd.RawInputStream(samplerate=samplerate, blocksize=8000, dtype='int16', channels=1, callback=audio_callback):
+        while not _shutdown_requested:
+            data = q.get()
+            if rec.AcceptWaveform(data):
+                yield "final", json.loads(rec.Result())["text"]
+            else:
+                yield "partial", json.loads(rec.PartialResult()).get("partial", "")
 
 q = queue.Queue()
 
@@ -419,73 +475,214 @@ _WEB_CFG = cfg["web_search"]
 LAST_SEARCH_URLS: list[str] = []
 set_speak_callback(speak)
 set_last_search_urls_ref(LAST_SEARCH_URLS)
-set_reminder_shutdown_event(_shutdown_event)  # Передаём event для graceful shutdown
-start_scheduler()
 
-# Инициализация планировщика запуска/закрытия приложений
-set_scheduled_speak_callback(speak)
-set_open_app_callback(open_app_by_name)
-set_close_app_callback(close_app_by_name)
-set_app_scheduler_shutdown_event(_shutdown_event)  # Передаём event для graceful shutdown
-start_app_scheduler()
+def _start_schedulers() -> None:
+    set_reminder_shutdown_event(_shutdown_event)  # Передаём event для graceful shutdown
+    start_scheduler()
+
+    # Инициализация планировщика запуска/закрытия приложений
+    set_scheduled_speak_callback(speak)
+    set_open_app_callback(open_app_by_name)
+    set_close_app_callback(close_app_by_name)
+    set_app_scheduler_shutdown_event(_shutdown_event)  # Передаём event для graceful shutdown
+    start_app_scheduler()
 
 # Инициализация новых модулей
 DATA_DIR = get_data_dir()
 DATA_DIR.mkdir(exist_ok=True)
 
-task_manager = TaskManager(DATA_DIR / "tasks.json")
-user_profile = UserProfile(DATA_DIR / "user_profile.json")
-history_logger = HistoryLogger(DATA_DIR / "history.json", max_entries=1000)
+task_manager: Optional[TaskManager] = None
+user_profile: Optional[UserProfile] = None
+history_logger: Optional[HistoryLogger] = None
 
-print(f"[INFO] Модули задач, профиля и истории инициализированы.")
+def _generate_summary(messages: list) -> str:
+    result = llm.create_chat_completion(messages=messages, temperature=0.2, max_tokens=256,
+                                        logits_processor=_yield_processor)
+    return result["choices"][0]["message"]["content"]
 
-# Предрасчитанные обработчики для маршрутизации команд
-HANDLERS_WITH_MANAGERS = (
-    partial(execute_task_command, task_manager=task_manager),
-    partial(execute_profile_command, user_profile=user_profile),
-    partial(execute_history_command, history_logger=history_logger),
-    partial(execute_user_name_command, user_profile=user_profile),
-)
+# Сжатие старой части диалога в сводку во время простоя; сводка хранится в history.json
+_memory_cfg = cfg.get("memory", {})
+_summarizer: Optional[ConversationSummarizer] = None
+
+def _start_summarizer() -> ConversationSummarizer:
+    summarizer = ConversationSummarizer(
+        CONV_HISTORY,
+        _context.count_tokens,
+        _generate_summary,
+        _llm_lock,
+        threshold_tokens=int(_memory_cfg.get("summary_threshold_tokens", 1536)),
+        keep_turns=int(_memory_cfg.get("summary_keep_turns", 2)),
+        idle_seconds=float(_memory_cfg.get("summary_idle_sec", 5)),
+        get_summary=lambda: history_logger.summary,
+        set_summary=history_logger.set_summary,
+    )
+    if _memory_cfg.get("summary_enabled", True):
+        summarizer.start()
+    return summarizer
+
+# Классификатор намерений между регулярками и LLM; модель обучается при первом запуске
+_intent_cfg = cfg.get("intent", {})
+_intent_model = None
+
+def _load_intent_model():
+    if not _intent_cfg.get("enabled", True):
+        return None
+    try:
+        return load_or_train(DATA_DIR / "intent_model.npz", DATA_DIR / "history.json")
+    except Exception as e:
+        print(f"[INTENT] Классификатор намерений недоступен: {e}")
+        return None
+
+# Предрасчитанные обработчики для маршрутизации команд (заполняются в startup())
+HANDLERS_WITH_MANAGERS: tuple = ()
 
 
 # Маршрутизация команд
-def route_command(text: str) -> str:
+_multitask_cfg = cfg.get("multitask", {})
+# Намерение запроса (обработчик, web_search, llm) — пишется в историю для обучения классификатора.
+# Подкоманды мультизадачи выполняются в пуле в копиях контекста (tracing.bind), поэтому
+# намерение и источники поиска хранятся в contextvars, а не в общих глобальных переменных
+_intent_var: contextvars.ContextVar[str] = contextvars.ContextVar("vera_intent", default="")
+# Список, куда подкоманда мультизадачи складывает источники своего веб-поиска
+_sources_var: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("vera_sources", default=None)
+
+
+def last_intent() -> str:
+    """Намерение последнего запроса, маршрутизированного в текущем потоке."""
+    return _intent_var.get()
+
+
+def _web_search(query: str) -> str:
+    """web_search_answer со своим списком источников: параллельные поиски не смешивают их."""
+    urls: list[str] = []
+    try:
+        return web_search_answer(query, _WEB_CFG, SYSTEM_PROMPT, llm, urls)
+    finally:
+        collected = _sources_var.get()
+        if collected is not None:
+            collected.extend(urls)  # Подкоманда: источники всей фразы соберёт _route_multitask
+        else:
+            LAST_SEARCH_URLS[:] = urls
+
+
+def _handler_name(h) -> str:
+    return getattr(h, "__name__", "") or getattr(getattr(h, "func", None), "__name__", "handler")
+
+
+def _run_handlers(text: str) -> Optional[str]:
+    """Прогоняет текст через обработчики команд; None — ни один не сработал."""
+    # Сначала обработчики с менеджерами, затем валюты, погода и википедия, затем остальные команды
+    for h in (*HANDLERS_WITH_MANAGERS, execute_currency_command, execute_weather_command,
+              execute_wikipedia_command, *HANDLERS):
+        name = _handler_name(h)
+        with tracing.span(f"handler.{name}") as sp:
+            try:
+                res = h(text)
+            except Exception as e:
+                print(f"[ERROR] {name}: {e}")
+                sp.set(error=type(e).__name__)
+                res = None
+            if res is not None:
+                sp.set(matched=True)
+        if res is not None:
+            _intent_var.set(HANDLER_INTENTS.get(getattr(h, "__name__", ""), "command"))
+            return res
+    return None
+
+
+def _classify_intent(text: str) -> Optional[str]:
+    """Команда, которую пропустили регулярки, по классификатору намерений; None — вопрос для LLM."""
+    if _intent_model is None:
+        return None
+    with tracing.span("intent") as sp:
+        intent, prob = _intent_model.predict(text)
+        sp.set(intent=intent, prob=round(float(prob), 3))
+    if routed_intent(intent, prob, float(_intent_cfg.get("threshold", 0.8)),
+                     float(_intent_cfg.get("action_threshold", 0.97))) == LLM_INTENT:
+        return None
+    print(f"[INTENT] {intent} ({prob:.2f})")
+    if intent == WEB_SEARCH_INTENT:
+        res = _route_web_search(text)
+    else:
+        res = _run_handlers(INTENT_COMMANDS[intent])
+    if res is not None:
+        # Ответы по классификатору не попадают в обучающую выборку
+        _intent_var.set(f"classified:{intent}")
+    return res
+
+
+def route_command(text: str, profile: str = "default") -> str:
+    with tracing.span("route", profile=profile) as sp:
+        response = _route_command(text, profile)
+        sp.set(intent=_intent_var.get())
+    return response
+
+
+def _route_command(text: str, profile: str) -> str:
+    # Профиль web: сразу веб-поиск, минуя обработчики и модель
+    if profile == "web":
+        _intent_var.set(WEB_SEARCH_INTENT)
+        return _route_web_search(text)
+
     # Проверка на мультизадачность ПЕРВОЙ
-    is_multi, response = execute_multitask(text, route_command)
+    is_multi, response = _route_multitask(text, profile)
     if is_multi:
+        _intent_var.set("multitask")
         return response
 
-    # Сначала проверяем обработчики с менеджерами
-    for h in HANDLERS_WITH_MANAGERS:
-        try:
-            res = h(text)
-        except Exception as e:
-            print(f"[ERROR] handler: {e}")
-            res = None
-        if res is not None:
-            return res
+    res = _run_handlers(text)
+    if res is not None:
+        return res
     
-    # Проверяем валюты, погоду и википедию (специальные обработчики)
-    for h in (execute_currency_command, execute_weather_command, execute_wikipedia_command):
-        try:
-            res = h(text)
-        except Exception as e:
-            print(f"[ERROR] {h.__name__}: {e}")
-            res = None
-        if res is not None:
-            return res
-    
-    # Остальные команды из модулей
-    for h in HANDLERS:
-        try:
-            res = h(text)
-        except Exception as e:
-            print(f"[ERROR] {h.__name__}: {e}")
-            res = None
-        if res is not None:
-            return res
-    
-    return ask_llm(text)
+    # Профиль local: модель не вызываем
+    if profile == "local":
+        _intent_var.set("")
+        return "Такой команды я не знаю."
+
+    res = _classify_intent(text)
+    if res is not None:
+        return res
+
+    _intent_var.set(LLM_INTENT)
+    return ask_llm(text, profile)
+
+
+def _route_subcommand(command: str, profile: str, sources: dict[str, list]) -> str:
+    urls: list[str] = []
+    token = _sources_var.set(urls)
+    try:
+        return route_command(command, profile)
+    finally:
+        _sources_var.reset(token)
+        sources.setdefault(command, urls)
+
+
+def _route_multitask(text: str, profile: str) -> tuple[bool, str]:
+    """execute_multitask; источники веб-поиска подкоманд публикуются в порядке команд."""
+    sources: dict[str, list] = {}
+    is_multi, response = execute_multitask(
+        text, partial(_route_subcommand, profile=profile, sources=sources),
+        parallel=bool(_multitask_cfg.get("parallel", True)),
+        timeout=float(_multitask_cfg.get("timeout_sec", 15)),
+        max_workers=int(_multitask_cfg.get("max_workers", 4)),
+    )
+    if is_multi and any(sources.values()):
+        urls = list(dict.fromkeys(u for cmd in parse_multitask(text) for u in sources.get(cmd, ())))
+        collected = _sources_var.get()
+        if collected is not None:
+            collected.extend(urls)
+        else:
+            LAST_SEARCH_URLS[:] = urls
+    return is_multi, response
+
+
+def _route_web_search(text: str) -> str:
+    try:
+        with tracing.span("web_search"):
+            return _web_search(text)
+    except Exception as e:
+        print(f"[WEB_SEARCH] Ошибка: {e}")
+        return "Не удалось выполнить веб-поиск сейчас."
 
 
 SYSTEM_PROMPT_PATH = Path(__file__).resolve().parent / "system_prompt.txt"
@@ -562,22 +759,10 @@ def _should_use_web_search(user_text: str) -> bool:
     except Exception:
         return False
 
-def ask_llm(user_text: str) -> str:
-    # Быстрый путь: если есть ключевые слова веб-поиска — сразу ищем, минуя модель
-    if _should_use_web_search(user_text):
-        try:
-            # print(f"[FAST_PATH] Веб-поиск по ключевым словам: {user_text}")
-            return web_search_answer(user_text, _WEB_CFG, SYSTEM_PROMPT, llm, LAST_SEARCH_URLS)
-        except Exception as e:
-            print(f"[WEB_SEARCH] Ошибка быстрого поиска: {e}")
-            # Продолжаем обычный путь через модель
-    
-    # Формируем системный промпт с информацией о пользователе
-    system_content = SYSTEM_PROMPT
-    
-    # Добавляем информацию из профиля пользователя
+def _profile_info() -> list[str]:
+    """Информация о пользователе, которая дописывается к системному промпту."""
+    profile_info = []
     try:
-        profile_info = []
         if user_profile.name:
             profile_info.append(f"Имя пользователя: {user_profile.name}")
         
@@ -585,20 +770,154 @@ def ask_llm(user_text: str) -> str:
         if notes:
             for note in notes[:5]:  # Берём до 5 заметок
                 profile_info.append(f"{note.key.replace('_', ' ')}: {note.value}")
-        
-        if profile_info:
-            system_content += "\n\nИнформация о пользователе:\n" + "\n".join(profile_info)
     except Exception as e:
         print(f"[LLM] Ошибка добавления профиля: {e}")
-    
-    messages = [{"role": "system", "content": system_content}]
-    # Краткая история диалога
+    return profile_info
+
+def _system_content() -> str:
+    return _context.build_system(SYSTEM_PROMPT, _profile_info(), history_logger.summary)
+
+# Прогрев модели при старте и после долгого простоя
+_warmup: Optional[ModelWarmup] = None
+
+def _start_warmup() -> ModelWarmup:
+    warmup = ModelWarmup(
+        llm.model,
+        _llm_lock,
+        llama_kwargs["model_path"],
+        _system_content,
+        chat_format=cfg["model"].get("chat_format", ""),
+        idle_seconds=float(cfg["model"].get("warmup_idle_sec", 600)),
+        logits_processor=_yield_processor,
+    )
+    # Удалённая модель остаётся загруженной в сервере; прогрев KV-кэша требует доступа к llama.cpp в процессе
+    if cfg["model"].get("warmup_enabled", True) and _model_client is None:
+        warmup.start()
+    return warmup
+
+def _load_tool_grammar():
+    """Грамматика вызова инструментов (model.tool_call_mode = "grammar") или None для разбора регулярками."""
+    mode = cfg["model"].get("tool_call_mode", "grammar")
+    if mode != "grammar":
+        return None
     try:
-        for m in CONV_HISTORY[-(_HISTORY_MAX_TURNS * 2):]:
-            messages.append(m)
-    except Exception:
-        pass
-    messages.append({"role": "user", "content": user_text})
+        gbnf = build_tool_call_grammar({"web_search": WEB_SEARCH_SCHEMA, **TOOL_SCHEMAS})
+        if _model_client is not None:
+            # Сервер моделей собирает и кэширует LlamaGrammar сам
+            return gbnf
+        from llama_cpp import LlamaGrammar
+        return LlamaGrammar.from_string(gbnf, verbose=False)
+    except Exception as e:
+        print(f"[LLM] Не удалось собрать грамматику вызова инструментов, используется разбор ответа: {e}")
+        return None
+
+_tool_grammar = None
+
+def _load_response_cache() -> Optional[ResponseCache]:
+    """Кэш ответов модели; эмбеддинги — отдельным экземпляром модели в режиме embedding, если он задан."""
+    rc = cfg.get("response_cache", {})
+    if not rc.get("enabled", True):
+        return None
+    embed = None
+    embedding_model = rc.get("embedding_model", "")
+    if embedding_model:
+        path = Path(embedding_model)
+        if not path.is_absolute():
+            path = DATA_DIR.parent / path
+        try:
+            from llama_cpp import Llama
+            # Основная модель создана без embedding=True, и llm.embed на ней недоступен
+            embed_llm = Llama(model_path=str(path), embedding=True, n_ctx=512,
+                              n_threads=llama_kwargs["n_threads"], verbose=False)
+            embed = embed_llm.embed
+        except Exception as e:
+            print(f"[RESPONSE_CACHE] Модель эмбеддингов не загружена, только точные совпадения: {e}")
+    return ResponseCache(
+        DATA_DIR / "response_cache.json",
+        ttl_seconds=float(rc.get("ttl_hours", 24)) * 3600,
+        max_entries=int(rc.get("max_entries", 256)),
+        embed=embed,
+        similarity=float(rc.get("similarity", 0.92)),
+    )
+
+_response_cache: Optional[ResponseCache] = None
+
+# Пересказ длинных документов по частям (map-reduce), чтобы не выходить за n_ctx
+_docs_cfg = cfg.get("documents", {})
+
+def _generate_doc_summary(messages: list[dict], gen_args: dict) -> str:
+    result = llm.create_chat_completion(messages=messages, **gen_args)
+    return result["choices"][0]["message"]["content"]
+
+_doc_summarizer: Optional[DocumentSummarizer] = None
+
+def _doc_gen_args() -> dict:
+    return {k: cfg["model"][k] for k in ("temperature", "top_p", "top_k", "min_p", "repeat_penalty", "seed")
+            if k in cfg["model"]}
+
+def _create_doc_summarizer() -> DocumentSummarizer:
+    # Каждый экземпляр генерирует со своими gen_args: заменённый дочитывает документ с прежними
+    summarizer = DocumentSummarizer(
+        lambda messages: _generate_doc_summary(messages, summarizer.gen_args),
+        _context.count_tokens,
+        n_ctx=int(llama_kwargs["n_ctx"]),
+        max_tokens=int(_docs_cfg.get("summary_max_tokens", 256)),
+        system_prompt=SYSTEM_PROMPT,
+        chunk_tokens=int(_docs_cfg.get("summary_chunk_tokens", 0)),
+        workers=int(_docs_cfg.get("summary_workers", 1)),
+        # Пул процессов загружает свои копии модели; с сервером моделей части идут через него
+        llama_kwargs=llama_kwargs if _model_client is None else None,
+        gen_args=_doc_gen_args(),
+    )
+    return summarizer
+
+def _doc_summary_progress(done: int, total: int) -> None:
+    """Озвучивает ход чтения большого документа, не прерывая текущую речь."""
+    if not _docs_cfg.get("progress_speech", True) or total < 3 or done >= total:
+        return
+    if done == 1:
+        _tts.speak(f"Документ большой, читаю по частям. Готово 1 из {total}.", interrupt=False)
+    else:
+        _tts.speak(f"Готово {done} из {total}.", interrupt=False)
+
+def _remember_reply(cache: Optional[ResponseCache], user_text: str, reply: str, scope: str = "") -> str:
+    if cache is not None and reply:
+        cache.put(user_text, reply, scope)
+    return reply
+
+def _cache_scope(profile: str, profile_info: list[str]) -> str:
+    """Область кэша ответов: профиль маршрутизации и сведения о пользователе из системного промпта."""
+    digest = zlib.crc32("\n".join(profile_info).encode("utf-8"))
+    return f"{profile}:{digest:08x}"
+
+def ask_llm(user_text: str, profile: str = "default") -> str:
+    # Быстрый путь: если есть ключевые слова веб-поиска — сразу ищем, минуя модель
+    if _should_use_web_search(user_text):
+        try:
+            # print(f"[FAST_PATH] Веб-поиск по ключевым словам: {user_text}")
+            with tracing.span("web_search", fast_path=True):
+                return _web_search(user_text)
+        except Exception as e:
+            print(f"[WEB_SEARCH] Ошибка быстрого поиска: {e}")
+            # Продолжаем обычный путь через модель
+
+    # Кэш только для вопросов, не зависящих от времени и от предыдущих реплик,
+    # и не для творческих просьб, где каждый раз ждут новый ответ
+    # Глобальный кэш читается один раз: перезагрузка настроек может выключить его во время генерации
+    cache = _response_cache
+    profile_info = _profile_info()
+    if _should_use_web_search(user_text) or is_context_dependent(user_text) or is_open_ended(user_text):
+        cache = None
+    scope = _cache_scope(profile, profile_info) if cache is not None else ""
+    if cache is not None:
+        with tracing.span("response_cache") as sp:
+            cached = cache.get(user_text, scope)
+            sp.set(hit=bool(cached))
+        if cached:
+            return cached
+    
+    # Системный промпт, история диалога в пределах бюджета токенов и запрос
+    messages = _context.build(SYSTEM_PROMPT, CONV_HISTORY, user_text, profile_info, history_logger.summary)
     allowed = {"temperature", "top_p", "top_k", "min_p", "repeat_penalty", "max_tokens", "seed", "stop"}
     mcfg = cfg["model"]
     gen_args = {k: mcfg[k] for k in allowed if k in mcfg}
@@ -610,7 +929,11 @@ def ask_llm(user_text: str) -> str:
         except Exception:
             pass
     try:
-        result = llm.create_chat_completion(messages=messages, **gen_args)
+        t0 = time.perf_counter()
+        # В режиме грамматики модель за один проход выдаёт либо текст, либо корректный вызов
+        grammar_args = {"grammar": _tool_grammar} if _tool_grammar is not None else {}
+        result = tracing.traced_completion(llm, messages=messages, **gen_args, **grammar_args)
+        _warmup.record_response(time.perf_counter() - t0)
         assistant_reply = result["choices"][0]["message"]["content"].strip()
         # Удаляем теги мышления, если они все же появились
         assistant_reply = re.sub(r"<think>.*?</think>", "", assistant_reply, flags=re.DOTALL).strip()
@@ -619,7 +942,10 @@ def ask_llm(user_text: str) -> str:
         return "Сейчас не могу ответить. Проверьте модель в config.json и попробуйте снова."
 
     # Обработка вызова инструмента от модели
-    tool = _parse_tool_call(assistant_reply)
+    if _tool_grammar is not None:
+        tool = parse_tool_call_reply(assistant_reply)
+    else:
+        tool = _parse_tool_call(assistant_reply)
     if tool:
         tool_name = tool.get("name", "")
         args = tool.get("arguments") or {}
@@ -630,7 +956,7 @@ def ask_llm(user_text: str) -> str:
                 query = str(args.get("query") or user_text).strip()
                 if not query:
                     return "Что искать? Уточните запрос."
-                return web_search_answer(query, _WEB_CFG, SYSTEM_PROMPT, llm, LAST_SEARCH_URLS)
+                return _web_search(query)
             except Exception as e:
                 print(f"[WEB_SEARCH] Ошибка: {e}")
                 return "Не удалось выполнить веб-поиск сейчас."
@@ -639,6 +965,18 @@ def ask_llm(user_text: str) -> str:
         if tool_name in TOOLS:
             try:
                 print(f"[TOOL_CALL] {tool_name}: {args}")
+                filename = str(args.get("filename") or "").strip()
+                if tool_name == "read_document" and filename:
+                    # Документ читается целиком и пересказывается по частям в пределах n_ctx
+                    tool_result = read_document(filename, max_length=0)
+                    if len(tool_result) > 100:
+                        try:
+                            return _doc_summarizer.summarize(tool_result, Path(filename).name, user_text,
+                                                             on_progress=_doc_summary_progress)
+                        except Exception as e:
+                            print(f"[TOOL] Ошибка суммаризации: {e}")
+                            return tool_result[:2000] + "..." if len(tool_result) > 2000 else tool_result
+                    return tool_result
                 tool_result = TOOLS[tool_name](args)
                 
                 # Передаём результат модели для анализа/пересказа
@@ -651,7 +989,8 @@ def ask_llm(user_text: str) -> str:
                         {"role": "user", "content": "Кратко перескажи основное содержание."}
                     ]
                     try:
-                        result = llm.create_chat_completion(messages=summary_messages, **gen_args)
+                        result = tracing.traced_completion(llm, "llm.tool_summary", messages=summary_messages,
+                                                           **gen_args)
                         summary = result["choices"][0]["message"]["content"].strip()
                         summary = re.sub(r"<think>.*?</think>", "", summary, flags=re.DOTALL).strip()
                         return summary
@@ -665,90 +1004,269 @@ def ask_llm(user_text: str) -> str:
                 print(f"[TOOL] Ошибка выполнения {tool_name}: {e}")
                 return f"Ошибка выполнения {tool_name}: {e}"
 
+    if _tool_grammar is not None:
+        # Грамматика не допускает тегов вызова внутри обычного текста
+        return _remember_reply(cache, user_text, assistant_reply, scope)
+
     # Очищаем tool call теги из ответа, если они остались (модель вернула их, но они не обработались)
     assistant_reply = re.sub(r"<\|tool_call\|>.*?</\|tool_call\|>", "", assistant_reply, flags=re.DOTALL).strip()
     assistant_reply = re.sub(r"<\|tool_call\|>.*?<\|tool_call\|>", "", assistant_reply, flags=re.DOTALL).strip()
     assistant_reply = re.sub(r"<tool_call>.*?</tool_call>", "", assistant_reply, flags=re.DOTALL).strip()
     assistant_reply = re.sub(r"<\|tool_call\|>\s*\{.*?\}", "", assistant_reply, flags=re.DOTALL).strip()
     
-    return assistant_reply
+    return _remember_reply(cache, user_text, assistant_reply, scope)
+
+_startup_profiler: Optional[StartupProfiler] = None
+
+
+def _prefetch_imports() -> None:
+    """Импортирует веб-стек в фоне, чтобы первая команда не ждала requests и BeautifulSoup."""
+    for module in ("web.web_search", "web.weather", "web.currency"):
+        try:
+            __import__(module)
+        except Exception as e:
+            print(f"[STARTUP] Не удалось импортировать {module}: {e}")
+
+
+def _configure_tracing(new: dict, old: Optional[dict] = None) -> None:
+    tracing.configure(DATA_DIR / "traces.jsonl", enabled=bool(new.get("enabled", True)),
+                      max_mb=float(new.get("max_mb", 5)))
+
+
+def _reload_activation(new, old) -> None:
+    global _activation
+    _activation = ActivationMatcher(*_load_wake_words())
+
+
+def _apply_model_cfg(new: dict, old: dict) -> None:
+    """Параметры генерации читаются из cfg["model"] при каждом запросе; здесь — то, что хранят службы."""
+    _context.budget_tokens = _context_budget()
+    _warmup.idle_seconds = float(new.get("warmup_idle_sec", 600))
+    # Пул пересказа документов с загруженными копиями модели сохраняется: меняются только параметры генерации
+    _doc_summarizer.gen_args = dict(_doc_gen_args(), max_tokens=_doc_summarizer.max_tokens)
+
+
+def _apply_memory_cfg(new: dict, old: dict) -> None:
+    _summarizer.threshold_tokens = int(new.get("summary_threshold_tokens", 1536))
+    _summarizer.keep_turns = int(new.get("summary_keep_turns", 2))
+    _summarizer.idle_seconds = float(new.get("summary_idle_sec", 5))
+
+
+def _apply_response_cache_cfg(new: dict, old: dict) -> None:
+    global _response_cache
+    if not new.get("enabled", True):
+        _response_cache = None
+    elif _response_cache is None:
+        _response_cache = _load_response_cache()
+    else:
+        _response_cache.ttl_seconds = float(new.get("ttl_hours", 24)) * 3600
+        _response_cache.max_entries = int(new.get("max_entries", 256))
+        _response_cache.similarity = float(new.get("similarity", 0.92))
+
+
+def _apply_documents_cfg(new: dict, old: dict) -> None:
+    global _doc_summarizer
+    old_summarizer, _doc_summarizer = _doc_summarizer, _create_doc_summarizer()
+    # Документ, который читается сейчас, дочитывается старым пулом
+    old_summarizer.retire()
+
+
+def _watch_config() -> None:
+    """Подписки на секции config.json: настройки применяются без перезапуска и перезагрузки моделей.
+
+    Секции web_search, multitask, intent, sites, commands и silence_timeout
+    модули читают из общих словарей при каждом вызове, им подписка не нужна.
+    """
+    config.subscribe("tts", lambda new, old: _tts.update_settings(new))
+    config.subscribe("model", _apply_model_cfg)
+    config.subscribe("memory", _apply_memory_cfg)
+    config.subscribe("response_cache", _apply_response_cache_cfg)
+    config.subscribe("documents", _apply_documents_cfg)
+    config.subscribe("tracing", _configure_tracing)
+    for section in ("activation_word", "activation_variants", "wake_words"):
+        config.subscribe(section, _reload_activation)
+    reload_cfg = cfg.get("config_reload", {})
+    if reload_cfg.get("enabled", True):
+        config.start_watching(float(reload_cfg.get("interval_sec", 2)), _shutdown_event)
+
+
+def startup() -> StartupProfiler:
+    """Загружает модели и запускает фоновые службы; повторный вызов ничего не делает.
+
+    Модель llama.cpp, модель Vosk, индекс приложений и классификатор намерений
+    независимы и грузятся в отдельных потоках. Остальные фазы зависят от
+    модели (токенизатор, прогрев) и идут после неё.
+    """
+    global _startup_profiler, _tts, llm, _yield_processor, _context, vosk_model, rec, _intent_model
+    global task_manager, user_profile, history_logger, HANDLERS_WITH_MANAGERS
+    global _summarizer, _warmup, _tool_grammar, _response_cache, _doc_summarizer, _model_client, _speech
+    if _startup_profiler is not None:
+        return _startup_profiler
+    profiler = StartupProfiler()
+    _configure_tracing(cfg.get("tracing", {}))
+
+    with profiler.phase("tts"):
+        _tts = _start_tts()
+
+    use_server = _model_server_cfg.get("enabled", False)
+    use_speech_process = _processes_cfg.get("speech", False)
+    jobs = {"model_server": _connect_model_server} if use_server else {"llm": _load_llm}
+    if use_speech_process:
+        jobs["speech"] = _start_speech_process
+    elif not use_server:
+        jobs["vosk"] = _load_vosk
+    loaded = profiler.run_parallel(**jobs, app_index=load_index, intent=_load_intent_model)
+    if use_server:
+        _model_client, llm, rec = loaded["model_server"]
+    else:
+        llm = loaded["llm"]
+    if use_speech_process:
+        _speech = loaded["speech"]
+    elif not use_server:
+        vosk_model, rec = loaded["vosk"]
+    _intent_model = loaded["intent"]
+    set_parse_workers(int(_processes_cfg.get("web_parse_workers", 0)))
+
+    with profiler.phase("context"):
+        if _model_client is not None:
+            from .model_server import PreemptionFlag
+            # Процессор логитов не передаётся в другой процесс: генерацию на сервере отменяет клиент
+            _yield_processor = PreemptionFlag(_llm_lock.should_yield)
+        else:
+            from llama_cpp import LogitsProcessorList
+            _yield_processor = LogitsProcessorList([preemption_logits_processor(_llm_lock, llm.token_eos())])
+        _context = ContextBuilder(llm.tokenize, _context_budget())
+    _print_banner_and_tips(cfg["activation_word"])
+
+    with profiler.phase("user_data"):
+        task_manager = TaskManager(DATA_DIR / "tasks.json")
+        user_profile = UserProfile(DATA_DIR / "user_profile.json")
+        history_logger = HistoryLogger(DATA_DIR / "history.json", max_entries=1000)
+        HANDLERS_WITH_MANAGERS = (
+            partial(execute_task_command, task_manager=task_manager),
+            partial(execute_profile_command, user_profile=user_profile),
+            partial(execute_history_command, history_logger=history_logger),
+            partial(execute_user_name_command, user_profile=user_profile),
+        )
+    print(f"[INFO] Модули задач, профиля и истории инициализированы.")
+
+    with profiler.phase("schedulers"):
+        _start_schedulers()
+    with profiler.phase("background"):
+        _summarizer = _start_summarizer()
+        _warmup = _start_warmup()
+    with profiler.phase("tool_grammar"):
+        _tool_grammar = _load_tool_grammar()
+    with profiler.phase("response_cache"):
+        _response_cache = _load_response_cache()
+    with profiler.phase("doc_summarizer"):
+        _doc_summarizer = _create_doc_summarizer()
+    with profiler.phase("config_watch"):
+        _watch_config()
+
+    threading.Thread(target=_prefetch_imports, daemon=True).start()
+    _startup_profiler = profiler
+    return profiler
+
 
 def run_main_loop():
     """Главный цикл прослушивания и обработки команд."""
     global _shutdown_requested
     
+    profiler = startup()
+    if profiling_requested():
+        # Отчёт о запуске вместо работы: фазы и самые медленные импорты
+        print(profiler.report())
+        print(format_offenders(import_offenders()))
+        _safe_shutdown()
+        return
+
     print("[INFO] Система готова. Скажите ключевое слово.")
     # Теперь можно принимать команды из консоли — запускаем поток чтения stdin
     _flush_stdin_buffer()
     _stdin_thread = threading.Thread(target=_stdin_listener, daemon=True)
     _stdin_thread.start()
-    silence_timeout = cfg["silence_timeout"]
 
-    with sd.RawInputStream(samplerate=samplerate, blocksize=8000, dtype='int16', channels=1, callback=audio_callback):
-        last_audio_time = time.time()
-        listening_for_command = False
-        while not _shutdown_requested:
-            data = q.get()
-            if rec.AcceptWaveform(data):
-                result = rec.Result()
-                text = json.loads(result)["text"].lower().strip()
-                if text:
-                    print(f"[ВЫ] {text}")
-                if not text:
-                    continue
+    # Распознавание в процессе агента или в отдельном процессе (processes.speech)
+    events = _speech.events(lambda: _shutdown_requested) if _speech is not None else _local_speech_events()
+    last_audio_time = time.time()
+    listening_for_command = False
+    route_profile = "default"
+    # Конец речи — последнее изменение промежуточного результата; от него до финального — этап asr
+    last_partial, last_partial_change = "", None
+    for kind, recognized in events:
+        if kind == "final":
+            speech_end, last_partial, last_partial_change = last_partial_change, "", None
+            text = recognized.lower().strip()
+            if text:
+                print(f"[ВЫ] {text}")
+            if not text:
+                continue
 
-                # Прерываем речь ТОЛЬКО если сказано ключевое слово (активация)
-                if _is_activation(text):
-                    interrupt_speech()
-                
-                # Останавливаем звонок таймера при активации или команде "стоп"
-                if is_timer_ringing():
-                    if _is_activation(text) or text.strip().lower() in ("стоп", "хватит", "отключи", "выключи"):
-                        stop_timer_ring()
-                        speak("Таймер отключён.")
-                        continue
+            # Один разбор на фразу: профиль слова активации и команда без слов активации
+            wake_profile, command_text = _activation.match(text)
+            is_activation = wake_profile is not None
 
-                if not listening_for_command:
-                    if _is_activation(text):
-                        command_text = _remove_activation_words(text)
-                        if command_text:
-                            user_command = command_text
-                        else:
-                            speak("Я слушаю. Какую команду выполнить?")
-                            listening_for_command = True
-                            last_audio_time = time.time()
-                            continue
+            # Прерываем речь ТОЛЬКО если сказано ключевое слово (активация)
+            if is_activation:
+                interrupt_speech()
+            
+            # Останавливаем звонок таймера при активации или команде "стоп"
+            if is_timer_ringing():
+                if is_activation or text.strip().lower() in ("стоп", "хватит", "отключи", "выключи"):
+                    stop_timer_ring()
+                    speak("Таймер отключён.")
+                    continue
+
+            if not listening_for_command:
+                if is_activation:
+                    route_profile = wake_profile
+                    if command_text:
+                        user_command = command_text
                     else:
-                        # Игнорируем речь без ключевого слова
+                        speak("Я слушаю. Какую команду выполнить?")
+                        listening_for_command = True
+                        last_audio_time = time.time()
                         continue
                 else:
-                    user_command = text
-                    listening_for_command = False
+                    # Игнорируем речь без ключевого слова
+                    continue
+            else:
+                user_command = text
+                listening_for_command = False
 
-                response = route_command(user_command)
+            with tracing.trace(source="voice", text=user_command, profile=route_profile):
+                if speech_end is not None:
+                    tracing.record("asr", time.perf_counter() - speech_end)
+                with _llm_lock:
+                    response = route_command(user_command, route_profile)
                 print(f"[Вера] {response}")
-                
+
                 # Логирование в память и историю
                 try:
                     _push_history("user", user_command)
                     _push_history("assistant", response)
-                    history_logger.add_entry(user_command, response)
+                    history_logger.add_entry(user_command, response, intent=last_intent())
                 except Exception as e:
                     print(f"[HISTORY] Ошибка логирования: {e}")
-                
-                speak(response)
-            else:
-                # анализируем промежуточный результат, чтобы ловить ключевое слово без задержки
-                partial = json.loads(rec.PartialResult()).get("partial", "").lower().strip()
-                if partial:
-                    # Пока пользователь говорит — обновляем таймер тишины
-                    if listening_for_command:
-                        last_audio_time = time.time()
+                _summarizer.touch()
+                _warmup.touch()
+
+                tracing.expect(speak(response), "tts_first_audio")
+        else:
+            # анализируем промежуточный результат, чтобы ловить ключевое слово без задержки
+            partial = recognized.lower().strip()
+            if partial != last_partial:
+                last_partial, last_partial_change = partial, time.perf_counter()
+            if partial:
+                # Пока пользователь говорит — обновляем таймер тишины
+                if listening_for_command:
+                    last_audio_time = time.time()
+
+            # проверяем тайм-аут тишины
+            if listening_for_command and (time.time() - last_audio_time > cfg["silence_timeout"]):
+                listening_for_command = False
 
-                # проверяем тайм-аут тишины
-                if listening_for_command and (time.time() - last_audio_time > silence_timeout):
-                    listening_for_command = False
-    
     # Главный цикл завершен
     sys.exit(0)
 
@@ -11,12 +11,18 @@ from main.app_indexer import load_app_index, build_app_index
 from main.lang_ru import ru_to_en
 from main.utils.fuzzy import fuzzy_match
 
-# Загрузка индекса приложений (автоматически обновляется если устарел)
-try:
-    APP_INDEX = load_app_index()
-except Exception as e:
-    print(f"[APP_INDEX] Ошибка: {e}")
-    APP_INDEX = []
+# Индекс приложений заполняется при запуске агента (load_index), параллельно с загрузкой моделей.
+# Список обновляется на месте: window_manager держит ссылку на него же
+APP_INDEX: list = []
+
+
+def load_index() -> int:
+    """Загружает индекс приложений (перестраивает, если устарел). Возвращает число приложений."""
+    try:
+        APP_INDEX[:] = load_app_index()
+    except Exception as e:
+        print(f"[APP_INDEX] Ошибка: {e}")
+    return len(APP_INDEX)
 
 
 # Глобальные переменные
@@ -290,9 +296,8 @@ def execute_rebuild_index_command(text: str) -> Optional[str]:
         return None
     
     try:
-        global APP_INDEX
         print("[APP_INDEX] Запуск переиндексирования...")
-        APP_INDEX = build_app_index()
+        APP_INDEX[:] = build_app_index()
         return f"Индекс приложений обновлён. Найдено приложений: {len(APP_INDEX)}."
     except Exception as e:
         return f"Ошибка обновления индекса: {e}"
@@ -1,13 +1,14 @@
 import re
-import time
 import datetime
 import threading
 from pathlib import Path
 from typing import Optional, Callable
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from user.json_storage import load_json, save_json
 from main.lang_ru import replace_number_words
 from main.config_manager import get_data_dir
+from main.indexed_store import IndexedStore, tokens
+from main.scheduler import catch_up_seconds, get_scheduler, next_occurrence
 
 # Формат времени для хранения
 _TIME_FORMAT = "%Y-%m-%d-%H-%M"
@@ -26,9 +27,18 @@ class ScheduledApp:
     enabled: bool = True    # Активна ли задача
     target_date: Optional[str] = None  # Для одноразовых: дата "YYYY-MM-DD"
     action: str = "open"    # "open" или "close"
-
-
-_scheduled_apps: list[ScheduledApp] = []
+    job_id: int = field(default=0, compare=False, repr=False)  # id задачи в планировщике (не сохраняется)
+
+
+# Задачи по времени суток, названию приложения (целиком и по словам) и действию
+_scheduled_apps: IndexedStore[ScheduledApp] = IndexedStore(
+    sort_key=lambda t: (t.time, t.app_name.lower()),
+    time=lambda t: (t.time,),
+    name=lambda t: (t.app_name.lower(),),
+    word=lambda t: tokens(t.app_name),
+    type=lambda t: (t.action,),
+)
+_lock = threading.RLock()
 _scheduler_started = False
 _SPEAK_CB: Optional[Callable] = None
 _OPEN_APP_CB: Optional[Callable] = None
@@ -56,21 +66,32 @@ def set_close_app_callback(cb: Callable) -> None:
     _CLOSE_APP_CB = cb
 
 
+def _now() -> datetime.datetime:
+    """Текущее время по часам планировщика (в проверках их подменяют)."""
+    return datetime.datetime.fromtimestamp(get_scheduler().now())
+
+
 def _now_str() -> str:
-    return datetime.datetime.now().strftime(_TIME_FORMAT)
+    return _now().strftime(_TIME_FORMAT)
 
 
 def _today_str() -> str:
-    return datetime.datetime.now().strftime("%Y-%m-%d")
+    return _now().strftime("%Y-%m-%d")
+
+
+def _task_dict(task: ScheduledApp) -> dict:
+    data = asdict(task)
+    data.pop("job_id")
+    return data
 
 
 def _save_scheduled_apps() -> None:
-    data = [asdict(s) for s in _scheduled_apps]
+    with _lock:
+        data = [_task_dict(s) for s in _scheduled_apps]
     save_json(_SCHEDULED_APPS_FILE, data, "SCHEDULED_APPS")
 
 
 def _load_scheduled_apps() -> None:
-    global _scheduled_apps
     data = load_json(_SCHEDULED_APPS_FILE, [])
     if not data:
         return
@@ -91,101 +112,87 @@ def _load_scheduled_apps() -> None:
         except Exception as e:
             print(f"[SCHEDULED_APPS] Ошибка загрузки: {e}")
     
-    _scheduled_apps = loaded
+    # Пропущенный, пока программа не работала, запуск окажется в прошлом и сработает
+    # сразу; искать его имеет смысл только в пределах окна догона
+    window_start = _now() - datetime.timedelta(seconds=catch_up_seconds())
+    with _lock:
+        _scheduled_apps.clear()
+        for task in loaded:
+            _scheduled_apps.add(task)
+            _schedule_task(task, max(_resume_point(task), window_start))
     print(f"[SCHEDULED_APPS] Загружено {len(_scheduled_apps)} запланированных запусков")
 
 
-def _should_run_today(task: ScheduledApp) -> bool:
-    """Проверяет, должна ли задача запуститься сегодня."""
-    if not task.enabled:
-        return False
-    
-    today = datetime.datetime.now()
-    weekday = today.weekday()  # 0=пн, 6=вс
-    today_str = today.strftime("%Y-%m-%d")
-    
-    if task.recurring == "once":
-        # Одноразовая — если ещё не запускалась
-        if task.last_run is not None:
-            return False
-        # Если указана конкретная дата — проверяем
-        if task.target_date:
-            return task.target_date == today_str
-        return True
-    elif task.recurring == "daily":
-        return True
-    elif task.recurring == "weekdays":
-        return weekday < 5  # Пн-Пт
-    elif task.recurring == "weekends":
-        return weekday >= 5  # Сб-Вс
-    
-    return False
+def _parse_stamp(value: Optional[str]) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.strptime(value, _TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
 
 
-def _was_run_today(task: ScheduledApp) -> bool:
-    """Проверяет, запускалась ли задача сегодня."""
-    if not task.last_run:
-        return False
-    try:
-        last = datetime.datetime.strptime(task.last_run, _TIME_FORMAT)
-        return last.date() == datetime.datetime.now().date()
-    except Exception:
-        return False
+def _resume_point(task: ScheduledApp) -> datetime.datetime:
+    """Момент, после которого ищется следующий запуск: прошлый запуск или создание задачи."""
+    return _parse_stamp(task.last_run) or _parse_stamp(task.created_at) or _now()
 
 
-def _scheduler():
-    """Фоновый планировщик запуска приложений."""
-    while not (_shutdown_event and _shutdown_event.is_set()):
-        now = datetime.datetime.now()
-        current_time = now.strftime("%H:%M")
-        
-        for task in _scheduled_apps:
-            if not task.enabled:
-                continue
-            
-            # Проверяем время (с точностью до минуты)
-            if task.time != current_time:
-                continue
-            
-            # Проверяем, не запускалась ли уже сегодня
-            if _was_run_today(task):
-                continue
-            
-            # Проверяем, должна ли запуститься сегодня
-            if not _should_run_today(task):
-                continue
-            
-            # Выполняем действие (открытие или закрытие)
-            action_name = "Закрытие" if task.action == "close" else "Запуск"
-            print(f"[SCHEDULED_APPS] {action_name}: {task.app_name}")
-            
-            try:
-                if task.action == "close" and _CLOSE_APP_CB:
-                    result = _CLOSE_APP_CB(task.app_name)
-                    if _SPEAK_CB and result:
-                        _SPEAK_CB(f"Запланированное закрытие: {task.app_name}")
-                elif task.action == "open" and _OPEN_APP_CB:
-                    result = _OPEN_APP_CB(task.app_name)
-                    if _SPEAK_CB and result:
-                        _SPEAK_CB(f"Запланированный запуск: {task.app_name}")
-            except Exception as e:
-                print(f"[SCHEDULED_APPS] Ошибка {action_name.lower()} {task.app_name}: {e}")
-            
-            # Обновляем last_run
-            task.last_run = _now_str()
-            
-            # Если одноразовая — отключаем
-            if task.recurring == "once":
-                task.enabled = False
-            
-            _save_scheduled_apps()
-        
-        # Используем wait вместо sleep для быстрого реагирования на shutdown
-        sleep_time = 60 - now.second
-        if _shutdown_event:
-            _shutdown_event.wait(timeout=sleep_time)
-        else:
-            time.sleep(sleep_time)
+def _next_run(task: ScheduledApp, after: datetime.datetime) -> Optional[datetime.datetime]:
+    """Ближайший запуск задачи после after; None — задача больше не запускается."""
+    if not task.enabled or (task.recurring == "once" and task.last_run is not None):
+        return None
+    return next_occurrence(task.time, task.recurring, after, task.target_date)
+
+
+def _schedule_task(task: ScheduledApp, after: datetime.datetime) -> None:
+    with _lock:
+        _unschedule_task(task)
+        when = _next_run(task, after)
+        if when is not None:
+            deadline = when.timestamp()
+            task.job_id = get_scheduler().schedule(deadline, _fire, task, deadline)
+
+
+def _unschedule_task(task: ScheduledApp) -> None:
+    with _lock:
+        if task.job_id:
+            get_scheduler().cancel(task.job_id)
+            task.job_id = 0
+
+
+def _fire(task: ScheduledApp, planned: float) -> None:
+    """Запуск или закрытие по расписанию (из пула планировщика)."""
+    with _lock:
+        if not task.enabled or task not in _scheduled_apps:
+            return
+        task.job_id = 0
+    
+    action_name = "Закрытие" if task.action == "close" else "Запуск"
+    late = get_scheduler().now() - planned
+    if late > catch_up_seconds():
+        # Компьютер спал или программа была выключена дольше окна догона
+        when = datetime.datetime.fromtimestamp(planned).strftime("%d.%m %H:%M")
+        print(f"[SCHEDULED_APPS] Пропущен {action_name.lower()} {task.app_name} на {when} "
+              f"(опоздание {late / 60:.0f} мин)")
+    else:
+        print(f"[SCHEDULED_APPS] {action_name}: {task.app_name}"
+              + (f" (опоздание {late:.0f} с)" if late >= 60 else ""))
+        try:
+            if task.action == "close" and _CLOSE_APP_CB:
+                result = _CLOSE_APP_CB(task.app_name)
+                if _SPEAK_CB and result:
+                    _SPEAK_CB(f"Запланированное закрытие: {task.app_name}")
+            elif task.action == "open" and _OPEN_APP_CB:
+                result = _OPEN_APP_CB(task.app_name)
+                if _SPEAK_CB and result:
+                    _SPEAK_CB(f"Запланированный запуск: {task.app_name}")
+        except Exception as e:
+            print(f"[SCHEDULED_APPS] Ошибка {action_name.lower()} {task.app_name}: {e}")
+        task.last_run = _now_str()
+    
+    # Одноразовая отключается, даже если запуск пропущен
+    if task.recurring == "once":
+        task.enabled = False
+    _save_scheduled_apps()
+    _schedule_task(task, max(_now(), datetime.datetime.fromtimestamp(planned)))
 
 
 def start_app_scheduler() -> None:
@@ -193,7 +200,7 @@ def start_app_scheduler() -> None:
     global _scheduler_started
     if not _scheduler_started:
         _load_scheduled_apps()
-        threading.Thread(target=_scheduler, daemon=True).start()
+        get_scheduler().start(_shutdown_event)
         _scheduler_started = True
 
 
@@ -207,31 +214,51 @@ def add_scheduled_app(app_name: str, time_str: str, recurring: str = "daily", ta
         target_date=target_date,
         action=action
     )
-    _scheduled_apps.append(task)
+    with _lock:
+        _scheduled_apps.add(task)
+        _schedule_task(task, _now())
     _save_scheduled_apps()
     return task
 
 
+def _find_scheduled_apps(app_name: str, exact_match: bool = False) -> list[ScheduledApp]:
+    key = app_name.lower()
+    if exact_match:
+        return _scheduled_apps.find("name", key)
+    words = tokens(app_name)
+    found = [t for t in _scheduled_apps.find_all("word", words) if key in t.app_name.lower()] if words else []
+    if not found:
+        # Часть слова («телег») индекс по словам не найдёт — проверяем подстроку
+        found = [t for t in _scheduled_apps if key in t.app_name.lower()]
+    return found
+
+
 def remove_scheduled_app(app_name: str, exact_match: bool = False) -> tuple[bool, int]:
-    removed_count = 0
-    for task in _scheduled_apps[:]:
-        if exact_match:
-            match = task.app_name.lower() == app_name.lower()
-        else:
-            match = app_name.lower() in task.app_name.lower()
-        
-        if match:
+    with _lock:
+        found = _find_scheduled_apps(app_name, exact_match)
+        for task in found:
+            _unschedule_task(task)
             _scheduled_apps.remove(task)
-            removed_count += 1
+    removed_count = len(found)
     
     if removed_count > 0:
         _save_scheduled_apps()
     return (removed_count > 0, removed_count)
 
 
+def clear_scheduled_apps() -> int:
+    with _lock:
+        count = len(_scheduled_apps)
+        for task in _scheduled_apps:
+            _unschedule_task(task)
+        _scheduled_apps.clear()
+    _save_scheduled_apps()
+    return count
+
+
 def get_scheduled_apps() -> list[ScheduledApp]:
     """Возвращает список запланированных запусков."""
-    return _scheduled_apps.copy()
+    return _scheduled_apps.ordered()
 
 
 _RECURRING_MAP = {
@@ -269,7 +296,7 @@ def _parse_one_time_schedule(app_name: str, day: str, hour: int, minute: int, ac
     if hour > 23 or minute > 59:
         return "Неверное время."
     
-    today = datetime.datetime.now()
+    today = _now()
     if day == "завтра":
         target = today + datetime.timedelta(days=1)
     else:
@@ -289,7 +316,7 @@ def _parse_smart_schedule(app_name: str, hour: int, minute: int, action: str = "
     if hour > 23 or minute > 59:
         return "Неверное время."
     
-    now = datetime.datetime.now()
+    now = _now()
     target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
     
     # Если указанное время уже прошло сегодня - планируем на завтра
@@ -319,7 +346,7 @@ def execute_scheduled_app_command(text: str) -> Optional[str]:
             return "Нет запланированных запусков приложений."
         
         lines = [f"Запланированных запусков: {len(_scheduled_apps)}"]
-        for i, task in enumerate(_scheduled_apps, 1):
+        for i, task in enumerate(_scheduled_apps.ordered(), 1):
             status = "✓" if task.enabled else "✗"
             rec = _RECURRING_NAMES.get(task.recurring, task.recurring)
             lines.append(f"{i}. {status} {task.app_name} в {task.time} ({rec})")
@@ -337,9 +364,7 @@ def execute_scheduled_app_command(text: str) -> Optional[str]:
     
     # Очистка всех запланированных запусков
     if re.search(r"(удали|очисти|убери)\s+все\s+(запланированн|автозапуск|расписани)", cleaned):
-        count = len(_scheduled_apps)
-        _scheduled_apps.clear()
-        _save_scheduled_apps()
+        count = clear_scheduled_apps()
         return f"Удалено запланированных запусков: {count}" if count else "Расписание пусто."
     
 
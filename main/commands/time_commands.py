@@ -1,12 +1,15 @@
 import re
 import time
 import datetime
+import math
 import threading
 import winsound
 from pathlib import Path
 from typing import Optional, Callable
-from dataclasses import dataclass, asdict
-from main.lang_ru import TIME_UNITS, replace_number_words
+from dataclasses import dataclass
+from main.indexed_store import IndexedStore, tokens
+from main.lang_ru import TIME_UNITS, plural_ru, replace_number_words
+from main.scheduler import catch_up_seconds, get_scheduler, get_timer_scheduler
 from main.config_manager import get_data_dir
 from user.json_storage import load_json, save_json
 
@@ -22,31 +25,45 @@ except ImportError:
     _NOTIFICATIONS_ENABLED = False
 
 
-# Формат времени для хранения в JSON (человекочитаемый)
+# Прежний формат времени в JSON (до минут); читается при загрузке старых файлов
 _TIME_FORMAT = "%Y-%m-%d-%H-%M"
 
+# С какого опоздания (после сна компьютера) напоминание помечается как пропущенное
+_LATE_NOTICE_SEC = 60
 
-@dataclass
+
+@dataclass(eq=False)
 class _Reminder:
-    ts: str  # Время в формате "2025-12-02-19-57"
+    deadline: float  # unix timestamp срабатывания
     message: str
     is_timer: bool = False  # True для таймеров, False для напоминаний
-    
-    @property
-    def timestamp(self) -> float:
-        """Возвращает unix timestamp для сравнения."""
-        try:
-            return datetime.datetime.strptime(self.ts, _TIME_FORMAT).timestamp()
-        except Exception:
-            return 0.0
-    
-    @staticmethod
-    def from_timestamp(ts: float) -> str:
-        """Конвертирует unix timestamp в строковый формат."""
-        return datetime.datetime.fromtimestamp(ts).strftime(_TIME_FORMAT)
+    job_id: int = 0  # id задачи в планировщике
+    monotonic_deadline: Optional[float] = None  # срок таймера по time.monotonic()
 
+    def to_dict(self) -> dict:
+        # "deadline" хранит доли секунды; целое "ts" понимал и прежний загрузчик
+        return {"ts": math.ceil(self.deadline), "deadline": round(self.deadline, 3),
+                "message": self.message, "is_timer": self.is_timer}
 
-_scheduled: list[_Reminder] = []
+    @property
+    def when(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.deadline)
+
+    def remaining(self) -> float:
+        """Секунд до срабатывания (для таймера — по монотонным часам)."""
+        if self.monotonic_deadline is not None:
+            return self.monotonic_deadline - time.monotonic()
+        return self.deadline - get_scheduler().now()
+
+
+# Напоминания по сроку, времени суток, типу и словам сообщения
+_scheduled: IndexedStore[_Reminder] = IndexedStore(
+    sort_key=lambda r: r.deadline,
+    time=lambda r: (r.when.strftime("%H:%M"),),
+    type=lambda r: (r.is_timer,),
+    word=lambda r: tokens(r.message),
+)
+_lock = threading.RLock()
 _scheduler_started = False
 _SPEAK_CB: Optional[Callable] = None
 _timer_ringing = False
@@ -92,74 +109,96 @@ def _start_timer_ring():
 
 def _save_reminders() -> None:
     """Сохраняет напоминания в JSON файл."""
-    data = [asdict(r) for r in _scheduled]
+    with _lock:
+        data = [r.to_dict() for r in _scheduled]
     save_json(_REMINDERS_FILE, data, "REMINDER")
 
 
+def _parse_deadline(ts_val) -> Optional[float]:
+    """Срок из записи JSON: число (unix timestamp) или строка прежнего формата."""
+    if isinstance(ts_val, bool):
+        return None
+    if isinstance(ts_val, (int, float)):
+        return float(ts_val)
+    try:
+        return datetime.datetime.strptime(ts_val, _TIME_FORMAT).timestamp()
+    except Exception:
+        return None
+
+
+def _add_reminder(deadline: float, message: str, is_timer: bool = False, save: bool = True) -> _Reminder:
+    reminder = _Reminder(deadline, message, is_timer)
+    with _lock:
+        _scheduled.add(reminder)
+        if is_timer:
+            # Таймер отсчитывается по монотонным часам, настенный срок — для списка и файла
+            reminder.monotonic_deadline = time.monotonic() + (deadline - time.time())
+            reminder.job_id = get_timer_scheduler().schedule(reminder.monotonic_deadline, _fire, reminder)
+        else:
+            reminder.job_id = get_scheduler().schedule(deadline, _fire, reminder)
+    if save:
+        _save_reminders()
+    return reminder
+
+
+def _remove_reminders(reminders: list[_Reminder]) -> int:
+    with _lock:
+        for r in reminders:
+            _scheduled.remove(r)
+            (get_timer_scheduler() if r.is_timer else get_scheduler()).cancel(r.job_id)
+    if reminders:
+        _save_reminders()
+    return len(reminders)
+
+
 def _load_reminders() -> None:
     """Загружает напоминания из JSON файла."""
-    global _scheduled
     data = load_json(_REMINDERS_FILE, [])
     if not data:
         return
-    now = time.time()
-    loaded = []
+    # Пропущенные, пока программа не работала, ещё срабатывают в пределах окна догона
+    oldest = get_scheduler().now() - catch_up_seconds()
+    loaded = 0
     for r in data:
-        ts_val = r.get("ts")
-        # Поддержка старого формата (float) и нового (string)
-        if isinstance(ts_val, (int, float)):
-            # Старый формат - конвертируем
-            ts_str = _Reminder.from_timestamp(ts_val)
-            ts_float = ts_val
-        else:
-            ts_str = ts_val
-            try:
-                ts_float = datetime.datetime.strptime(ts_str, _TIME_FORMAT).timestamp()
-            except Exception:
-                continue
-        
-        if ts_float > now:
-            loaded.append(_Reminder(ts=ts_str, message=r["message"], is_timer=r.get("is_timer", False)))
+        deadline = _parse_deadline(r.get("deadline", r.get("ts")))
+        if deadline is not None and deadline > oldest:
+            _add_reminder(deadline, r["message"], r.get("is_timer", False), save=False)
+            loaded += 1
     
-    _scheduled = loaded
-    # Сохраняем обновлённый список (без просроченных, в новом формате)
-    if len(_scheduled) != len(data):
+    # Сохраняем обновлённый список (без давно просроченных, в новом формате)
+    if loaded != len(data):
         _save_reminders()
-    print(f"[REMINDER] Загружено {len(_scheduled)} напоминаний")
-
-
-def _scheduler():
-    """Фоновый планировщик напоминаний и таймеров."""
-    while not (_shutdown_event and _shutdown_event.is_set()):
-        now = time.time()
-        for task in _scheduled[:]:
-            if now >= task.timestamp:
-                print(f"[{'ТАЙМЕР' if task.is_timer else 'REMINDER'}] {task.message}")
-                
-                if task.is_timer:
-                    # Таймер: сразу звонок, потом голос
-                    _start_timer_ring()
-                    if _SPEAK_CB:
-                        _SPEAK_CB(task.message + ". Скажите стоп чтобы отключить.")
-                else:
-                    # Напоминание: голос + toast
-                    if _SPEAK_CB:
-                        _SPEAK_CB(task.message)
-                    if _NOTIFICATIONS_ENABLED:
-                        try:
-                            show_reminder_notification("⏰ Напоминание", task.message)
-                        except Exception:
-                            pass
-                
-                _scheduled.remove(task)
-                _save_reminders()
-        
-        # Используем wait вместо sleep для быстрого реагирования на shutdown
-        if _shutdown_event:
-            _shutdown_event.wait(timeout=1)
-        else:
-            time.sleep(1)
-    print("[REMINDER] Scheduler остановлен")
+    print(f"[REMINDER] Загружено {loaded} напоминаний")
+
+
+def _fire(task: _Reminder) -> None:
+    """Срабатывание напоминания или таймера (из пула планировщика)."""
+    with _lock:
+        if task not in _scheduled:
+            return
+        _scheduled.remove(task)
+    _save_reminders()
+    late = -task.remaining()
+    print(f"[{'ТАЙМЕР' if task.is_timer else 'REMINDER'}] {task.message}"
+          + (f" (опоздание {late:.0f} с)" if late >= _LATE_NOTICE_SEC else ""))
+    
+    if task.is_timer:
+        # Таймер: сразу звонок, потом голос
+        _start_timer_ring()
+        if _SPEAK_CB:
+            _SPEAK_CB(task.message + ". Скажите стоп чтобы отключить.")
+    else:
+        # Напоминание: голос + toast
+        message = task.message
+        if late >= _LATE_NOTICE_SEC:
+            message = f"Пропущенное напоминание на {task.when.strftime('%H:%M')}: {message}"
+        if _SPEAK_CB:
+            _SPEAK_CB(message)
+        if _NOTIFICATIONS_ENABLED:
+            try:
+                show_reminder_notification("⏰ Напоминание", message)
+            except Exception:
+                pass
 
 
 def start_scheduler() -> None:
@@ -167,7 +206,8 @@ def start_scheduler() -> None:
     global _scheduler_started
     if not _scheduler_started:
         _load_reminders()
-        threading.Thread(target=_scheduler, daemon=True).start()
+        get_scheduler().start(_shutdown_event)
+        get_timer_scheduler().start(_shutdown_event)
         _scheduler_started = True
 
 
@@ -227,16 +267,48 @@ def execute_date_command(text: str) -> Optional[str]:
     return None
 
 
+def _format_duration(seconds: float) -> str:
+    """«1 час 5 минут», «2 минуты 30 секунд», «12 секунд»."""
+    total = max(0, math.ceil(seconds))
+    hours, rest = divmod(total, 3600)
+    minutes, secs = divmod(rest, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours} {plural_ru(hours, 'час', 'часа', 'часов')}")
+    if minutes:
+        parts.append(f"{minutes} {plural_ru(minutes, 'минута', 'минуты', 'минут')}")
+    # Секунды важны, только пока до конца меньше часа
+    if (secs and not hours) or not parts:
+        parts.append(f"{secs} {plural_ru(secs, 'секунда', 'секунды', 'секунд')}")
+    return " ".join(parts)
+
+
+def _timer_remaining_answer() -> str:
+    # Ближайший таймер — вершина кучи монотонного планировщика, без перебора
+    engine = get_timer_scheduler()
+    nearest = engine.next_deadline()
+    count = len(engine)
+    if nearest is None or not count:
+        return "Активных таймеров нет."
+    left = _format_duration(nearest - time.monotonic())
+    if count > 1:
+        return f"Таймеров: {count}. До ближайшего осталось {left}."
+    return f"Осталось {left}."
+
+
 def execute_reminder_command(text: str) -> Optional[str]:
     """Обрабатывает команды напоминаний и таймеров."""
     lowered = text.lower()
     cleaned = replace_number_words(lowered)
     
+    # Остаток времени: "сколько осталось на таймере", "когда сработает таймер"
+    if re.search(r"сколько\s+(?:времени\s+)?осталось.*таймер|когда\s+(?:сработает|зазвонит|закончится)\s+таймер", cleaned):
+        return _timer_remaining_answer()
+    
     # Удаление всех напоминаний
     if re.search(r"(удали|отмени|очисти)\s+все\s+напоминани", cleaned):
-        count = len(_scheduled)
-        _scheduled.clear()
-        _save_reminders()
+        with _lock:
+            count = _remove_reminders(list(_scheduled))
         return f"Удалено напоминаний: {count}" if count else "Напоминаний не было."
     
     # Удаление напоминания
@@ -245,27 +317,16 @@ def execute_reminder_command(text: str) -> Optional[str]:
         minute = max(0, min(int(m.group(3)), 59))
         target_str = f"{hour:02d}:{minute:02d}"
         
-        removed = 0
-        for task in list(_scheduled):
-            try:
-                if datetime.datetime.strptime(task.ts, _TIME_FORMAT).strftime("%H:%M") == target_str:
-                    _scheduled.remove(task)
-                    removed += 1
-            except Exception:
-                pass
-        
-        if removed:
-            _save_reminders()
+        with _lock:
+            removed = _remove_reminders(_scheduled.find("time", target_str))
         return f"Удалено напоминание на {target_str}" if removed else \
                f"Напоминаний на {target_str} не найдено."
     
     # Удаление всех таймеров
     if re.search(r"(удали|отмени|очисти|\u0441брось?)\s+все\s+таймер", cleaned):
-        timers = [t for t in _scheduled if t.is_timer]
-        for t in timers:
-            _scheduled.remove(t)
-        _save_reminders()
-        return f"Удалено таймеров: {len(timers)}" if timers else "Таймеров не было."
+        with _lock:
+            count = _remove_reminders(_scheduled.find("type", True))
+        return f"Удалено таймеров: {count}" if count else "Таймеров не было."
     
     # Удаление таймера по времени: "удали таймер на 5 минут"
     if m := re.search(r"(удали|отмени|сбрось?)\s+таймер(?:\s+на)?\s+(\d+)\s+([\u0430-\u044f]+)", cleaned):
@@ -273,22 +334,21 @@ def execute_reminder_command(text: str) -> Optional[str]:
         if unit in TIME_UNITS:
             # Ищем таймер с таким сообщением
             target_msg = f"Таймер {n} {unit} завершён."
-            for task in list(_scheduled):
-                if task.is_timer and task.message == target_msg:
-                    _scheduled.remove(task)
-                    _save_reminders()
-                    return f"Таймер на {n} {unit} удалён."
+            with _lock:
+                for task in _scheduled.find_all("word", tokens(target_msg)):
+                    if task.is_timer and task.message == target_msg:
+                        _remove_reminders([task])
+                        return f"Таймер на {n} {unit} удалён."
             return f"Таймер на {n} {unit} не найден."
     
     # Удаление таймера без указания времени: "удали таймер", "отмени таймер"
     if re.search(r"(удали|отмени|сбрось?)\s+таймер\b", cleaned):
-        timers = [t for t in _scheduled if t.is_timer]
-        if not timers:
-            return "Активных таймеров нет."
-        # Удаляем последний добавленный таймер
-        last_timer = timers[-1]
-        _scheduled.remove(last_timer)
-        _save_reminders()
+        with _lock:
+            timers = _scheduled.find("type", True)
+            if not timers:
+                return "Активных таймеров нет."
+            # Удаляем последний добавленный таймер
+            _remove_reminders([timers[-1]])
         return f"Таймер удалён."
     
     # Таймер: "таймер на 5 минут", "включи таймер на 10 минут", "поставь таймер на 15 минут"
@@ -296,9 +356,7 @@ def execute_reminder_command(text: str) -> Optional[str]:
         n, unit = int(m.group(1)), m.group(2)
         if unit in TIME_UNITS:
             sec = n * TIME_UNITS[unit]
-            ts_str = _Reminder.from_timestamp(time.time() + sec)
-            _scheduled.append(_Reminder(ts_str, f"Таймер {n} {unit} завершён.", is_timer=True))
-            _save_reminders()
+            _add_reminder(time.time() + sec, f"Таймер {n} {unit} завершён.", is_timer=True)
             return f"Таймер на {n} {unit} установлен."
     
     # Таймер без числа (по умолчанию 1): "таймер минуту"
@@ -306,9 +364,7 @@ def execute_reminder_command(text: str) -> Optional[str]:
         unit = m.group(1)
         if unit in TIME_UNITS:
             sec = TIME_UNITS[unit]
-            ts_str = _Reminder.from_timestamp(time.time() + sec)
-            _scheduled.append(_Reminder(ts_str, f"Таймер 1 {unit} завершён.", is_timer=True))
-            _save_reminders()
+            _add_reminder(time.time() + sec, f"Таймер 1 {unit} завершён.", is_timer=True)
             return f"Таймер на 1 {unit} установлен."
     
     # "напомни позвонить маме через 5 минут"
@@ -317,10 +373,8 @@ def execute_reminder_command(text: str) -> Optional[str]:
         if unit in TIME_UNITS:
             sec = n * TIME_UNITS[unit]
             target_ts = time.time() + sec
-            ts_str = _Reminder.from_timestamp(target_ts)
             target_time = datetime.datetime.fromtimestamp(target_ts).strftime('%H:%M')
-            _scheduled.append(_Reminder(ts_str, message))
-            _save_reminders()
+            _add_reminder(target_ts, message)
             return f"Напоминание на {target_time} установлено."
     
     # "напомни позвонить маме через минуту"
@@ -329,10 +383,8 @@ def execute_reminder_command(text: str) -> Optional[str]:
         if unit in TIME_UNITS:
             sec = TIME_UNITS[unit]
             target_ts = time.time() + sec
-            ts_str = _Reminder.from_timestamp(target_ts)
             target_time = datetime.datetime.fromtimestamp(target_ts).strftime('%H:%M')
-            _scheduled.append(_Reminder(ts_str, message))
-            _save_reminders()
+            _add_reminder(target_ts, message)
             return f"Напоминание на {target_time} установлено."
     
     # "напомни через минуту позвонить маме"
@@ -342,10 +394,8 @@ def execute_reminder_command(text: str) -> Optional[str]:
             message = m.group(2).strip()
             sec = TIME_UNITS[unit]
             target_ts = time.time() + sec
-            ts_str = _Reminder.from_timestamp(target_ts)
             target_time = datetime.datetime.fromtimestamp(target_ts).strftime('%H:%M')
-            _scheduled.append(_Reminder(ts_str, message))
-            _save_reminders()
+            _add_reminder(target_ts, message)
             return f"Напоминание на {target_time} установлено."
     
     # "напомни через 5 минут позвонить маме"
@@ -353,10 +403,8 @@ def execute_reminder_command(text: str) -> Optional[str]:
         n, unit, message = int(m.group(1)), m.group(2), m.group(3).strip()
         sec = n * TIME_UNITS.get(unit, 60)
         target_ts = time.time() + sec
-        ts_str = _Reminder.from_timestamp(target_ts)
         target_time = datetime.datetime.fromtimestamp(target_ts).strftime('%H:%M')
-        _scheduled.append(_Reminder(ts_str, message))
-        _save_reminders()
+        _add_reminder(target_ts, message)
         return f"Напоминание на {target_time} установлено."
     
     # Напоминание на конкретное время "напоминание на 14:30 позвонить"
@@ -370,9 +418,7 @@ def execute_reminder_command(text: str) -> Optional[str]:
         if target <= now_dt:
             target += datetime.timedelta(days=1)
         
-        ts_str = target.strftime(_TIME_FORMAT)
-        _scheduled.append(_Reminder(ts_str, message))
-        _save_reminders()
+        _add_reminder(target.timestamp(), message)
         return f"Напоминание на {target.strftime('%H:%M')} установлено."
     
     return None
@@ -385,18 +431,15 @@ def execute_list_reminders_command(text: str) -> Optional[str]:
     if not re.search(r"(покажи|список|какие|все)\s+напоминани[яй]?", lowered):
         return None
     
-    if not _scheduled:
+    with _lock:
+        # Хранилище уже упорядочено по сроку
+        sorted_tasks = _scheduled.ordered()
+    if not sorted_tasks:
         return "Активных напоминаний нет."
     
-    # Сортируем по времени
-    sorted_tasks = sorted(_scheduled, key=lambda r: r.timestamp)
-    
     lines = [f"Активных напоминаний: {len(sorted_tasks)}"]
     for i, task in enumerate(sorted_tasks, 1):
-        try:
-            dt = datetime.datetime.strptime(task.ts, _TIME_FORMAT)
-        except Exception:
-            dt = datetime.datetime.now()
+        dt = task.when
         time_str = dt.strftime('%H:%M')
         # Если не сегодня, добавляем дату
         if dt.date() != datetime.datetime.now().date():
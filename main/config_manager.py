@@ -1,8 +1,10 @@
+import copy
 import json
 import sys
 import os
+import threading
 from pathlib import Path
-from typing import Optional, Any
+from typing import Callable, Optional, Any
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,6 +14,9 @@ DEFAULT_CONFIG = {
     "model": {
         "path": "auto",
         "ctx_size": 8192,
+        "context_budget": 0,
+        "warmup_enabled": True,
+        "warmup_idle_sec": 600,
         "temperature": 0.3,
         "top_p": 0.8,
         "top_k": 20,
@@ -19,7 +24,19 @@ DEFAULT_CONFIG = {
         "repeat_penalty": 1.1,
         "max_tokens": 0,
         "seed": 42,
-        "chat_format": "chatml"
+        "chat_format": "chatml",
+        "tool_call_mode": "grammar",
+        "runtime": {
+            "n_threads": 0,
+            "n_threads_batch": 0,
+            "n_batch": 512,
+            "n_ubatch": 512,
+            "use_mmap": True,
+            "use_mlock": False,
+            "flash_attn": False,
+            "type_k": "f16",
+            "type_v": "f16"
+        }
     },
     "vosk": {
         "model_path": "vosk-model-small-ru-0.22",
@@ -27,10 +44,64 @@ DEFAULT_CONFIG = {
     },
     "activation_word": "Вера",
     "silence_timeout": 2,
+    "memory": {
+        "summary_enabled": True,
+        "summary_threshold_tokens": 1536,
+        "summary_keep_turns": 2,
+        "summary_idle_sec": 5
+    },
+    "intent": {
+        "enabled": True,
+        "threshold": 0.8,
+        "action_threshold": 0.97
+    },
+    "multitask": {
+        "parallel": True,
+        "timeout_sec": 15,
+        "max_workers": 4
+    },
+    "documents": {
+        "summary_max_tokens": 256,
+        "summary_chunk_tokens": 0,
+        "summary_workers": 1,
+        "progress_speech": True
+    },
+    "scheduler": {
+        "workers": 2,
+        "catch_up_minutes": 30
+    },
+    "config_reload": {
+        "enabled": True,
+        "interval_sec": 2
+    },
+    "tracing": {
+        "enabled": True,
+        "max_mb": 5
+    },
+    "processes": {
+        "speech": False,
+        "web_parse_workers": 0
+    },
+    "model_server": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 47811,
+        "autostart": True,
+        "idle_shutdown_min": 0
+    },
+    "response_cache": {
+        "enabled": True,
+        "ttl_hours": 24,
+        "max_entries": 256,
+        "embedding_model": "",
+        "similarity": 0.92
+    },
     "tts": {
         "voice_index": 3,
         "rate": 180,
-        "volume": 0.8
+        "volume": 0.8,
+        "cache_enabled": True,
+        "cache_max_mb": 64
     },
     "commands": {},
     "sites": {
@@ -58,6 +129,95 @@ DEFAULT_CONFIG = {
 }
 
 
+# Ограничения сверх типа значения по умолчанию: (секция, ключ) -> (проверка, описание)
+_CONSTRAINTS: dict[tuple[str, ...], tuple[Callable[[Any], bool], str]] = {
+    ("silence_timeout",): (lambda v: v > 0, "больше 0"),
+    ("model", "ctx_size"): (lambda v: v >= 512, "не меньше 512"),
+    ("model", "temperature"): (lambda v: 0 <= v <= 2, "от 0 до 2"),
+    ("model", "top_p"): (lambda v: 0 < v <= 1, "от 0 до 1"),
+    ("model", "tool_call_mode"): (lambda v: v in ("grammar", "regex"), "grammar или regex"),
+    ("intent", "threshold"): (lambda v: 0 <= v <= 1, "от 0 до 1"),
+    ("intent", "action_threshold"): (lambda v: 0 <= v <= 1, "от 0 до 1"),
+    ("tts", "rate"): (lambda v: 50 <= v <= 400, "от 50 до 400"),
+    ("tts", "volume"): (lambda v: 0 <= v <= 1, "от 0 до 1"),
+    ("response_cache", "similarity"): (lambda v: 0 < v <= 1, "от 0 до 1"),
+    ("response_cache", "max_entries"): (lambda v: v > 0, "больше 0"),
+    ("config_reload", "interval_sec"): (lambda v: v > 0, "больше 0"),
+    ("tracing", "max_mb"): (lambda v: v > 0, "больше 0"),
+}
+
+# Настройки, которые применяются только при запуске (модели, процессы, пулы):
+# секция -> ключи, None — вся секция
+RESTART_REQUIRED: dict[str, Optional[frozenset]] = {
+    "model": frozenset({"path", "ctx_size", "chat_format", "runtime", "tool_call_mode", "warmup_enabled"}),
+    "memory": frozenset({"summary_enabled"}),
+    "intent": frozenset({"enabled"}),
+    "response_cache": frozenset({"embedding_model"}),
+    "tts": frozenset({"cache_enabled", "cache_max_mb"}),
+    "vosk": None,
+    "processes": None,
+    "model_server": None,
+    "scheduler": frozenset({"workers"}),
+    "config_reload": None,
+}
+
+
+def _type_errors(path: tuple[str, ...], value: Any, default: Any) -> list[str]:
+    name = ".".join(path)
+    if isinstance(default, bool):
+        ok = isinstance(value, bool)
+    elif isinstance(default, (int, float)):
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif isinstance(default, str):
+        ok = isinstance(value, str)
+    elif isinstance(default, list):
+        ok = isinstance(value, list)
+    elif isinstance(default, dict):
+        if not isinstance(value, dict):
+            return [f"{name}: ожидается объект"]
+        # Пустой объект по умолчанию (commands) — ключи задаёт пользователь
+        errors = []
+        for key, sub_default in default.items():
+            if key in value:
+                errors += _type_errors(path + (key,), value[key], sub_default)
+        return errors
+    else:
+        return []
+    if not ok:
+        return [f"{name}: ожидается {type(default).__name__}, получено {type(value).__name__}"]
+    rule = _CONSTRAINTS.get(path)
+    if rule is not None and not rule[0](value):
+        return [f"{name}: значение {value!r} вне допустимого диапазона ({rule[1]})"]
+    return []
+
+
+def validate_config(data: dict) -> dict[str, list[str]]:
+    """Проверяет конфигурацию по типам DEFAULT_CONFIG и _CONSTRAINTS. Возвращает ошибки по секциям."""
+    errors = {}
+    for section, value in data.items():
+        if section in DEFAULT_CONFIG:
+            problems = _type_errors((section,), value, DEFAULT_CONFIG[section])
+            if problems:
+                errors[section] = problems
+    return errors
+
+
+def _update_in_place(current: dict, value: dict) -> None:
+    """Приводит current к value, не заменяя вложенные словари.
+
+    Сначала записываются новые значения, затем удаляются лишние ключи:
+    читатель без блокировки не увидит пустую или неполную секцию.
+    """
+    for key, new in value.items():
+        old = current.get(key)
+        if isinstance(old, dict) and isinstance(new, dict):
+            _update_in_place(old, new)
+        else:
+            current[key] = new
+    for key in [k for k in current if k not in value]:
+        current.pop(key, None)
+
+
 def _get_base_path() -> Path:
     """Возвращает базовый путь для ресурсов."""
     if getattr(sys, 'frozen', False):
@@ -97,6 +257,9 @@ class ConfigManager:
                 project_root = _get_project_root()
                 config_path = project_root / "data" / "config.json"
             self._config_path = config_path
+            self._lock = threading.RLock()
+            self._subscribers: dict[str, list[Callable[[Any, Any], None]]] = {}
+            self._watcher: Optional[threading.Thread] = None
             self._ensure_config_exists()
             self._load_config()
             self._resolve_paths()
@@ -126,6 +289,13 @@ class ConfigManager:
         
         project_root = _get_project_root()
         
+        # Исходные значения путей: в файл при save() пишутся они, а не найденные абсолютные
+        self._raw_paths = {}
+        for keys in (("model", "path"), ("vosk", "model_path")):
+            section = self._config.get(keys[0])
+            if isinstance(section, dict) and keys[1] in section:
+                self._raw_paths[keys] = section[keys[1]]
+        
         # Путь к LLM модели (с автоопределением)
         if "model" in self._config and "path" in self._config["model"]:
             model_path = self._config["model"]["path"]
@@ -177,17 +347,115 @@ class ConfigManager:
             if not self._config_path.exists():
                 raise FileNotFoundError(f"Config file not found: {self._config_path}")
             
+            self._mtime = self._file_mtime()
             with self._config_path.open(encoding='utf-8') as f:
                 self._config = json.load(f)
                 logger.info(f"Configuration loaded from {self._config_path}")
         except Exception as e:
             logger.error(f"Failed to load config: {e}")
             raise
+        for section, problems in validate_config(self._config).items():
+            for problem in problems:
+                print(f"[КОНФИГ] Ошибка в настройке {problem}")
+    
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return self._config_path.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    def reload(self) -> list[str]:
+        """Перечитывает config.json и применяет изменения на месте.
+
+        Словари секций обновляются, а не заменяются: ссылки, сохранённые
+        модулями при импорте (cfg["web_search"], COMMANDS_CFG), видят новые
+        значения. Секции с ошибками проверки остаются прежними. Подписчики
+        изменённых секций вызываются после применения. Возвращает имена
+        изменённых секций.
+        """
+        with self._lock:
+            self._mtime = self._file_mtime()
+            try:
+                with self._config_path.open(encoding='utf-8') as f:
+                    data = json.load(f)
+                if not isinstance(data, dict):
+                    raise ValueError("ожидается JSON-объект")
+            except Exception as e:
+                print(f"[КОНФИГ] Не удалось перечитать {self._config_path.name}, настройки не изменены: {e}")
+                return []
+            errors = validate_config(data)
+            for section, problems in errors.items():
+                for problem in problems:
+                    print(f"[КОНФИГ] Ошибка в настройке {problem}; секция {section} не изменена")
+            old = self._raw_copy()
+            changed = [section for section in list(old) + [k for k in data if k not in old]
+                       if section not in errors and old.get(section) != data.get(section)]
+            # Пути моделей снова приводим к абсолютным после применения
+            for (section, key), raw in self._raw_paths.items():
+                self._config[section][key] = raw
+            for section in changed:
+                value = data.get(section, copy.deepcopy(DEFAULT_CONFIG.get(section)))
+                current = self._config.get(section)
+                if value is None:
+                    self._config.pop(section, None)
+                elif isinstance(current, dict) and isinstance(value, dict):
+                    _update_in_place(current, value)
+                else:
+                    self._config[section] = value
+            self._resolve_paths()
+            subscribers = {section: list(self._subscribers.get(section, ())) for section in changed}
+        for section in changed:
+            self._report_restart_required(section, old.get(section), data.get(section))
+            for callback in subscribers[section]:
+                try:
+                    callback(self._config.get(section), old.get(section))
+                except Exception as e:
+                    print(f"[КОНФИГ] Ошибка применения секции {section}: {e}")
+        if changed:
+            print(f"[КОНФИГ] Применены изменения: {', '.join(changed)}")
+        return changed
+    
+    @staticmethod
+    def _report_restart_required(section: str, old: Any, new: Any) -> None:
+        if section not in RESTART_REQUIRED:
+            return
+        keys = RESTART_REQUIRED[section]
+        if keys is None:
+            names = [section]
+        else:
+            old = old if isinstance(old, dict) else {}
+            new = new if isinstance(new, dict) else {}
+            names = [f"{section}.{k}" for k in sorted(keys) if old.get(k) != new.get(k)]
+        if names:
+            print(f"[КОНФИГ] {', '.join(names)}: изменение вступит в силу после перезапуска")
     
-    def reload(self) -> None:
-        """Перезагружает конфигурацию из файла."""
-        self._config = None
-        self._load_config()
+    def subscribe(self, section: str, callback: Callable[[Any, Any], None]) -> None:
+        """Вызывает callback(новое, прежнее значение секции) после каждого её изменения при reload()."""
+        with self._lock:
+            self._subscribers.setdefault(section, []).append(callback)
+    
+    def start_watching(self, interval: float = 2.0, stop_event: Optional[threading.Event] = None) -> None:
+        """Следит за временем изменения config.json и вызывает reload() (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(interval, stop_event or threading.Event()),
+                                             name="config-watch", daemon=True)
+            self._watcher.start()
+    
+    def _watch(self, interval: float, stop_event: threading.Event) -> None:
+        pending = None
+        while not stop_event.wait(interval):
+            mtime = self._file_mtime()
+            if mtime is None or mtime == self._mtime:
+                pending = None
+                continue
+            # Редактор может сохранять файл частями: применяем, когда время изменения устоялось
+            if mtime != pending:
+                pending = mtime
+                continue
+            pending = None
+            self.reload()
     
     def get(self, *keys: str, default: Any = None) -> Any:
         """Получает значение из конфигурации по вложенным ключам."""
@@ -217,12 +485,26 @@ class ConfigManager:
             current = current[key]
         
         current[keys[-1]] = value
+        # Явно заданный путь сохраняется как есть
+        getattr(self, "_raw_paths", {}).pop(tuple(keys), None)
+    
+    def _raw_copy(self) -> dict:
+        """Копия конфигурации с путями моделей в том виде, в каком они записаны в файле."""
+        data = copy.deepcopy(self._config)
+        for (section, key), raw in getattr(self, "_raw_paths", {}).items():
+            if isinstance(data.get(section), dict) and key in data[section]:
+                data[section][key] = raw
+        return data
     
     def save(self) -> None:
         """Сохраняет текущую конфигурацию в файл."""
+        data = self._raw_copy()
         try:
-            with self._config_path.open('w', encoding='utf-8') as f:
-                json.dump(self._config, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                with self._config_path.open('w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                # Собственное сохранение не должно вызывать перечитывание
+                self._mtime = self._file_mtime()
             logger.info(f"Configuration saved to {self._config_path}")
         except Exception as e:
             logger.error(f"Failed to save config: {e}")
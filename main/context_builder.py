@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+# Служебные токены шаблона чата на одно сообщение (chatml: <|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD_TOKENS = 8
+
+
+class ContextBuilder:
+    """Сборка промпта для модели в пределах бюджета токенов.
+
+    Порядок сообщений всегда один и тот же: системный промпт с заметками
+    профиля и сводкой старого разговора, затем реплики диалога и текущий
+    запрос. Начало окна истории сдвигается только при превышении бюджета,
+    причём сразу до low_water доли бюджета. Так между соседними запросами префикс промпта не меняется
+    и llama.cpp переиспользует уже вычисленный KV-кэш.
+    """
+
+    def __init__(self, tokenize: Callable[[bytes], list], budget_tokens: int,
+                 low_water: float = 0.6, cache_size: int = 512):
+        self._tokenize = tokenize
+        self.budget_tokens = budget_tokens
+        self.low_water = low_water
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._cache_size = cache_size
+        self._window_first: Optional[dict] = None  # Первое сообщение истории в прошлом промпте
+        self._lock = threading.Lock()
+
+    def count_tokens(self, text: str) -> int:
+        """Число токенов текста по токенизатору модели (с кэшем)."""
+        with self._lock:
+            cached = self._counts.get(text)
+            if cached is not None:
+                self._counts.move_to_end(text)
+                return cached
+        try:
+            n = len(self._tokenize(text.encode("utf-8")))
+        except Exception:
+            n = len(text) // 2 + 1  # Грубая оценка для кириллицы, если токенизатор недоступен
+        with self._lock:
+            self._counts[text] = n
+            while len(self._counts) > self._cache_size:
+                self._counts.popitem(last=False)
+        return n
+
+    def message_tokens(self, message: dict) -> int:
+        return self.count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+    def build_system(self, system_prompt: str, profile_info: Sequence[str] = (), summary: str = "") -> str:
+        content = system_prompt
+        if profile_info:
+            content += "\n\nИнформация о пользователе:\n" + "\n".join(profile_info)
+        if summary:
+            content += "\n\nКратко о предыдущем разговоре:\n" + summary
+        return content
+
+    def _window_start(self, history: Sequence[dict], available: int) -> int:
+        # Продолжаем с того же сообщения, что и в прошлый раз, если оно ещё в истории
+        start = 0
+        if self._window_first is not None:
+            for i, m in enumerate(history):
+                if m is self._window_first:
+                    start = i
+                    break
+        sizes = [self.message_tokens(m) for m in history]
+        if sum(sizes[start:]) <= available:
+            return start
+        # Бюджет превышен: сдвигаем окно до low_water, чтобы следующие ходы не сдвигали его снова
+        target = int(available * self.low_water)
+        total = sum(sizes[start:])
+        while start < len(history) and total > target:
+            total -= sizes[start]
+            start += 1
+        # Окно начинается с реплики пользователя, чтобы не оставлять ответ без вопроса
+        while start < len(history) and history[start].get("role") != "user":
+            start += 1
+        return start
+
+    def build(self, system_prompt: str, history: Sequence[dict], user_text: str,
+              profile_info: Sequence[str] = (), summary: str = "") -> list[dict]:
+        """Собирает сообщения для create_chat_completion, укладываясь в budget_tokens."""
+        system_msg = {"role": "system", "content": self.build_system(system_prompt, profile_info, summary)}
+        user_msg = {"role": "user", "content": user_text}
+        available = self.budget_tokens - self.message_tokens(system_msg) - self.message_tokens(user_msg)
+
+        history = list(history)
+        if available <= 0:
+            start = len(history)
+        else:
+            start = self._window_start(history, available)
+        self._window_first = history[start] if start < len(history) else None
+
+        return [system_msg, *history[start:], user_msg]
+
+    def prompt_tokens(self, messages: Sequence[dict]) -> int:
+        return sum(self.message_tokens(m) for m in messages)
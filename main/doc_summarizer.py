@@ -0,0 +1,230 @@
+"""Пересказ длинных документов по схеме map-reduce.
+
+Текст режется на части по бюджету токенов модели, каждая часть кратко
+пересказывается (map), затем пересказы объединяются в один (reduce). Если
+пересказы сами не помещаются в контекст, reduce повторяется по уровням, но
+не больше MAX_REDUCE_LEVELS раз: часть вмещает хотя бы два пересказа, а на
+последнем уровне пересказы обрезаются поровну до одной части.
+Части пересказываются последовательно на основной модели либо в пуле
+процессов с отдельными экземплярами модели, если хватает памяти.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MAP_PROMPT = (
+    "Это часть {index} из {total} документа «{title}». Кратко перескажи её "
+    "содержание: главные факты, цифры и выводы, без вступлений."
+)
+SINGLE_PROMPT = "Кратко перескажи основное содержание документа «{title}»."
+REDUCE_PROMPT = (
+    "Ниже краткие пересказы частей документа «{title}» по порядку. Объедини их "
+    "в один связный краткий пересказ всего документа."
+)
+
+# Запас токенов контекста на системный промпт, инструкцию и разметку сообщений
+_PROMPT_RESERVE_TOKENS = 384
+# Уровней reduce не больше этого: на последнем пересказы обрезаются до одной части
+MAX_REDUCE_LEVELS = 4
+
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def chunk_by_tokens(text: str, count_tokens: Callable[[str], int], budget: int) -> list[str]:
+    """Режет текст на части не длиннее budget токенов по абзацам, предложениям и, в крайнем случае, символам."""
+    pieces = []
+    for paragraph in _PARAGRAPH_SPLIT_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= budget:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_SPLIT_RE.split(paragraph):
+            if count_tokens(sentence) <= budget:
+                pieces.append(sentence)
+                continue
+            # Предложение длиннее бюджета (таблица, текст без точек): режем по символам
+            step = max(1, int(len(sentence) * budget * 0.9) // count_tokens(sentence))
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and current_tokens + tokens > budget:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+# --- Пул процессов с отдельными экземплярами модели -------------------------
+
+_worker_llm = None
+
+
+def _init_worker(llama_kwargs: dict) -> None:
+    global _worker_llm
+    from llama_cpp import Llama
+    _worker_llm = Llama(**llama_kwargs)
+
+
+def _worker_generate(messages: list[dict], gen_args: dict) -> str:
+    result = _worker_llm.create_chat_completion(messages=messages, **gen_args)
+    return result["choices"][0]["message"]["content"]
+
+
+def affordable_workers(requested: int, model_path: str) -> int:
+    """Сколько экземпляров модели поместится в свободную память (не больше requested)."""
+    if requested <= 1 or psutil is None:
+        return 1
+    try:
+        model_bytes = Path(model_path).stat().st_size
+        available = psutil.virtual_memory().available
+    except OSError:
+        return 1
+    # Веса плюс KV-кэш и буферы: с запасом полтора размера файла на экземпляр
+    return max(1, min(requested, int(available // (model_bytes * 1.5))))
+
+
+class DocumentSummarizer:
+    """Map-reduce пересказ текста, не выходящий за n_ctx модели.
+
+    generate(messages) -> str — генерация на основной модели; count_tokens —
+    её токенизатор. on_progress(done, total) вызывается после каждой части.
+    """
+
+    def __init__(self, generate: Callable[[list[dict]], str], count_tokens: Callable[[str], int],
+                 n_ctx: int, max_tokens: int = 256, system_prompt: str = "",
+                 chunk_tokens: int = 0, workers: int = 1, llama_kwargs: Optional[dict] = None,
+                 gen_args: Optional[dict] = None):
+        self._generate = generate
+        self._count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.system_prompt = system_prompt
+        budget = n_ctx - max_tokens - _PROMPT_RESERVE_TOKENS - count_tokens(system_prompt)
+        self.chunk_tokens = min(chunk_tokens, budget) if chunk_tokens > 0 else budget
+        # В часть reduce должны помещаться два пересказа, иначе уровни не сокращают их число
+        self.chunk_tokens = max(128, 2 * max_tokens, self.chunk_tokens)
+        self._workers = workers
+        self._llama_kwargs = llama_kwargs
+        self.gen_args = dict(gen_args or {}, max_tokens=max_tokens)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0  # Пересказы, идущие сейчас
+        self._retired = False
+
+    def _messages(self, instruction: str, text: str) -> list[dict]:
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages.append({"role": "user", "content": f"{instruction}\n\n{text}"})
+        return messages
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._pool is not None:
+            return self._pool
+        if not self._llama_kwargs:
+            return None
+        workers = affordable_workers(self._workers, self._llama_kwargs.get("model_path", ""))
+        if workers <= 1:
+            return None
+        # Потоки делим между экземплярами, чтобы они не мешали друг другу
+        threads = max(1, (os.cpu_count() or workers) // workers)
+        kwargs = dict(self._llama_kwargs, n_threads=threads, n_threads_batch=threads)
+        print(f"[DOC_SUMMARY] Пул из {workers} экземпляров модели по {threads} потоков")
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(kwargs,))
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def retire(self) -> None:
+        """Закрывает пул, когда завершится текущий пересказ (замена при смене настроек)."""
+        with self._lock:
+            self._retired = True
+            busy = self._active > 0
+        if not busy:
+            self.shutdown()
+
+    def _map(self, chunks: list[str], title: str,
+             on_progress: Optional[Callable[[int, int], None]]) -> list[str]:
+        total = len(chunks)
+        requests = [self._messages(MAP_PROMPT.format(index=i, total=total, title=title), chunk)
+                    for i, chunk in enumerate(chunks, 1)]
+        pool = self._get_pool() if self._workers > 1 and total > 1 else None
+        summaries = []
+        if pool is not None:
+            futures = [pool.submit(_worker_generate, messages, self.gen_args) for messages in requests]
+            for done, future in enumerate(futures, 1):
+                summaries.append(_clean(future.result()))
+                if on_progress:
+                    on_progress(done, total)
+            return summaries
+        for done, messages in enumerate(requests, 1):
+            summaries.append(_clean(self._generate(messages)))
+            if on_progress:
+                on_progress(done, total)
+        return summaries
+
+    def summarize(self, text: str, title: str = "документ", question: str = "",
+                  on_progress: Optional[Callable[[int, int], None]] = None) -> str:
+        """Пересказ всего текста; question — исходный запрос пользователя для итогового шага."""
+        with self._lock:
+            self._active += 1
+        try:
+            return self._summarize(text, title, question, on_progress)
+        finally:
+            with self._lock:
+                self._active -= 1
+                finished = self._retired and self._active == 0
+            if finished:
+                self.shutdown()
+
+    def _summarize(self, text: str, title: str, question: str,
+                   on_progress: Optional[Callable[[int, int], None]]) -> str:
+        focus = f" Учитывай запрос пользователя: «{question}»." if question else ""
+        chunks = chunk_by_tokens(text, self._count_tokens, self.chunk_tokens)
+        if not chunks:
+            return ""
+        if len(chunks) == 1:
+            return _clean(self._generate(self._messages(SINGLE_PROMPT.format(title=title) + focus, chunks[0])))
+        print(f"[DOC_SUMMARY] «{title}»: {len(chunks)} частей по ≤{self.chunk_tokens} токенов")
+        summaries = self._map(chunks, title, on_progress)
+        # Reduce по уровням, пока пересказы не поместятся в один запрос
+        for level in range(1, MAX_REDUCE_LEVELS + 1):
+            groups = chunk_by_tokens("\n\n".join(summaries), self._count_tokens, self.chunk_tokens)
+            if len(groups) == 1:
+                break
+            if level == MAX_REDUCE_LEVELS or len(summaries) == 1:
+                # Модель пересказывает длиннее max_tokens или пересказов слишком много: обрезаем
+                print(f"[DOC_SUMMARY] «{title}»: пересказы не сошлись за {level} уровней, обрезаю")
+                groups = [self._truncate(summaries, self.chunk_tokens)]
+                break
+            if len(groups) >= len(summaries):
+                # Пересказы не упаковываются плотнее — объединяем попарно, иначе reduce не сойдётся
+                groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+            summaries = [_clean(self._generate(self._messages(REDUCE_PROMPT.format(title=title), group)))
+                         for group in groups]
+        return _clean(self._generate(self._messages(REDUCE_PROMPT.format(title=title) + focus, groups[0])))
+
+    def _truncate(self, summaries: list[str], budget: int) -> str:
+        """Пересказы, обрезанные поровну, чтобы вместе уложиться в budget токенов."""
+        share = max(1, budget // len(summaries) - 2)
+        return "\n\n".join(chunk_by_tokens(s, self._count_tokens, share)[0] for s in summaries if s.strip())
+
+
+def _clean(reply: str) -> str:
+    return re.sub(r"<think>.*?</think>", "", reply or "", flags=re.DOTALL).strip()
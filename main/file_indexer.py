@@ -1,11 +1,9 @@
+import importlib.util
 import urllib.parse
 from typing import Dict, List
 
-try:
-    import win32com.client
-    HAS_WIN32 = True
-except ImportError:
-    HAS_WIN32 = False
+# COM-привязки Windows Search импортируются при первом поиске, а не при запуске
+HAS_WIN32 = importlib.util.find_spec("win32com") is not None
 
 from main.lang_ru import ru_to_en as _ru_to_en
 
@@ -41,6 +39,7 @@ def _query_windows_search(query: str, max_results: int, item_type: str = None) -
         return []
     
     try:
+        import win32com.client
         conn = win32com.client.Dispatch("ADODB.Connection")
         conn.Open("Provider=Search.CollatorDSO;Extended Properties='Application=Windows';")
         
@@ -0,0 +1,120 @@
+"""Хранилище записей расписания с индексами.
+
+Записи лежат в порядке добавления и, если задан sort_key, дополнительно в
+отсортированном списке (bisect), так что список по времени строится без
+сортировки. Вторичные индексы (время суток, слова названия, тип записи)
+отвечают на поиск словарём, без перебора и повторного разбора строк.
+Индексируемые поля записи после добавления меняться не должны. Хранилище
+не потокобезопасно: блокировку держит вызывающий модуль.
+"""
+import itertools
+import re
+from bisect import bisect_left, insort
+from typing import Any, Callable, Generic, Hashable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_TOKEN_RE = re.compile(r"[a-zа-яё0-9]+")
+
+
+def tokens(text: str) -> set[str]:
+    """Слова строки в нижнем регистре (ключи индекса по названию)."""
+    return set(_TOKEN_RE.findall((text or "").lower()))
+
+
+class IndexedStore(Generic[T]):
+    """Записи в порядке добавления, по sort_key и по вторичным индексам.
+
+    indexes: имя индекса -> функция, возвращающая ключи записи (итерируемое),
+    например time=lambda r: (r.time,) или name=lambda r: tokens(r.app_name).
+    """
+
+    def __init__(self, sort_key: Optional[Callable[[T], Any]] = None,
+                 **indexes: Callable[[T], Iterable[Hashable]]):
+        self._sort_key = sort_key
+        self._index_funcs = indexes
+        self._seq = itertools.count()
+        self._entries: dict[int, T] = {}  # seq -> запись, в порядке добавления
+        self._seq_of: dict[int, int] = {}  # id(запись) -> seq
+        self._sorted: list[tuple] = []  # (ключ сортировки, seq)
+        self._sort_keys: dict[int, Any] = {}
+        self._index: dict[str, dict[Hashable, dict[int, T]]] = {name: {} for name in indexes}
+        self._index_keys: dict[int, dict[str, tuple]] = {}
+
+    def add(self, item: T) -> None:
+        seq = next(self._seq)
+        self._entries[seq] = item
+        self._seq_of[id(item)] = seq
+        if self._sort_key is not None:
+            key = self._sort_key(item)
+            self._sort_keys[seq] = key
+            insort(self._sorted, (key, seq))
+        keys_by_index = {}
+        for name, func in self._index_funcs.items():
+            keys = tuple(set(func(item)))
+            keys_by_index[name] = keys
+            for key in keys:
+                self._index[name].setdefault(key, {})[seq] = item
+        self._index_keys[seq] = keys_by_index
+
+    def remove(self, item: T) -> bool:
+        """Удаляет запись (по идентичности). False — её не было."""
+        seq = self._seq_of.pop(id(item), None)
+        if seq is None:
+            return False
+        del self._entries[seq]
+        if self._sort_key is not None:
+            pos = bisect_left(self._sorted, (self._sort_keys.pop(seq), seq))
+            del self._sorted[pos]
+        for name, keys in self._index_keys.pop(seq).items():
+            bucket = self._index[name]
+            for key in keys:
+                bucket[key].pop(seq, None)
+                if not bucket[key]:
+                    del bucket[key]
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._seq_of.clear()
+        self._sorted.clear()
+        self._sort_keys.clear()
+        self._index_keys.clear()
+        for bucket in self._index.values():
+            bucket.clear()
+
+    def find(self, index: str, key: Hashable) -> list[T]:
+        """Записи с ключом key в индексе index, в порядке добавления."""
+        return list(self._index[index].get(key, {}).values())
+
+    def find_all(self, index: str, keys: Iterable[Hashable]) -> list[T]:
+        """Записи, у которых в индексе есть все ключи keys (пересечение)."""
+        buckets = [self._index[index].get(key, {}) for key in keys]
+        if not buckets:
+            return []
+        buckets.sort(key=len)
+        common = [seq for seq in buckets[0] if all(seq in b for b in buckets[1:])]
+        return [self._entries[seq] for seq in sorted(common)]
+
+    def ordered(self) -> list[T]:
+        """Записи по возрастанию sort_key (без сортировки — список уже упорядочен)."""
+        if self._sort_key is None:
+            return list(self._entries.values())
+        return [self._entries[seq] for _, seq in self._sorted]
+
+    def first(self) -> Optional[T]:
+        if self._sort_key is not None:
+            return self._entries[self._sorted[0][1]] if self._sorted else None
+        return next(iter(self._entries.values()), None)
+
+    def __contains__(self, item: object) -> bool:
+        return id(item) in self._seq_of
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(list(self._entries.values()))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
@@ -0,0 +1,402 @@
+"""Быстрый классификатор намерений перед обращением к LLM.
+
+Линейная модель (мультиклассовая логистическая регрессия) на хэшированных
+символьных n-граммах. Обучается за секунды на примерах ниже и на размеченной
+истории (поле intent в data/history.json), инференс — одна выборка строк
+матрицы весов и softmax.
+
+Обучение и оценка на отложенной части истории из корня проекта:
+    python -m main.intent_classifier [--history data/history.json] [--holdout 0.2] [--dry-run]
+
+Оценка имеет смысл только на реальных фразах из истории: пока размеченных
+записей мало, печатается лишь проверка на случайной части начальных
+примеров, которая завышает точность.
+"""
+import argparse
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from user.json_storage import load_json
+
+N_FEATURES = 1 << 13
+NGRAM_RANGE = (2, 4)
+
+# Класс «не команда»: вопрос уходит в LLM
+LLM_INTENT = "llm"
+WEB_SEARCH_INTENT = "web_search"
+
+# Намерения без аргументов: каноническая фраза, которую гарантированно понимает обработчик
+INTENT_COMMANDS = {
+    "time": "который час",
+    "date": "какое сегодня число",
+    "list_reminders": "покажи напоминания",
+    "ip": "какой мой ip",
+    "screenshot": "сделай скриншот",
+    "start_menu": "открой меню пуск",
+    "explorer": "открой проводник",
+    "coin_flip": "подбрось монетку",
+}
+
+# Обработчик -> намерение, для разметки истории в route_command
+HANDLER_INTENTS = {
+    "execute_time_command": "time",
+    "execute_date_command": "date",
+    "execute_list_reminders_command": "list_reminders",
+    "execute_ip_command": "ip",
+    "execute_screenshot_command": "screenshot",
+    "execute_start_menu_command": "start_menu",
+    "execute_explorer_command": "explorer",
+    "execute_coin_flip_command": "coin_flip",
+}
+
+LABELS = (*INTENT_COMMANDS, WEB_SEARCH_INTENT, LLM_INTENT)
+
+# Намерения с действием на компьютере: ошибка заметнее, чем лишний вызов LLM,
+# поэтому для них нужна уверенность не ниже intent.action_threshold
+ACTION_INTENTS = frozenset({"screenshot", "start_menu", "explorer"})
+
+# Сколько фраз истории нужно в отложенной части, чтобы оценка была на ней
+MIN_HISTORY_TEST = 20
+
+# Начальные примеры: формулировки из регулярок обработчиков и близкие к ним,
+# которые регулярки пропускают
+SEED_EXAMPLES = {
+    "time": [
+        "который час", "сколько времени", "какое время", "время",
+        "который сейчас час", "сколько сейчас времени", "подскажи время",
+        "скажи время", "время не подскажешь", "сколько там времени",
+        "скажи сколько время", "который там час", "сколько на часах",
+        "а сейчас сколько времени", "глянь время", "текущее время",
+    ],
+    "date": [
+        "какое сегодня число", "какая дата", "какой сегодня день",
+        "сегодняшняя дата", "назови дату", "какое число", "что сегодня за день",
+        "какой день недели", "скажи дату", "число сегодня какое",
+        "подскажи какое число", "какой сейчас месяц", "дата сегодня",
+        "какое сегодня число месяца", "какой нынче день",
+    ],
+    "list_reminders": [
+        "покажи напоминания", "список напоминаний", "какие напоминания",
+        "все напоминания", "что я просил напомнить", "какие у меня напоминания есть",
+        "есть ли напоминания", "напомни что запланировано", "что у меня запланировано",
+        "мои напоминалки", "озвучь напоминания", "прочитай напоминания",
+    ],
+    "ip": [
+        "какой мой ip", "мой айпи", "ip адрес", "какой у меня ip адрес",
+        "узнай айпи", "скажи мой адрес в сети", "какой у компьютера адрес в сети",
+        "айпишник какой", "назови айпишник", "мой внешний адрес", "сетевой адрес компьютера",
+    ],
+    "screenshot": [
+        "сделай скриншот", "скриншот", "снимок экрана", "сделай снимок",
+        "сфоткай экран", "заскринь экран", "сохрани экран", "скрин экрана",
+        "сделай скрин", "заскринь", "сфотографируй экран", "запечатлей экран",
+    ],
+    "start_menu": [
+        "открой меню пуск", "пуск", "меню пуск", "старт меню", "покажи пуск",
+        "нажми пуск", "открой пуск", "кнопка пуск", "открой стартовое меню",
+        "вызови меню пуск", "открой главное меню",
+    ],
+    "explorer": [
+        "открой проводник", "мой компьютер", "этот компьютер", "открой мой компьютер",
+        "проводник", "запусти проводник", "открой файловый менеджер",
+        "покажи диски", "открой диски", "покажи файлы на компьютере", "открой обзор файлов",
+    ],
+    "coin_flip": [
+        "подбрось монетку", "орёл или решка", "монетка", "кинь монетку",
+        "брось монету", "подкинь монету", "орел или решка", "давай жребий",
+        "подкинь монетку пожалуйста", "брось жребий", "подбрось монету на удачу",
+    ],
+    WEB_SEARCH_INTENT: [
+        "что нового в мире", "последние новости", "кто выиграл вчерашний матч",
+        "какой счёт в матче", "что происходит в мире", "кто победил на выборах",
+        "курс доллара", "цена биткоина", "пробки в городе", "найди информацию о марсоходах",
+        "какие фильмы идут в кино", "во сколько закрывается ашан",
+        "когда выйдет новая серия", "какая погода будет на выходных в сочи",
+        "сколько стоит новый айфон", "что случилось на бирже",
+        "когда следующий матч сборной", "расписание электричек до москвы",
+    ],
+    LLM_INTENT: [
+        "расскажи анекдот", "что такое фотосинтез", "почему небо голубое",
+        "как дела", "напиши стихотворение про осень", "объясни теорию относительности",
+        "сколько будет два плюс два", "переведи слово кошка на английский",
+        "кто написал войну и мир", "придумай имя для кота", "как приготовить борщ",
+        "посоветуй что посмотреть вечером", "расскажи сказку", "ты кто",
+        "что ты умеешь", "как тебя зовут", "сколько лет живут черепахи",
+        "чем заняться в выходные", "как научиться программировать",
+        "объясни что такое рекурсия", "придумай загадку", "спасибо",
+        "как выучить английский", "что лучше чай или кофе", "дай совет",
+        "сколько часов нужно спать", "как пишется слово компьютер",
+        "в чём смысл жизни", "расскажи про чёрные дыры", "сочини песню",
+        "какая столица австралии", "почему кошки мурлычут", "помоги составить список покупок",
+        "что такое время", "как устроены часы", "расскажи историю про монетку",
+        "сколько дней в году", "что означает слово экран", "как сделать хороший снимок",
+        # Близкие к командам по словам, но не команды
+        "чему равно число пи", "какое число больше", "какое число называют простым",
+        "сколько времени варить макароны", "сколько времени лететь до луны",
+        "какой был день недели в 1961 году", "пуск ракеты", "открой браузер",
+        "открой сайт погоды", "открой окно в комнате", "компьютер завис что делать",
+        "как сделать скриншот на телефоне", "сколько стоит компьютер",
+    ],
+}
+
+_CLEAN_RE = re.compile(r"[^a-zа-я0-9]+")
+
+
+def _normalize(text: str) -> str:
+    return _CLEAN_RE.sub(" ", (text or "").lower().replace("ё", "е")).strip()
+
+
+def _hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & (N_FEATURES - 1)
+
+
+def featurize(text: str):
+    """Хэшированные символьные n-граммы и слова: (индексы, веса) с L2-нормой 1."""
+    norm = _normalize(text)
+    padded = f" {norm} "
+    counts = Counter()
+    lo, hi = NGRAM_RANGE
+    for n in range(lo, hi + 1):
+        for i in range(len(padded) - n + 1):
+            counts[_hash(padded[i:i + n])] += 1
+    for word in norm.split():
+        counts[_hash("w:" + word)] += 1
+    if not counts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    idx = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    val = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    val /= np.linalg.norm(val)
+    return idx, val
+
+
+def _design_matrix(texts: list[str]):
+    x = np.zeros((len(texts), N_FEATURES), dtype=np.float32)
+    for row, text in enumerate(texts):
+        idx, val = featurize(text)
+        np.add.at(x[row], idx, val)
+    return x
+
+
+class IntentClassifier:
+    """Мультиклассовая логистическая регрессия над featurize()."""
+
+    def __init__(self, labels: list[str], weights, bias):
+        self.labels = list(labels)
+        self.weights = weights  # (N_FEATURES, число классов)
+        self.bias = bias
+
+    @classmethod
+    def fit(cls, texts: list[str], labels: list[str], epochs: int = 300,
+            lr: float = 2.0, l2: float = 1e-4) -> "IntentClassifier":
+        """Полнобатчевый градиентный спуск с моментом; классы взвешены по частоте."""
+        classes = [c for c in LABELS if c in set(labels)]
+        y = np.array([classes.index(l) for l in labels])
+        x = _design_matrix(texts)
+        n, k = len(texts), len(classes)
+        onehot = np.eye(k, dtype=np.float32)[y]
+        freq = np.bincount(y, minlength=k).astype(np.float32)
+        sample_w = (n / (k * freq))[y][:, None]
+
+        w = np.zeros((N_FEATURES, k), dtype=np.float32)
+        b = np.zeros(k, dtype=np.float32)
+        vw, vb = np.zeros_like(w), np.zeros_like(b)
+        for _ in range(epochs):
+            logits = x @ w + b
+            logits -= logits.max(axis=1, keepdims=True)
+            p = np.exp(logits)
+            p /= p.sum(axis=1, keepdims=True)
+            grad = (p - onehot) * sample_w / n
+            vw = 0.9 * vw + x.T @ grad + l2 * w
+            vb = 0.9 * vb + grad.sum(axis=0)
+            w -= lr * vw
+            b -= lr * vb
+        return cls(classes, w, b)
+
+    def predict_proba(self, text: str):
+        idx, val = featurize(text)
+        logits = val @ self.weights[idx] + self.bias
+        logits -= logits.max()
+        p = np.exp(logits)
+        return p / p.sum()
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Намерение и его вероятность."""
+        p = self.predict_proba(text)
+        i = int(p.argmax())
+        return self.labels[i], float(p[i])
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, labels=np.array(self.labels),
+                                n_features=N_FEATURES, seed_version=_seed_version())
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IntentClassifier"]:
+        """Загружает модель; None, если файла нет или он от другой версии признаков и примеров."""
+        try:
+            data = np.load(path)
+            if int(data["n_features"]) != N_FEATURES or int(data["seed_version"]) != _seed_version():
+                return None
+            return cls([str(l) for l in data["labels"]], data["weights"], data["bias"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def routed_intent(intent: str, prob: float, threshold: float, action_threshold: float) -> str:
+    """Намерение, которое выполняется без LLM, или LLM_INTENT, если уверенности не хватает."""
+    limit = action_threshold if intent in ACTION_INTENTS else threshold
+    return intent if prob >= limit else LLM_INTENT
+
+
+def _seed_version() -> int:
+    """Контрольная сумма начальных примеров: после их правки модель переобучается."""
+    return zlib.crc32(repr(sorted(SEED_EXAMPLES.items())).encode("utf-8"))
+
+
+def seed_dataset() -> tuple[list[str], list[str]]:
+    texts, labels = [], []
+    for label, examples in SEED_EXAMPLES.items():
+        texts += examples
+        labels += [label] * len(examples)
+    return texts, labels
+
+
+def history_dataset(path: Path) -> tuple[list[str], list[str]]:
+    """Размеченные записи истории в хронологическом порядке."""
+    texts, labels = [], []
+    for entry in load_json(path, {}).get("history", []):
+        intent = entry.get("intent", "")
+        text = entry.get("user_text", "")
+        if intent in LABELS and text:
+            texts.append(text)
+            labels.append(intent)
+    return texts, labels
+
+
+def train(history_path: Optional[Path] = None) -> Optional[IntentClassifier]:
+    """Обучает модель на начальных примерах и истории. None без numpy."""
+    if np is None:
+        return None
+    texts, labels = seed_dataset()
+    if history_path is not None:
+        h_texts, h_labels = history_dataset(history_path)
+        texts += h_texts
+        labels += h_labels
+    return IntentClassifier.fit(texts, labels)
+
+
+def load_or_train(model_path: Path, history_path: Optional[Path] = None) -> Optional[IntentClassifier]:
+    """Модель из файла, а если его нет — обучение с сохранением. None без numpy."""
+    if np is None:
+        print("[INTENT] numpy не установлен, классификатор намерений отключён")
+        return None
+    model = IntentClassifier.load(model_path) if Path(model_path).is_file() else None
+    if model is None:
+        t0 = time.perf_counter()
+        model = train(history_path)
+        model.save(model_path)
+        print(f"[INTENT] Модель обучена за {time.perf_counter() - t0:.1f} с")
+    return model
+
+
+# --- Оценка --------------------------------------------------------------------
+
+def _split(texts: list[str], labels: list[str], history: tuple[list[str], list[str]],
+           holdout: float, seed: int):
+    """Отложенная выборка: последние записи истории, а при малой истории — случайная часть примеров."""
+    h_texts, h_labels = history
+    n_test = int(len(h_texts) * holdout)
+    if n_test >= MIN_HISTORY_TEST:
+        train_x = texts + h_texts[:-n_test]
+        train_y = labels + h_labels[:-n_test]
+        return train_x, train_y, h_texts[-n_test:], h_labels[-n_test:], "история"
+    pairs = list(zip(texts + h_texts, labels + h_labels))
+    random.Random(seed).shuffle(pairs)
+    n_test = max(1, int(len(pairs) * holdout))
+    test, rest = pairs[:n_test], pairs[n_test:]
+    return ([t for t, _ in rest], [l for _, l in rest],
+            [t for t, _ in test], [l for _, l in test], "случайная часть примеров")
+
+
+def evaluate(model: IntentClassifier, texts: list[str], labels: list[str], threshold: float,
+             action_threshold: float) -> dict:
+    correct = routed = routed_correct = false_actions = 0
+    latencies = []
+    for text, label in zip(texts, labels):
+        t0 = time.perf_counter()
+        intent, prob = model.predict(text)
+        latencies.append(time.perf_counter() - t0)
+        correct += intent == label
+        # В рантайме неуверенное намерение уходит в LLM
+        intent = routed_intent(intent, prob, threshold, action_threshold)
+        if intent != LLM_INTENT:
+            routed += 1
+            routed_correct += intent == label
+            false_actions += intent in ACTION_INTENTS and intent != label
+    latencies.sort()
+    n = max(1, len(texts))
+    return {
+        "samples": len(texts),
+        "accuracy": correct / n,
+        "routed_share": routed / n,
+        "routed_precision": routed_correct / routed if routed else 1.0,
+        "false_actions": false_actions,
+        "latency_mean_us": sum(latencies) / n * 1e6,
+        "latency_p95_us": latencies[int(0.95 * (len(latencies) - 1))] * 1e6 if latencies else 0.0,
+    }
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    from main.config_manager import get_config, get_data_dir
+
+    data_dir = get_data_dir()
+    parser = argparse.ArgumentParser(description="Обучение и оценка классификатора намерений")
+    parser.add_argument("--history", type=Path, default=data_dir / "history.json")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dry-run", action="store_true", help="Не сохранять модель")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("[INTENT] Для обучения нужен numpy")
+        return
+    threshold = float(get_config().get("intent", "threshold", default=0.8))
+    action_threshold = float(get_config().get("intent", "action_threshold", default=0.97))
+    texts, labels = seed_dataset()
+    history = history_dataset(args.history)
+    train_x, train_y, test_x, test_y, source = _split(texts, labels, history, args.holdout, args.seed)
+    if source != "история":
+        print(f"[INTENT] В истории {len(history[0])} размеченных фраз — мало для оценки "
+              f"(нужно {MIN_HISTORY_TEST} в отложенной части). Ниже проверка на начальных "
+              "примерах: она завышает точность на реальных фразах.")
+
+    t0 = time.perf_counter()
+    model = IntentClassifier.fit(train_x, train_y)
+    print(f"[INTENT] Обучение: {len(train_x)} примеров за {time.perf_counter() - t0:.1f} с")
+    r = evaluate(model, test_x, test_y, threshold, action_threshold)
+    print(f"[INTENT] Отложенная выборка ({source}): {r['samples']} фраз, точность {r['accuracy']:.1%}")
+    print(f"[INTENT] Пороги {threshold}/{action_threshold}: мимо LLM {r['routed_share']:.1%} фраз, "
+          f"из них верно {r['routed_precision']:.1%}, ложных действий {r['false_actions']}")
+    print(f"[INTENT] Задержка: в среднем {r['latency_mean_us']:.0f} мкс, p95 {r['latency_p95_us']:.0f} мкс")
+    if args.dry_run:
+        return
+
+    model = IntentClassifier.fit(texts + history[0], labels + history[1])
+    model.save(data_dir / "intent_model.npz")
+    print(f"[INTENT] Модель сохранена в {data_dir / 'intent_model.npz'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -115,6 +115,18 @@ def replace_number_words(text: str) -> str:
     return " ".join(result)
 
 
+def plural_ru(n: int, one: str, few: str, many: str) -> str:
+    """Форма слова для числа: 1 минута, 2 минуты, 5 минут."""
+    n = abs(n) % 100
+    if 11 <= n <= 19:
+        return many
+    if n % 10 == 1:
+        return one
+    if 2 <= n % 10 <= 4:
+        return few
+    return many
+
+
 def _number_to_text(n: int) -> str:
     """Преобразует число от 0 до 99 в текст."""
     ones = ["", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять"]
@@ -279,103 +291,133 @@ def year_to_text(year: int, case: str = "nominative") -> str:
             parts.append("год")
             return " ".join(parts)
 
+# --- Нормализация текста для TTS --------------------------------------------
+# Всё собирается один раз при импорте: таблица произношений годов и единое
+# регулярное выражение, которое за один проход по тексту вырезает источники
+# и ссылки, сжимает пробелы и проговаривает годы.
+
+_YEAR_RE = r"(?:19|20)\d{2}"
+
+# Предрасчитанные формы year_to_text для 1900–2099: индекс — год минус 1900
+_YEAR_FORMS = {
+    case: tuple(year_to_text(year, case) for year in range(1900, 2100))
+    for case in ("nominative", "genitive", "prepositional")
+}
+
+_YEAR_CONTEXT_WORDS = (
+    r"родил[ас]я|родился|родилась|появил[ас]я|появился|появилась"
+    r"|вышел|вышла|вышло|выпущен|выпущена|выпущено|создан|создана|создано|основан|основана|основано"
+    r"|умер|умерла|скончал[ас]я|скончался|скончалась"
+)
+
+# Правила для годов в порядке приоритета. Лексемы с одной позиции перебираются
+# слева направо, поэтому порядок воспроизводит прежнюю последовательность re.sub.
+_YEAR_TOKENS = (
+    # "в 2020 году" -> "в две тысячи двадцатом году"
+    rf"(?P<v_year_godu>(?i:\bв\s+(?P<y1>{_YEAR_RE})\s+году\b))",
+    # "родился в 1990" -> "родился в тысяча девятьсот девяностом году"
+    rf"(?P<context_year>(?i:\b(?=[рпвсоу])(?P<ctx>{_YEAR_CONTEXT_WORDS})\s+в\s+(?P<y2>{_YEAR_RE})\b(?!\s+году\b)))",
+    # "в 2020" -> "в две тысячи двадцатом году"
+    rf"(?P<v_year>(?i:\bв\s+(?P<y3>{_YEAR_RE})\b(?!\s+году)))",
+    # "2020 года" -> "две тысячи двадцатого года"
+    rf"(?P<year_goda>(?i:\b(?P<y4>{_YEAR_RE})\s+года\b))",
+    # "2020 год" -> "две тысячи двадцать год"
+    rf"(?P<year_god>(?i:\b(?P<y5>{_YEAR_RE})\s+год\b))",
+    # Отдельно стоящий год; проверка слова перед ним — в _replace_standalone_year
+    rf"(?P<standalone_year>\b(?P<y6>{_YEAR_RE})\b(?!\s+году)(?!\s+года))",
+)
+
+# Блок "(источники: ...)" в конце ответа
+_SOURCES_BLOCK_RE = r"(?i:\s*\(источники?:(?s:.*?)\)\s*$)"
+# Строка "источники: ..." до конца текста (или до блока источников в конце)
+_SOURCES_LINE_RE = rf"(?i:\bисточники?:.*(?:$|(?={_SOURCES_BLOCK_RE})))"
+
+_CLEAN_TOKENS = (
+    rf"(?P<sources_block>{_SOURCES_BLOCK_RE})",
+    rf"(?P<sources_line>{_SOURCES_LINE_RE})",
+    # Подряд идущие ссылки вместе с пробелами вокруг; URL не поглощает начало источников
+    rf"(?P<urls>(?:\s*https?://(?:[^\s(иИ]+|(?!{_SOURCES_BLOCK_RE}|{_SOURCES_LINE_RE})[(иИ])+)+\s*)",
+    r"(?P<spaces>\s{2,})",
+)
+_TTS_TOKENS = _CLEAN_TOKENS + _YEAR_TOKENS
+
+# Быстрый отсев позиций, с которых не начинается ни одна лексема
+_TOKEN_START = r"(?=[\s(hиИвВрРпПсСоОуУ12])"
+
+_YEARS_PATTERN = re.compile(_TOKEN_START + "(?:" + "|".join(_YEAR_TOKENS) + ")")
+_TTS_PATTERN = re.compile(_TOKEN_START + "(?:" + "|".join(_TTS_TOKENS) + ")")
+_CLEAN_PATTERN = re.compile("|".join(_CLEAN_TOKENS))
+
+
+def _emitted_tail(out: list, size: int) -> str:
+    """Последние size символов уже сформированного результата."""
+    tail = ""
+    for piece in reversed(out):
+        tail = piece + tail
+        if len(tail) >= size:
+            break
+    return tail[-size:]
+
+
+def _replace_standalone_year(match, out: list) -> str:
+    # Год после "в ", "года " или "году " оставляем как есть (прежний lookbehind)
+    tail = _emitted_tail(out, 5)
+    if len(tail) >= 2 and tail[-1].isspace() and (tail[-2] == "в" or tail[-5:-1] in ("года", "году")):
+        return match.group(0)
+    return _YEAR_FORMS["nominative"][int(match.group("y6")) - 1900]
+
+
+def _collapse_urls(match, out: list) -> str:
+    # После удаления ссылок пробелы вокруг них сливаются: два и более -> один
+    spaces = [ch for ch in match.group(0) if ch.isspace()]
+    return " " if len(spaces) >= 2 else "".join(spaces)
+
+
+_TOKEN_HANDLERS = {
+    "sources_block": lambda m, out: "",
+    "sources_line": lambda m, out: "",
+    "urls": _collapse_urls,
+    "spaces": lambda m, out: " ",
+    "v_year_godu": lambda m, out: "в " + _YEAR_FORMS["prepositional"][int(m.group("y1")) - 1900],
+    "context_year": lambda m, out: f"{m.group('ctx')} в {_YEAR_FORMS['prepositional'][int(m.group('y2')) - 1900]}",
+    "v_year": lambda m, out: "в " + _YEAR_FORMS["prepositional"][int(m.group("y3")) - 1900],
+    "year_goda": lambda m, out: _YEAR_FORMS["genitive"][int(m.group("y4")) - 1900],
+    "year_god": lambda m, out: _YEAR_FORMS["nominative"][int(m.group("y5")) - 1900],
+    "standalone_year": _replace_standalone_year,
+}
+
+
+def _tokenize_replace(pattern: re.Pattern, text: str) -> str:
+    """Один проход finditer: каждая найденная лексема заменяется своим обработчиком."""
+    out = []
+    pos = 0
+    for match in pattern.finditer(text):
+        out.append(text[pos:match.start()])
+        out.append(_TOKEN_HANDLERS[match.lastgroup](match, out))
+        pos = match.end()
+    out.append(text[pos:])
+    return "".join(out)
+
+
 def convert_years_in_text(text: str) -> str:
     """Преобразует годы в тексте в правильное произношение.
     
     Обрабатывает как контекстные случаи (родился в, вышел в), так и отдельно стоящие годы.
     """
-    result = text
-    
-    def replace_v_year_godu(match):
-        year_str = match.group(1)
-        try:
-            year = int(year_str)
-            if 1900 <= year <= 2099:
-                year_text = year_to_text(year, "prepositional")
-                return f"в {year_text}"
-            return match.group(0)
-        except ValueError:
-            return match.group(0)
-    
-    result = re.sub(r'\bв\s+((?:19|20)\d{2})\s+году\b', replace_v_year_godu, result, flags=re.IGNORECASE)
-    
-    context_patterns = [
-        r'\b(родил[ас]я|родился|родилась|появил[ас]я|появился|появилась)\s+в\s+((?:19|20)\d{2})\b',
-        r'\b(вышел|вышла|вышло|выпущен|выпущена|выпущено|создан|создана|создано|основан|основана|основано)\s+в\s+((?:19|20)\d{2})\b',
-        r'\b(умер|умерла|скончал[ас]я|скончался|скончалась)\s+в\s+((?:19|20)\d{2})\b',
-    ]
-    
-    for pattern in context_patterns:
-        def replace_context_year(match):
-            context_word = match.group(1)
-            year_str = match.group(2)
-            try:
-                year = int(year_str)
-                if 1900 <= year <= 2099:
-                    year_text = year_to_text(year, "prepositional")
-                    return f"{context_word} в {year_text}"
-                return match.group(0)
-            except ValueError:
-                return match.group(0)
-        
-        result = re.sub(pattern, replace_context_year, result, flags=re.IGNORECASE)
-    
-    def replace_v_year(match):
-        year_str = match.group(1)
-        try:
-            year = int(year_str)
-            if 1900 <= year <= 2099:
-                year_text = year_to_text(year, "prepositional")
-                return f"в {year_text}"
-            return match.group(0)
-        except ValueError:
-            return match.group(0)
-    
-    result = re.sub(r'\bв\s+((?:19|20)\d{2})\b(?!\s+году)', replace_v_year, result, flags=re.IGNORECASE)
-    
-    def replace_year_goda(match):
-        year_str = match.group(1)
-        try:
-            year = int(year_str)
-            if 1900 <= year <= 2099:
-                # Используем родительный падеж (genitive) для правильного произношения
-                year_text = year_to_text(year, "genitive")
-                return year_text
-            return match.group(0)
-        except ValueError:
-            return match.group(0)
-    
-    result = re.sub(r'\b((?:19|20)\d{2})\s+года\b', replace_year_goda, result, flags=re.IGNORECASE)
-    
-    def replace_year_god(match):
-        year_str = match.group(1)
-        try:
-            year = int(year_str)
-            if 1900 <= year <= 2099:
-                year_text = year_to_text(year, "nominative")
-                # year_text уже содержит слово "год", поэтому просто возвращаем его
-                return year_text
-            return match.group(0)
-        except ValueError:
-            return match.group(0)
-    
-    result = re.sub(r'\b((?:19|20)\d{2})\s+год\b', replace_year_god, result, flags=re.IGNORECASE)
-    
-    def replace_standalone_year(match):
-        year_str = match.group(0)
-        try:
-            year = int(year_str)
-            if 1900 <= year <= 2099:
-                # Проверяем, что это похоже на год (не телефон, не другое число)
-                return year_to_text(year, "nominative")
-            return year_str
-        except ValueError:
-            return year_str
-    
-    result = re.sub(r'(?<!в\s)(?<!года\s)(?<!году\s)\b((?:19|20)\d{2})\b(?!\s+году)(?!\s+года)', 
-                   replace_standalone_year, result)
-    
-    return result
+    return _tokenize_replace(_YEARS_PATTERN, text)
+
+
+def normalize_for_tts(text: str) -> str:
+    """Готовит ответ к озвучиванию за один проход.
+
+    Удаляет источники и ссылки, сжимает пробелы и преобразует годы в правильное произношение.
+    Если в тексте есть ссылка, годы читаются уже после её удаления, как раньше:
+    "в https://... 2020 году" превращается в "в 2020 году" и склоняется целиком.
+    """
+    text = text or ""
+    if "http" in text:
+        return _tokenize_replace(_YEARS_PATTERN, _tokenize_replace(_CLEAN_PATTERN, text).strip())
+    return _tokenize_replace(_TTS_PATTERN, text).strip()
 
 def format_date_for_tts(date_str: str) -> str:
     """
@@ -0,0 +1,197 @@
+"""Параметры llama.cpp из секции model.runtime и подбор n_threads/n_batch.
+
+Запуск подбора из корня проекта:
+    python -m main.llm_tuning [--threads 4,6,8] [--batches 128,256,512] [--dry-run]
+"""
+import argparse
+import itertools
+import os
+import time
+from typing import Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Типы KV-кэша (значения enum ggml_type из llama.cpp)
+KV_CACHE_TYPES = {"f32": 0, "f16": 1, "q4_0": 2, "q4_1": 3, "q5_0": 6, "q5_1": 7, "q8_0": 8}
+
+DEFAULT_RUNTIME = {
+    "n_threads": 0,         # 0 — по числу физических ядер
+    "n_threads_batch": 0,   # 0 — по числу логических ядер
+    "n_batch": 512,
+    "n_ubatch": 512,
+    "use_mmap": True,
+    "use_mlock": False,
+    "flash_attn": False,
+    "type_k": "f16",
+    "type_v": "f16",
+}
+
+# Текст для замера обработки промпта: типичный системный промпт с историей
+_BENCH_TEXT = (
+    "Ты — Вера, голосовая помощница. Отвечаешь кратко и по делу на русском языке. "
+    "Пользователь спрашивает о погоде, курсах валют, просит открыть приложения, "
+    "поставить таймер или напомнить о делах. "
+)
+
+
+def physical_cores() -> int:
+    if psutil is not None:
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def logical_cores() -> int:
+    if psutil is not None:
+        cores = psutil.cpu_count(logical=True)
+        if cores:
+            return cores
+    return os.cpu_count() or 1
+
+
+def runtime_kwargs(runtime: Optional[dict]) -> dict:
+    """Преобразует model.runtime в аргументы Llama(...). Неизвестные ключи игнорируются."""
+    rt = dict(DEFAULT_RUNTIME)
+    rt.update(runtime or {})
+    kwargs = {
+        "n_threads": int(rt["n_threads"] or 0) or physical_cores(),
+        "n_threads_batch": int(rt["n_threads_batch"] or 0) or logical_cores(),
+        "n_batch": int(rt["n_batch"]),
+        "n_ubatch": min(int(rt["n_ubatch"]), int(rt["n_batch"])),
+        "use_mmap": bool(rt["use_mmap"]),
+        "use_mlock": bool(rt["use_mlock"]),
+        "flash_attn": bool(rt["flash_attn"]),
+    }
+    if "n_gpu_layers" in rt:
+        kwargs["n_gpu_layers"] = int(rt["n_gpu_layers"])
+    for key in ("type_k", "type_v"):
+        name = str(rt.get(key) or "f16").lower()
+        if name not in KV_CACHE_TYPES:
+            print(f"[LLM] Неизвестный тип KV-кэша {key}={name}, используется f16")
+            name = "f16"
+        kwargs[key] = KV_CACHE_TYPES[name]
+    # llama.cpp поддерживает квантованный V-кэш только вместе с flash attention
+    if kwargs["type_v"] not in (KV_CACHE_TYPES["f16"], KV_CACHE_TYPES["f32"]) and not kwargs["flash_attn"]:
+        print("[LLM] Квантованный type_v требует flash_attn, используется f16")
+        kwargs["type_v"] = KV_CACHE_TYPES["f16"]
+    return kwargs
+
+
+def build_llama_kwargs(model_cfg: dict) -> dict:
+    """Аргументы Llama(...) из секции model конфига."""
+    kwargs = {
+        "model_path": model_cfg["path"],
+        "n_ctx": model_cfg["ctx_size"],
+        "verbose": False,
+    }
+    if "chat_format" in model_cfg:
+        kwargs["chat_format"] = model_cfg["chat_format"]
+    kwargs.update(runtime_kwargs(model_cfg.get("runtime")))
+    return kwargs
+
+
+# --- Подбор параметров ---------------------------------------------------------
+
+def _measure(llama_cls, base_kwargs: dict, n_threads: int, n_batch: int,
+             prompt_tokens: int, gen_tokens: int) -> dict:
+    kwargs = dict(base_kwargs, n_threads=n_threads, n_batch=n_batch,
+                  n_ubatch=min(n_batch, base_kwargs.get("n_ubatch", n_batch)))
+    llm = llama_cls(**kwargs)
+    try:
+        text = _BENCH_TEXT * (prompt_tokens // 20 + 1)
+        tokens = llm.tokenize(text.encode("utf-8"), add_bos=True)[:prompt_tokens]
+        # Прогон вхолостую: первые вызовы платят за page faults
+        llm.eval(tokens[:16])
+        llm.reset()
+
+        t0 = time.perf_counter()
+        llm.eval(tokens)
+        prompt_s = time.perf_counter() - t0
+
+        llm.reset()
+        t1 = time.perf_counter()
+        result = llm.create_completion("Расскажи коротко о себе.", max_tokens=gen_tokens,
+                                       temperature=0.0, seed=42)
+        gen_s = time.perf_counter() - t1
+        generated = max(1, result["usage"]["completion_tokens"])
+    finally:
+        del llm
+    return {
+        "n_threads": n_threads,
+        "n_batch": n_batch,
+        "prompt_tps": len(tokens) / prompt_s,
+        "gen_tps": generated / gen_s,
+        # Оценка задержки типичного ответа: промпт + генерация
+        "latency_s": prompt_tokens / (len(tokens) / prompt_s) + gen_tokens / (generated / gen_s),
+    }
+
+
+def tune(model_cfg: dict, threads: list[int], batches: list[int],
+         prompt_tokens: int = 512, gen_tokens: int = 48) -> list[dict]:
+    """Перебирает n_threads × n_batch и возвращает замеры, лучшие первыми."""
+    from llama_cpp import Llama
+
+    base_kwargs = build_llama_kwargs(model_cfg)
+    results = []
+    for n_threads, n_batch in itertools.product(threads, batches):
+        try:
+            r = _measure(Llama, base_kwargs, n_threads, n_batch, prompt_tokens, gen_tokens)
+        except Exception as e:
+            print(f"[TUNING] threads={n_threads} batch={n_batch}: ошибка {e}")
+            continue
+        print(f"[TUNING] threads={n_threads:>2} batch={n_batch:>4}: "
+              f"промпт {r['prompt_tps']:.1f} ток/с, генерация {r['gen_tps']:.1f} ток/с, "
+              f"ответ ~{r['latency_s']:.2f} с")
+        results.append(r)
+    results.sort(key=lambda r: r["latency_s"])
+    return results
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    from main.config_manager import get_config
+
+    parser = argparse.ArgumentParser(description="Подбор n_threads/n_batch для локальной модели")
+    parser.add_argument("--threads", type=_int_list, default=None,
+                        help="Список потоков через запятую (по умолчанию от половины до всех ядер)")
+    parser.add_argument("--batches", type=_int_list, default=[128, 256, 512, 1024])
+    parser.add_argument("--prompt-tokens", type=int, default=512)
+    parser.add_argument("--gen-tokens", type=int, default=48)
+    parser.add_argument("--dry-run", action="store_true", help="Не записывать результат в config.json")
+    args = parser.parse_args()
+
+    config = get_config()
+    model_cfg = config.get("model", default={})
+    threads = args.threads
+    if not threads:
+        top = logical_cores()
+        threads = sorted({max(1, physical_cores() // 2), physical_cores(), top})
+
+    results = tune(model_cfg, threads, args.batches, args.prompt_tokens, args.gen_tokens)
+    if not results:
+        print("[TUNING] Нет успешных замеров, конфиг не изменён")
+        return
+    best = results[0]
+    print(f"[TUNING] Лучшее: n_threads={best['n_threads']}, n_batch={best['n_batch']}")
+    if args.dry_run:
+        return
+
+    runtime = dict(DEFAULT_RUNTIME)
+    runtime.update(model_cfg.get("runtime") or {})
+    runtime["n_threads"] = best["n_threads"]
+    runtime["n_batch"] = best["n_batch"]
+    runtime["n_ubatch"] = min(int(runtime.get("n_ubatch", best["n_batch"])), best["n_batch"])
+    config.set("model", "runtime", value=runtime)
+    config.save()
+    print("[TUNING] Настройки записаны в model.runtime")
+
+
+if __name__ == "__main__":
+    main()
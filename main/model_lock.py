@@ -0,0 +1,76 @@
+import threading
+
+
+class PreemptibleLock:
+    """Блокировка модели с приоритетом запросов пользователя.
+
+    Запрос пользователя берёт блокировку как обычно (acquire / with) и при этом
+    поднимает флаг вытеснения. Фоновые задачи (прогрев, сжатие истории) берут её
+    только через acquire_background(), если никто не ждёт, и регулярно проверяют
+    should_yield(), чтобы прерваться и отдать модель.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = threading.Lock()
+        self._waiting = 0
+        self._preempt = threading.Event()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        with self._state:
+            self._waiting += 1
+            self._preempt.set()
+        try:
+            return self._lock.acquire(blocking, timeout)
+        finally:
+            with self._state:
+                self._waiting -= 1
+                if self._waiting == 0:
+                    self._preempt.clear()
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def acquire_background(self) -> bool:
+        """Неблокирующий захват для фоновой работы: False, если модель занята или её ждут."""
+        with self._state:
+            if self._waiting:
+                return False
+            return self._lock.acquire(blocking=False)
+
+    def should_yield(self) -> bool:
+        """True, если запрос пользователя ждёт модель и фоновую работу пора прервать."""
+        return self._preempt.is_set()
+
+
+def preemption_logits_processor(lock: PreemptibleLock, eos_token: int):
+    """Процессор логитов для llama.cpp: при вытеснении принудительно завершает генерацию EOS-токеном."""
+    def processor(input_ids, scores):
+        if lock.should_yield():
+            scores[:] = -float("inf")
+            scores[eos_token] = 0.0
+        return scores
+    return processor
+
+
+class SerializedModel:
+    """Обёртка над Llama для вызовов из нескольких потоков (параллельные подкоманды
+    мультизадачи): генерации выполняются по одной, остальные атрибуты — напрямую."""
+
+    def __init__(self, llm):
+        self.model = llm
+        self._lock = threading.Lock()
+
+    def create_chat_completion(self, *args, **kwargs):
+        with self._lock:
+            return self.model.create_chat_completion(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
@@ -0,0 +1,577 @@
+"""Долгоживущий процесс с моделями llama.cpp и Vosk.
+
+Агент подключается к нему по локальному сокету (multiprocessing.connection)
+и вызывает модели через небольшой RPC: запрос — кортеж (метод, аргументы),
+ответ — ("ok", значение) или ("error", текст). Модели загружаются один раз:
+перезапуск агента после сбоя или при правке кода занимает миллисекунды, а
+не время загрузки GGUF и модели Vosk.
+
+Запуск вручную (агент при model_server.autostart запускает его сам):
+    python -m main.model_server [--fake] [--port 47811]
+
+--fake — заглушки вместо моделей (эхо-ответ, пустое распознавание) для
+проверки протокола и агента без GGUF и без Vosk; --fake-delay задаёт паузу
+на слово эхо-ответа, чтобы проверять вытеснение генерации.
+"""
+import argparse
+import itertools
+import json
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from main.config_manager import get_config, get_data_dir
+
+_KEY_FILE = "model_server.key"
+# Как часто клиент проверяет вытеснение, пока ждёт ответа генерации
+_PREEMPT_POLL_SEC = 0.02
+
+
+def _authkey() -> bytes:
+    """Общий ключ агента и сервера; создаётся при первом обращении в папке data."""
+    path = get_data_dir() / _KEY_FILE
+    try:
+        return bytes.fromhex(path.read_text(encoding="utf-8").strip())
+    except (OSError, ValueError):
+        key = secrets.token_bytes(32)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(key.hex(), encoding="utf-8")
+        return key
+
+
+def _address(server_cfg: dict) -> tuple[str, int]:
+    return server_cfg.get("host", "127.0.0.1"), int(server_cfg.get("port", 47811))
+
+
+# --- Заглушки моделей (--fake) -------------------------------------------------
+
+class FakeLlama:
+    """Заменитель Llama: токен — слово, ответ — эхо последней реплики пользователя.
+
+    Ответ «генерируется» по слову с паузой token_delay; установленный cancel
+    обрывает его на следующем слове, как EOS при вытеснении настоящей модели.
+    """
+
+    def __init__(self, n_ctx: int = 4096, token_delay: float = 0.0):
+        self._n_ctx = n_ctx
+        self.token_delay = token_delay
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list[int]:
+        words = text.decode("utf-8", errors="ignore").split()
+        return ([1] if add_bos else []) + [3 + len(w) for w in words]
+
+    def detokenize(self, tokens: list[int]) -> bytes:
+        return " ".join("x" * max(0, t - 3) for t in tokens if t > 2).encode("utf-8")
+
+    def token_eos(self) -> int:
+        return 2
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def create_chat_completion(self, messages: list[dict], cancel: Optional[threading.Event] = None,
+                               **kwargs) -> dict:
+        last = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        words = []
+        for word in f"Эхо: {last}".split():
+            if cancel is not None and cancel.is_set():
+                break
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            words.append(word)
+        return {"choices": [{"message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}]}
+
+
+class FakeRecognizer:
+    """Заменитель KaldiRecognizer: каждые 4 блока аудио — пустая законченная фраза."""
+
+    def __init__(self, *args):
+        self._chunks = 0
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        self._chunks += 1
+        return self._chunks % 4 == 0
+
+    def Result(self) -> str:
+        return json.dumps({"text": ""})
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self) -> str:
+        return self.Result()
+
+    def Reset(self) -> None:
+        self._chunks = 0
+
+
+# --- Сервер -------------------------------------------------------------------
+
+class ModelHost:
+    """Модели и распознаватели, которые обслуживает сервер.
+
+    Генерации выполняются по одной (llama.cpp не потокобезопасен). Вызов
+    chat с preemptible=True можно прервать методом cancel из другого
+    соединения: генерация завершается EOS-токеном, как при вытеснении в агенте.
+    """
+
+    def __init__(self, fake: bool = False, fake_token_delay: float = 0.0):
+        self.fake = fake
+        self.fake_token_delay = fake_token_delay
+        self.ready = threading.Event()
+        self.error = ""
+        self.llm = None
+        self.vosk_model = None
+        self._llm_lock = threading.Lock()
+        self._grammars: dict[str, Any] = {}
+        self._recognizers: dict[int, Any] = {}
+        self._recognizer_ids = itertools.count(1)
+        # Отмена по id запроса; id включает случайный токен клиента (ModelServerClient)
+        self._cancel: dict[str, threading.Event] = {}
+        self._state = threading.Lock()
+        self.started = time.time()
+
+    def load(self, cfg: dict) -> None:
+        try:
+            if self.fake:
+                self.llm = FakeLlama(token_delay=self.fake_token_delay)
+            else:
+                from llama_cpp import Llama
+                from main.llm_tuning import build_llama_kwargs
+                vosk_cfg = cfg.get("vosk", {})
+                # Модели независимы — грузим параллельно, как в startup() агента
+                vosk_thread = threading.Thread(target=self._load_vosk,
+                                               args=(vosk_cfg.get("model_path", "vosk-model-small-ru-0.22"),))
+                vosk_thread.start()
+                print("[MODEL_SERVER] Загрузка модели...")
+                self.llm = Llama(**build_llama_kwargs(cfg["model"]))
+                vosk_thread.join()
+            print(f"[MODEL_SERVER] Модели загружены{' (заглушки)' if self.fake else ''}")
+        except Exception as e:
+            self.error = str(e)
+            print(f"[MODEL_SERVER] Ошибка загрузки моделей: {e}")
+        finally:
+            self.ready.set()
+
+    def _load_vosk(self, model_path: str) -> None:
+        try:
+            import vosk
+            self.vosk_model = vosk.Model(model_path)
+        except Exception as e:
+            print(f"[MODEL_SERVER] Ошибка загрузки модели Vosk из '{model_path}': {e}")
+
+    def _require_llm(self):
+        self.ready.wait()
+        if self.llm is None:
+            raise RuntimeError(f"модель не загружена: {self.error}")
+        return self.llm
+
+    # Методы RPC ------------------------------------------------------------
+
+    def ping(self) -> dict:
+        return {"pid": os.getpid(), "ready": self.ready.is_set(), "error": self.error,
+                "fake": self.fake, "uptime": time.time() - self.started}
+
+    def chat(self, kwargs: dict, request_id: str = "", preemptible: bool = False) -> dict:
+        llm = self._require_llm()
+        grammar = kwargs.pop("grammar", None)
+        if isinstance(grammar, str) and not self.fake:
+            kwargs["grammar"] = self._grammar(grammar)
+        cancel = threading.Event()
+        if preemptible and self.fake:
+            kwargs["cancel"] = cancel
+        elif preemptible:
+            from llama_cpp import LogitsProcessorList
+            eos = llm.token_eos()
+
+            def processor(input_ids, scores):
+                if cancel.is_set():
+                    scores[:] = -float("inf")
+                    scores[eos] = 0.0
+                return scores
+            kwargs["logits_processor"] = LogitsProcessorList([processor])
+        if preemptible:
+            with self._state:
+                self._cancel[request_id] = cancel
+        try:
+            with self._llm_lock:
+                return llm.create_chat_completion(**kwargs)
+        finally:
+            if preemptible:
+                with self._state:
+                    if self._cancel.get(request_id) is cancel:
+                        del self._cancel[request_id]
+
+    def cancel(self, request_id: str) -> bool:
+        with self._state:
+            event = self._cancel.get(request_id)
+        if event is not None:
+            event.set()
+        return event is not None
+
+    def _grammar(self, gbnf: str):
+        if gbnf not in self._grammars:
+            from llama_cpp import LlamaGrammar
+            self._grammars[gbnf] = LlamaGrammar.from_string(gbnf, verbose=False)
+        return self._grammars[gbnf]
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list[int]:
+        return self._require_llm().tokenize(text, add_bos=add_bos, special=special)
+
+    def detokenize(self, tokens: list[int]) -> bytes:
+        return self._require_llm().detokenize(tokens)
+
+    def token_eos(self) -> int:
+        return self._require_llm().token_eos()
+
+    def n_ctx(self) -> int:
+        return self._require_llm().n_ctx()
+
+    def recognizer_new(self, samplerate: int) -> int:
+        self.ready.wait()
+        if self.fake:
+            recognizer = FakeRecognizer()
+        elif self.vosk_model is None:
+            raise RuntimeError("модель Vosk не загружена")
+        else:
+            import vosk
+            recognizer = vosk.KaldiRecognizer(self.vosk_model, samplerate)
+        with self._state:
+            rid = next(self._recognizer_ids)
+            self._recognizers[rid] = recognizer
+        return rid
+
+    def recognizer_call(self, rid: int, method: str, *args):
+        if method not in ("AcceptWaveform", "Result", "PartialResult", "FinalResult", "Reset"):
+            raise ValueError(f"неизвестный метод распознавателя: {method}")
+        return getattr(self._recognizers[rid], method)(*args)
+
+    def recognizer_close(self, rid: int) -> None:
+        with self._state:
+            self._recognizers.pop(rid, None)
+
+
+_RPC_METHODS = ("ping", "chat", "cancel", "tokenize", "detokenize", "token_eos", "n_ctx",
+                "recognizer_new", "recognizer_call", "recognizer_close")
+
+
+class ModelServer:
+    """Принимает соединения агента; каждое обслуживается в своём потоке."""
+
+    def __init__(self, host: ModelHost, address: tuple[str, int], authkey: bytes,
+                 idle_shutdown_sec: float = 0):
+        self.host = host
+        self._authkey = authkey
+        self._listener = Listener(address, authkey=authkey)
+        # Фактический адрес: при порте 0 его выбирает система
+        self.address = self._listener.address
+        self._idle_shutdown_sec = idle_shutdown_sec
+        self._clients = 0
+        self._last_client = time.monotonic()
+        self._lock = threading.Lock()
+        self._quit = threading.Event()
+
+    def _serve(self, conn: Connection) -> None:
+        with self._lock:
+            self._clients += 1
+        try:
+            while not self._quit.is_set():
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if method == "shutdown":
+                    conn.send(("ok", None))
+                    self.shutdown()
+                    break
+                try:
+                    if method not in _RPC_METHODS:
+                        raise ValueError(f"неизвестный метод: {method}")
+                    reply = ("ok", getattr(self.host, method)(*args))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    break
+        finally:
+            conn.close()
+            with self._lock:
+                self._clients -= 1
+                self._last_client = time.monotonic()
+
+    def _watch_idle(self) -> None:
+        while not self._quit.wait(30):
+            with self._lock:
+                idle = self._clients == 0 and time.monotonic() - self._last_client > self._idle_shutdown_sec
+            if idle:
+                print("[MODEL_SERVER] Нет подключений, сервер завершается")
+                self.shutdown()
+
+    def serve_forever(self) -> None:
+        print(f"[MODEL_SERVER] Ожидание подключений на {self._listener.address}")
+        if self._idle_shutdown_sec > 0:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                # Неверный ключ или оборванное рукопожатие — не повод останавливать сервер
+                print(f"[MODEL_SERVER] Отклонено подключение: {e}")
+                continue
+            if self._quit.is_set():
+                conn.close()
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        self._listener.close()
+
+    def shutdown(self) -> None:
+        if self._quit.is_set():
+            return
+        self._quit.set()
+        # accept() не прерывается закрытием сокета из другого потока — будим его подключением
+        try:
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+
+
+# --- Клиент -------------------------------------------------------------------
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelServerClient:
+    """Соединение агента с сервером моделей. Вызовы из разных потоков идут по очереди.
+
+    Соединение занято на всё время вызова, в том числе генерации: тому, кто не
+    должен её ждать (распознаватель речи), нужно своё соединение — channel().
+    """
+
+    def __init__(self, address: tuple[str, int], authkey: bytes):
+        self._address = address
+        self._authkey = authkey
+        self._conn = Client(address, authkey=authkey)
+        self._lock = threading.Lock()
+        self._control: Optional[Connection] = None
+        self._control_lock = threading.Lock()
+        # id запросов уникальны между клиентами: отмена не заденет чужую генерацию
+        self._token = secrets.token_hex(8)
+        self._request_ids = itertools.count(1)
+
+    def channel(self) -> "ModelServerClient":
+        """Отдельное соединение с тем же сервером."""
+        return ModelServerClient(self._address, self._authkey)
+
+    def call(self, method: str, *args):
+        with self._lock:
+            self._conn.send((method, args))
+            status, value = self._conn.recv()
+        if status != "ok":
+            raise ModelServerError(value)
+        return value
+
+    def call_preemptible(self, method: str, should_yield: Callable[[], bool], *args, request_id: str):
+        """Вызов, который отменяется на сервере, когда should_yield() становится True."""
+        with self._lock:
+            self._conn.send((method, args))
+            cancelled = False
+            while not self._conn.poll(_PREEMPT_POLL_SEC):
+                if not cancelled and should_yield():
+                    self._send_control("cancel", request_id)
+                    cancelled = True
+            status, value = self._conn.recv()
+        if status != "ok":
+            raise ModelServerError(value)
+        return value
+
+    def _send_control(self, method: str, *args) -> None:
+        # Отмена идёт по второму соединению: основное занято ожиданием ответа
+        with self._control_lock:
+            if self._control is None:
+                self._control = Client(self._address, authkey=self._authkey)
+            self._control.send((method, args))
+            self._control.recv()
+
+    def next_request_id(self) -> str:
+        return f"{self._token}-{next(self._request_ids)}"
+
+    def close(self) -> None:
+        for conn in (self._conn, self._control):
+            if conn is not None:
+                try:
+                    conn.close()
+                except OSError:
+                    pass
+
+
+class PreemptionFlag:
+    """Заменитель процессора вытеснения для удалённой модели: генерация на сервере
+    отменяется, когда should_yield() (PreemptibleLock агента) возвращает True."""
+
+    def __init__(self, should_yield: Callable[[], bool]):
+        self.should_yield = should_yield
+
+
+class RemoteLlama:
+    """Llama на сервере моделей с тем же интерфейсом, что использует агент."""
+
+    def __init__(self, client: ModelServerClient):
+        self._client = client
+        self._eos: Optional[int] = None
+        self._warned_processor = False
+
+    def create_chat_completion(self, **kwargs) -> dict:
+        processor = kwargs.pop("logits_processor", None)
+        grammar = kwargs.get("grammar")
+        if grammar is not None and not isinstance(grammar, str):
+            raise TypeError("для сервера моделей грамматика передаётся строкой GBNF")
+        if isinstance(processor, PreemptionFlag):
+            request_id = self._client.next_request_id()
+            return self._client.call_preemptible("chat", processor.should_yield, kwargs, request_id, True,
+                                                 request_id=request_id)
+        if processor is not None and not self._warned_processor:
+            # Произвольные процессоры логитов не переносятся в другой процесс
+            print("[MODEL_SERVER] logits_processor не поддерживается удалённой моделью и пропущен")
+            self._warned_processor = True
+        return self._client.call("chat", kwargs)
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list[int]:
+        return self._client.call("tokenize", text, add_bos, special)
+
+    def detokenize(self, tokens: list[int]) -> bytes:
+        return self._client.call("detokenize", tokens)
+
+    def token_eos(self) -> int:
+        if self._eos is None:
+            self._eos = self._client.call("token_eos")
+        return self._eos
+
+    def n_ctx(self) -> int:
+        return self._client.call("n_ctx")
+
+
+class RemoteRecognizer:
+    """KaldiRecognizer на сервере моделей (AcceptWaveform / Result / PartialResult).
+
+    Работает по своему соединению: генерация модели (фоновое сжатие истории)
+    занимает общее соединение надолго, а распознавание не должно её ждать.
+    """
+
+    def __init__(self, client: ModelServerClient, samplerate: int):
+        self._client = client.channel()
+        self._id = self._client.call("recognizer_new", samplerate)
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        return self._client.call("recognizer_call", self._id, "AcceptWaveform", bytes(data))
+
+    def Result(self) -> str:
+        return self._client.call("recognizer_call", self._id, "Result")
+
+    def PartialResult(self) -> str:
+        return self._client.call("recognizer_call", self._id, "PartialResult")
+
+    def FinalResult(self) -> str:
+        return self._client.call("recognizer_call", self._id, "FinalResult")
+
+    def Reset(self) -> None:
+        self._client.call("recognizer_call", self._id, "Reset")
+
+    def close(self) -> None:
+        try:
+            self._client.call("recognizer_close", self._id)
+        except (ModelServerError, EOFError, OSError):
+            pass
+        self._client.close()
+
+
+def _spawn_server() -> None:
+    if getattr(sys, "frozen", False):
+        # В сборке сервер — тот же Vera.exe с ключом (обрабатывается в run_vera.py)
+        cmd = [sys.executable, "--model-server"]
+    else:
+        cmd = [sys.executable, "-m", "main.model_server"]
+    kwargs: dict[str, Any] = {"cwd": str(Path(__file__).resolve().parent.parent)}
+    if os.name == "nt":
+        # Отдельная консоль: сервер переживает закрытие и перезапуск агента
+        kwargs["creationflags"] = subprocess.CREATE_NEW_CONSOLE | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    subprocess.Popen(cmd, **kwargs)
+
+
+def connect(server_cfg: dict, timeout: float = 600.0) -> ModelServerClient:
+    """Подключается к серверу моделей, при необходимости запускает его и ждёт загрузки моделей."""
+    address = _address(server_cfg)
+    authkey = _authkey()
+    deadline = time.monotonic() + timeout
+    spawned = False
+    client = None
+    while client is None:
+        try:
+            client = ModelServerClient(address, authkey)
+        except (ConnectionRefusedError, OSError):
+            if not server_cfg.get("autostart", True):
+                raise ModelServerError(f"сервер моделей не отвечает на {address[0]}:{address[1]}")
+            if not spawned:
+                print("[MODEL_SERVER] Сервер не запущен, запускаю...")
+                _spawn_server()
+                spawned = True
+            if time.monotonic() > deadline:
+                raise ModelServerError("сервер моделей не запустился")
+            time.sleep(0.2)
+    reported = False
+    while True:
+        info = client.call("ping")
+        if info["ready"]:
+            break
+        if not reported:
+            print("[MODEL_SERVER] Сервер загружает модели...")
+            reported = True
+        if time.monotonic() > deadline:
+            raise ModelServerError("сервер моделей не загрузил модели вовремя")
+        time.sleep(0.5)
+    if info["error"]:
+        raise ModelServerError(info["error"])
+    print(f"[MODEL_SERVER] Подключено к процессу {info['pid']} (работает {info['uptime']:.0f} с)")
+    return client
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Сервер моделей llama.cpp и Vosk для агента")
+    parser.add_argument("--fake", action="store_true", help="заглушки вместо моделей")
+    parser.add_argument("--fake-delay", type=float, default=0.0, help="пауза на слово ответа заглушки, с")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    cfg = get_config().get_all()
+    server_cfg = dict(cfg.get("model_server", {}))
+    if args.host:
+        server_cfg["host"] = args.host
+    if args.port:
+        server_cfg["port"] = args.port
+    host = ModelHost(fake=args.fake, fake_token_delay=args.fake_delay)
+    # Слушаем сразу: агент подключается и ждёт, пока модели грузятся в фоне
+    server = ModelServer(host, _address(server_cfg), _authkey(),
+                         idle_shutdown_sec=float(server_cfg.get("idle_shutdown_min", 0)) * 60)
+    threading.Thread(target=host.load, args=(cfg,), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("[MODEL_SERVER] Остановлен")
+
+
+if __name__ == "__main__":
+    main()
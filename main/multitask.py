@@ -1,67 +1,79 @@
 import re
-from typing import List, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from main.lang_ru import NUM_WORDS
+from main.tracing import bind, span
+
+
+# Таблицы разбора собираются один раз при импорте: parse_multitask вызывается
+# повторно для каждой подкоманды через route_command
+
+# Число цифрами или словами (до двух слов: «двадцать пять»)
+_NUM_WORDS_RE = "|".join(re.escape(w) for w in NUM_WORDS.keys())
+_NUMBER_RE = rf"(?:\d+|(?:{_NUM_WORDS_RE})(?:\s+(?:{_NUM_WORDS_RE}))?)"
+_OPERATOR_RE = r"(?:плюс|минус|умножить(?:\s+на)?|разделить(?:\s+на)?|делить(?:\s+на)?|на)"
+# Полный паттерн: число оператор число
+_MATH_PATTERN = re.compile(rf"{_NUMBER_RE}\s+{_OPERATOR_RE}\s+{_NUMBER_RE}")
+
+_ACTIVATION_PREFIX = re.compile(r"^\s*Вера[,\s]+", re.IGNORECASE)
+
+_SEPARATORS = (r"\s+и\s+", r"\s+а\s+также\s+")
+_TAIL_SEPARATORS = (r"\s+ещё\s+", r"\s+потом\s+")
+# «плюс» разделяет команды, только если фраза не арифметика
+_SPLIT = re.compile("|".join((*_SEPARATORS, *_TAIL_SEPARATORS)))
+_SPLIT_WITH_PLUS = re.compile("|".join((*_SEPARATORS, r"\s+плюс\s+", *_TAIL_SEPARATORS)))
+_SEPARATOR_WORDS = frozenset(("и", "а также", "плюс", "ещё", "потом"))
+
+_SHARED_ACTION = re.compile(r"(открой|запусти|закрой|выключи)\s+(.+)")
+_AND_SPLIT = re.compile(r"\s+и\s+")
+
+_ACTION_VERB = re.compile(
+    r"\b(открой|запусти|закрой|выключи|включи|установи|поставь|"
+    r"создай|удали|найди|покажи|скажи|расскажи|проверь|измерь|"
+    r"сделай|сверни|разверни|переключись|перезагрузи|громкость|"
+    r"яркость|таймер|напомни)\b"
+)
+_INHERITED_ACTIONS = frozenset(("открой", "запусти", "закрой", "выключи"))
 
 
 def _is_math_expression(text: str) -> bool:
     """Проверяет, является ли текст математическим выражением."""
-    # Паттерн для чисел (цифры или словесные числительные)
-    num_words_pattern = "|".join(re.escape(w) for w in NUM_WORDS.keys())
-    number_pattern = rf"(?:\d+|(?:{num_words_pattern})(?:\s+(?:{num_words_pattern}))?)"
-    
-    # Математические операторы
-    operators = r"(?:плюс|минус|умножить(?:\s+на)?|разделить(?:\s+на)?|делить(?:\s+на)?|на)"
-    
-    # Полный паттерн: число оператор число
-    math_pattern = rf"{number_pattern}\s+{operators}\s+{number_pattern}"
-    
-    return bool(re.search(math_pattern, text.lower()))
+    return _MATH_PATTERN.search(text.lower()) is not None
 
 
 def parse_multitask(text: str) -> List[str]:
-    text = re.sub(r"^\s*Вера[,\s]+", "", text.lower().strip(), flags=re.IGNORECASE)
+    return list(_parse_multitask(text))
+
+
+@lru_cache(maxsize=256)
+def _parse_multitask(text: str) -> Tuple[str, ...]:
+    text = _ACTIVATION_PREFIX.sub("", text.lower().strip())
     
     # Если это математическое выражение, не разбиваем по "плюс"
-    is_math = _is_math_expression(text)
-    
-    separators = [
-        r"\s+и\s+",           
-        r"\s+а\s+также\s+",   
-    ]
-    
-    # Добавляем "плюс" как разделитель только если это НЕ математика
-    if not is_math:
-        separators.append(r"\s+плюс\s+")
-    
-    separators.extend([
-        r"\s+ещё\s+",         
-        r"\s+потом\s+",       
-    ])
-    
-    separator_pattern = "|".join(f"({p})" for p in separators)
-    
-    parts = re.split(separator_pattern, text)
+    splitter = _SPLIT if _is_math_expression(text) else _SPLIT_WITH_PLUS
     
     commands = []
-    for part in parts:
-        if part and not part.strip() in ["и", "а также", "плюс", "ещё", "потом"]:
-            part = part.strip()
-            if part:
-                commands.append(part)
+    for part in splitter.split(text):
+        part = part.strip()
+        if part and part not in _SEPARATOR_WORDS:
+            commands.append(part)
     
     if len(commands) > 1:
-        return _expand_implicit_commands(commands)
+        return tuple(_expand_implicit_commands(commands))
     
-    if m := re.match(r"(открой|запусти|закрой|выключи)\s+(.+)", text):
+    if m := _SHARED_ACTION.match(text):
         action = m.group(1)
         targets_str = m.group(2)
         
         if " и " in targets_str:
-            targets = [t.strip() for t in re.split(r"\s+и\s+", targets_str) if t.strip()]
+            targets = [t.strip() for t in _AND_SPLIT.split(targets_str) if t.strip()]
             if len(targets) > 1:
-                return [f"{action} {target}" for target in targets]
+                return tuple(f"{action} {target}" for target in targets)
     
-    return [text]
+    return (text,)
 
 
 def _expand_implicit_commands(commands: List[str]) -> List[str]:
@@ -72,52 +84,110 @@ def _expand_implicit_commands(commands: List[str]) -> List[str]:
         cmd = cmd.strip()
         
         # Проверяем есть ли в команде глагол действия
-        has_action = re.search(
-            r"\b(открой|запусти|закрой|выключи|включи|установи|поставь|"
-            r"создай|удали|найди|покажи|скажи|расскажи|проверь|измерь|"
-            r"сделай|сверни|разверни|переключись|перезагрузи|громкость|"
-            r"яркость|таймер|напомни)\b",
-            cmd
-        )
+        has_action = _ACTION_VERB.search(cmd)
         
         if has_action:
             # Запоминаем действие
-            action_match = has_action.group(1)
-            last_action = action_match
+            last_action = has_action.group(1)
             expanded.append(cmd)
-        else:
+        elif last_action in _INHERITED_ACTIONS:
             # Если нет действия - добавляем последнее использованное
-            if last_action and last_action in ["открой", "запусти", "закрой", "выключи"]:
-                expanded.append(f"{last_action} {cmd}")
-            else:
-                # Если не можем определить - оставляем как есть
-                expanded.append(cmd)
+            expanded.append(f"{last_action} {cmd}")
+        else:
+            # Если не можем определить - оставляем как есть
+            expanded.append(cmd)
     
     return expanded
 
 
-def execute_multitask(text: str, route_command_func) -> Tuple[bool, str]:
+# Подкоманды-справки без побочных эффектов: погода, валюты, википедия, веб-поиск
+_LOOKUP_RE = re.compile(
+    r"\b(?:погод|температур|градус|осадк|курс|валют|доллар|евро|юан|рубл|биткоин|"
+    r"википеди|кто\s+так|что\s+такое|найди|поищи|узнай|новост)"
+)
+# Действия выполняются строго по порядку, даже если похожи на справку («найди файл»)
+_ACTION_RE = re.compile(
+    r"\b(?:открой|запусти|закрой|выключи|включи|установи|поставь|создай|удали|"
+    r"сделай|сверни|разверни|переключись|перезагрузи|напомни|таймер|громкость|яркость|"
+    r"файл|папк|отправь|напиши)"
+)
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def classify_subcommand(cmd: str) -> str:
+    """"lookup" — независимая справка, которую можно выполнять параллельно, иначе "action"."""
+    if _LOOKUP_RE.search(cmd) and not _ACTION_RE.search(cmd):
+        return "lookup"
+    return "action"
+
+
+def _get_pool(max_workers: int) -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="multitask")
+        return _pool
+
+
+def _timed(route_command_func, cmd: str) -> Tuple[Optional[str], float]:
+    t0 = time.perf_counter()
+    with span("multitask.command", command=cmd):
+        result = route_command_func(cmd)
+    return result, time.perf_counter() - t0
+
+
+def execute_multitask(text: str, route_command_func, parallel: bool = True,
+                      timeout: float = 15.0, max_workers: int = 4) -> Tuple[bool, str]:
     commands = parse_multitask(text)
     
     # Если одна команда - возвращаем None (не мультизадача)
     if len(commands) <= 1:
         return False, ""
     
+    kinds = [classify_subcommand(cmd) if parallel else "action" for cmd in commands]
     print(f"[MULTITASK] Обнаружено команд: {len(commands)}")
-    for i, cmd in enumerate(commands, 1):
-        print(f"  {i}. {cmd}")
+    for i, (cmd, kind) in enumerate(zip(commands, kinds), 1):
+        print(f"  {i}. {cmd}" + (" (параллельно)" if kind == "lookup" else ""))
     
-    # Выполняем каждую команду
-    responses = [] 
-    for cmd in commands:
-        result = route_command_func(cmd)
-        if result:
-            responses.append(result)
+    t_start = time.perf_counter()
+    results: list[Optional[str]] = [None] * len(commands)
+    durations = [0.0] * len(commands)
+
+    # Справки запускаются в пуле сразу, действия тем временем выполняются по порядку
+    futures = {}
+    if kinds.count("lookup") > 1 or (kinds.count("lookup") == 1 and "action" in kinds):
+        pool = _get_pool(max_workers)
+        futures = {i: (pool.submit(bind(_timed), route_command_func, cmd), time.perf_counter())
+                   for i, (cmd, kind) in enumerate(zip(commands, kinds)) if kind == "lookup"}
+    for i, cmd in enumerate(commands):
+        if i not in futures:
+            try:
+                results[i], durations[i] = _timed(route_command_func, cmd)
+            except Exception as e:
+                print(f"[MULTITASK] Ошибка «{cmd}»: {e}")
+    for i, (future, submitted) in futures.items():
+        try:
+            results[i], durations[i] = future.result(timeout=max(0.0, submitted + timeout - time.perf_counter()))
+        except FutureTimeout:
+            durations[i] = time.perf_counter() - submitted
+            print(f"[MULTITASK] Таймаут {timeout:g} с: {commands[i]}")
+            results[i] = f"Не дождалась ответа: {commands[i]}."
+        except Exception as e:
+            print(f"[MULTITASK] Ошибка «{commands[i]}»: {e}")
+
+    total = time.perf_counter() - t_start
+    print(f"[MULTITASK] Время: {total:.2f} с (последовательно было бы ~{sum(durations):.2f} с); "
+          + ", ".join(f"{i + 1}: {d:.2f} с" for i, d in enumerate(durations)))
+
+    responses = [r for r in results if r]
     
     # Формируем общий ответ
     if responses:
-        # Если ответов много - объединяем кратко
-        if len(responses) > 2:
+        # Много ответов одних действий объединяем кратко; если есть ответы справок,
+        # озвучиваем всё в порядке команд
+        if len(responses) > 2 and "lookup" not in kinds:
             return True, f"Выполнено команд: {len(responses)}."
         else:
             return True, " ".join(responses)
@@ -0,0 +1,213 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from user.json_storage import load_json, save_json
+
+try:
+    import pymorphy3 as _pymorphy
+except ImportError:
+    try:
+        import pymorphy2 as _pymorphy
+    except ImportError:
+        _pymorphy = None
+
+_WORD_RE = re.compile(r"[a-zа-я0-9]+")
+
+# Слова, не меняющие смысла вопроса
+_STOP_WORDS = frozenset((
+    "а", "и", "ну", "вот", "же", "ли", "бы", "пожалуйста", "вера", "скажи", "подскажи",
+    "расскажи", "мне", "нам", "ка", "давай", "слушай", "можешь", "можно", "знаешь",
+))
+
+# Вопрос с такими словами опирается на предыдущий разговор — кэшировать нельзя
+_CONTEXT_WORDS = frozenset((
+    "он", "она", "оно", "они", "его", "ее", "ему", "ей", "их", "им", "нему", "ней", "них",
+    "это", "этот", "эта", "этого", "этом", "том", "тот", "та", "там", "тогда", "тоже",
+    "еще", "дальше", "подробнее", "предыдущий", "выше",
+))
+
+# Просьбы придумать что-то новое: одинаковый ответ весь срок жизни кэша здесь не нужен
+_CREATIVE_STEMS = (
+    "анекдот", "шут", "пошут", "прикол", "факт", "стих", "сказк", "загадк", "истори",
+    "придума", "сочин", "напиш", "случайн", "интересн", "любой", "любую", "другой", "другую",
+    "посовет", "пожелани", "тост", "комплимент", "рассмеш", "угадай",
+)
+
+# Окончания для упрощённой нормализации, если pymorphy не установлен (длинные первыми)
+_ENDINGS = tuple(sorted((
+    "иями", "ями", "ами", "ией", "ием", "иях", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ую", "юю", "ов", "ев", "ей",
+    "ам", "ям", "ах", "ях", "ом", "ем", "ию", "ия", "ии", "ть", "ться", "ется", "ится",
+    "ешь", "ишь", "ет", "ит", "ут", "ют", "ат", "ят", "ал", "ил", "ла", "ли", "ло",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь",
+), key=len, reverse=True))
+
+_morph = None
+_morph_lock = threading.Lock()
+
+
+def _lemma(word: str) -> str:
+    global _morph
+    if _pymorphy is not None:
+        with _morph_lock:
+            if _morph is None:
+                _morph = _pymorphy.MorphAnalyzer()
+        return _morph.parse(word)[0].normal_form.replace("ё", "е")
+    for ending in _ENDINGS:
+        if len(word) - len(ending) >= 3 and word.endswith(ending):
+            return word[:-len(ending)]
+    return word
+
+
+def normalize_question(text: str) -> str:
+    """Ключ кэша: леммы значимых слов в исходном порядке."""
+    words = _WORD_RE.findall((text or "").lower().replace("ё", "е"))
+    return " ".join(_lemma(w) for w in words if w not in _STOP_WORDS)
+
+
+def is_context_dependent(text: str) -> bool:
+    """True, если вопрос ссылается на предыдущий разговор («а он где родился?»)."""
+    return any(w in _CONTEXT_WORDS for w in _WORD_RE.findall((text or "").lower().replace("ё", "е")))
+
+
+def is_open_ended(text: str) -> bool:
+    """True для творческих просьб («расскажи анекдот», «придумай стих»), на которые ждут новый ответ."""
+    words = _WORD_RE.findall((text or "").lower().replace("ё", "е"))
+    return any(w.startswith(_CREATIVE_STEMS) for w in words)
+
+
+def _unit(vector) -> Optional[list[float]]:
+    # llm.embed без пулинга возвращает вектор на каждый токен — усредняем
+    if vector and isinstance(vector[0], (list, tuple)):
+        vector = [sum(col) / len(vector) for col in zip(*vector)]
+    norm = math.sqrt(sum(v * v for v in vector)) if vector else 0.0
+    if not norm:
+        return None
+    return [v / norm for v in vector]
+
+
+class ResponseCache:
+    """Кэш ответов модели на повторяющиеся вопросы.
+
+    Ключ — нормализованный (лемматизированный) текст вопроса внутри области
+    scope: ответ зависит от системного промпта, поэтому вопросы с разными
+    профилями маршрутизации и сведениями о пользователе не смешиваются. Если задана
+    функция embed, промах по ключу добирается поиском ближайшего соседа по
+    косинусной близости эмбеддингов. Записи живут ttl_seconds и вытесняются
+    по LRU сверх max_entries; кэш хранится в JSON.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 24 * 3600, max_entries: int = 256,
+                 embed: Optional[Callable[[str], list]] = None, similarity: float = 0.92):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._embed = embed
+        # ключ -> {"question", "answer", "created", "embedding"}; порядок — от давно использованных
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self) -> None:
+        data = load_json(self.path, {})
+        now = time.time()
+        for item in data.get("entries", []):
+            key = item.get("key")
+            if key and now - item.get("created", 0) < self.ttl_seconds:
+                self._entries[key] = item
+
+    def _save(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+        save_json(self.path, {"entries": entries}, "RESPONSE_CACHE")
+
+    def _embedding(self, text: str) -> Optional[list[float]]:
+        if self._embed is None:
+            return None
+        try:
+            return _unit(self._embed(text))
+        except Exception as e:
+            print(f"[RESPONSE_CACHE] Ошибка эмбеддинга: {e}")
+            return None
+
+    @staticmethod
+    def make_key(question: str, scope: str = "") -> str:
+        key = normalize_question(question)
+        return f"{scope}|{key}" if key and scope else key
+
+    def _nearest(self, vector: list[float], scope: str) -> Optional[str]:
+        best_key, best_sim = None, self.similarity
+        for key, item in self._entries.items():
+            if item.get("scope", "") != scope:
+                continue
+            other = item.get("embedding")
+            if not other or len(other) != len(vector):
+                continue
+            sim = sum(a * b for a, b in zip(vector, other))
+            if sim >= best_sim:
+                best_key, best_sim = key, sim
+        return best_key
+
+    def get(self, question: str, scope: str = "") -> Optional[str]:
+        """Ответ из кэша или None."""
+        key = self.make_key(question, scope)
+        if not key:
+            return None
+        with self._lock:
+            item = self._entries.get(key)
+        if item is None and self._embed is not None:
+            vector = self._embedding(question)
+            if vector is not None:
+                with self._lock:
+                    near = self._nearest(vector, scope)
+                    item = self._entries.get(near) if near else None
+                    key = near or key
+        with self._lock:
+            if item is not None and time.time() - item["created"] >= self.ttl_seconds:
+                self._entries.pop(key, None)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        print(f"[RESPONSE_CACHE] Ответ из кэша: «{item['question']}»")
+        return item["answer"]
+
+    def put(self, question: str, answer: str, scope: str = "") -> None:
+        key = self.make_key(question, scope)
+        if not key or not answer:
+            return
+        vector = self._embedding(question)
+        item = {
+            "key": key,
+            "scope": scope,
+            "question": question.strip(),
+            "answer": answer,
+            "created": time.time(),
+            "embedding": [round(v, 5) for v in vector] if vector else None,
+        }
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = item
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save()
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+        self._save()
+        return count
+
+    def __len__(self) -> int:
+        return len(self._entries)
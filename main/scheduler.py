@@ -0,0 +1,233 @@
+import datetime
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# Дольше поток планировщика не спит, даже если до срока далеко: ожидание с
+# таймаутом не учитывает сон компьютера (на Windows) и перевод часов
+MAX_WAIT_SEC = 30.0
+
+# Дни недели (0=пн) для правил повторения
+RECURRENCE_DAYS = {
+    "daily": frozenset(range(7)),
+    "weekdays": frozenset(range(5)),
+    "weekends": frozenset((5, 6)),
+}
+
+
+def next_occurrence(hhmm: str, recurring: str, after: datetime.datetime,
+                    target_date: Optional[str] = None) -> Optional[datetime.datetime]:
+    """Ближайший момент срабатывания строго после after по правилу повторения.
+
+    recurring: "once" (в target_date или в ближайшее hh:mm), "daily",
+    "weekdays", "weekends". None — правило больше не сработает.
+    """
+    try:
+        hour, minute = (int(v) for v in hhmm.split(":"))
+    except ValueError:
+        return None
+    if recurring == "once" and target_date:
+        try:
+            day = datetime.datetime.strptime(target_date, "%Y-%m-%d")
+        except ValueError:
+            return None
+        return day.replace(hour=hour, minute=minute)
+    days = RECURRENCE_DAYS.get(recurring, RECURRENCE_DAYS["daily"])
+    base = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    for offset in range(8):
+        candidate = base + datetime.timedelta(days=offset)
+        if candidate > after and candidate.weekday() in days:
+            return candidate
+    return None
+
+
+@dataclass(order=True)
+class _Job:
+    deadline: float
+    seq: int
+    callback: Callable = field(compare=False)
+    args: tuple = field(compare=False, default=())
+    cancelled: bool = field(compare=False, default=False)
+
+
+class Scheduler:
+    """Планировщик на min-heap по сроку срабатывания.
+
+    Поток спит на условной переменной до ближайшего срока, но не дольше
+    max_wait, и просыпается раньше, когда задачу добавили или отменили. После
+    каждого пробуждения срок сверяется с clock() заново: после сна компьютера
+    или перевода часов задача сработает не позже чем через max_wait. Часы
+    передаются снаружи (clock), поэтому логику можно проверять с поддельным
+    временем, вызывая run_pending() вручную.
+
+    При workers > 0 задачи выполняются в пуле потоков, и медленная задача
+    (запуск приложения) не задерживает остальные. Если компьютер спал,
+    просроченные задачи срабатывают сразу после пробуждения; решать,
+    выполнять ли их с опозданием, должна сама задача.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time, name: str = "SCHEDULER",
+                 workers: int = 0, executor: Optional[ThreadPoolExecutor] = None,
+                 max_wait: float = MAX_WAIT_SEC):
+        self._clock = clock
+        self._max_wait = max_wait
+        self._name = name
+        if executor is None and workers > 0:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler")
+        self._pool = executor
+        self._heap: list[_Job] = []
+        self._jobs: dict[int, _Job] = {}
+        self._seq = itertools.count(1)
+        self._cond = threading.Condition()
+        self._quit = False
+        self._thread: Optional[threading.Thread] = None
+
+    def now(self) -> float:
+        return self._clock()
+
+    def schedule(self, deadline: float, callback: Callable, *args) -> int:
+        """Ставит вызов callback(*args) на момент deadline (по clock). Возвращает id задачи."""
+        with self._cond:
+            job = _Job(deadline, next(self._seq), callback, args)
+            heapq.heappush(self._heap, job)
+            self._jobs[job.seq] = job
+            # Будим поток, только если новая задача стала ближайшей
+            if self._heap[0] is job:
+                self._cond.notify()
+            return job.seq
+
+    def cancel(self, job_id: int) -> bool:
+        """Отменяет задачу. Из кучи она уходит лениво, когда окажется на вершине."""
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job.cancelled = True
+            self._cond.notify()
+            return True
+
+    def deadline(self, job_id: int) -> Optional[float]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.deadline if job else None
+
+    def _drop_cancelled(self) -> None:
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._cond:
+            self._drop_cancelled()
+            return self._heap[0].deadline if self._heap else None
+
+    def _pop_due(self, now: float) -> list[_Job]:
+        due = []
+        self._drop_cancelled()
+        while self._heap and self._heap[0].deadline <= now:
+            job = heapq.heappop(self._heap)
+            if not job.cancelled:
+                self._jobs.pop(job.seq, None)
+                due.append(job)
+            self._drop_cancelled()
+        return due
+
+    def _call(self, job: _Job) -> None:
+        try:
+            job.callback(*job.args)
+        except Exception as e:
+            print(f"[{self._name}] Ошибка задачи: {e}")
+
+    def _execute(self, job: _Job) -> None:
+        if self._pool is not None:
+            self._pool.submit(self._call, job)
+        else:
+            self._call(job)
+
+    def run_pending(self) -> int:
+        """Выполняет все наступившие задачи (в текущем потоке). Возвращает их число."""
+        with self._cond:
+            due = self._pop_due(self._clock())
+        for job in due:
+            self._call(job)
+        return len(due)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._quit:
+                    self._drop_cancelled()
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0].deadline - self._clock()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, self._max_wait))
+                if self._quit:
+                    break
+                due = self._pop_due(self._clock())
+            for job in due:
+                self._execute(job)
+        print(f"[{self._name}] Планировщик остановлен")
+
+    def start(self, stop_event: Optional[threading.Event] = None) -> None:
+        """Запускает поток планировщика (повторный вызов ничего не делает)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        if stop_event is not None:
+            # Поток спит на условной переменной — будим его при завершении
+            threading.Thread(target=lambda: (stop_event.wait(), self.shutdown()), daemon=True).start()
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._quit = True
+            self._cond.notify()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+
+_service: Optional[Scheduler] = None
+_timer_service: Optional[Scheduler] = None
+_service_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Общий планировщик напоминаний и запуска приложений (по настенным часам)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            from main.config_manager import get_config
+            workers = int(get_config().get("scheduler", "workers", default=2))
+            _service = Scheduler(name="SCHEDULER", workers=max(1, workers))
+        return _service
+
+
+def get_timer_scheduler() -> Scheduler:
+    """Планировщик таймеров по time.monotonic().
+
+    Срок таймера — отрезок времени, а не момент на часах: перевод системных
+    часов или синхронизация NTP его не сдвигают. Задачи выполняются в том
+    же пуле потоков, что и у get_scheduler().
+    """
+    global _timer_service
+    scheduler = get_scheduler()
+    with _service_lock:
+        if _timer_service is None:
+            _timer_service = Scheduler(clock=time.monotonic, name="TIMER", executor=scheduler._pool)
+        return _timer_service
+
+
+def catch_up_seconds() -> float:
+    """Насколько поздно (после сна компьютера или выключения) задача ещё выполняется."""
+    from main.config_manager import get_config
+    return float(get_config().get("scheduler", "catch_up_minutes", default=30)) * 60
@@ -0,0 +1,215 @@
+"""Захват звука и распознавание Vosk в отдельном процессе.
+
+Обратный вызов PortAudio кладёт аудио в кольцевой буфер в общей памяти
+(AudioRing), поток распознавания того же процесса забирает его оттуда и
+отправляет агенту готовый текст через очередь multiprocessing. Декодер
+больше не делит GIL с разбором веб-страниц, TTS и маршрутизацией в процессе
+агента. Буфер создаётся на стороне агента, поэтому писать в него можно и
+снаружи (capture=False) — так бенчмарк подаёт синтетический звук.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterator, Optional
+
+# Заголовок буфера: сколько байт записано и сколько прочитано за всё время
+_HEADER = struct.Struct("<QQ")
+_COUNTER = struct.Struct("<Q")
+
+
+class AudioRing:
+    """Кольцевой буфер аудио в общей памяти: один писатель, один читатель.
+
+    Писатель не ждёт читателя: если тот отстал больше чем на ёмкость буфера,
+    старый звук теряется (счётчик dropped у читателя). Каждая запись
+    отпускает семафор, так что читатель спит, а не опрашивает буфер.
+    """
+
+    def __init__(self, shm: SharedMemory, capacity: int, available, owner: bool):
+        self._shm = shm
+        self.capacity = capacity
+        self._available = available
+        self._owner = owner
+        self.dropped = 0
+
+    @classmethod
+    def create(cls, capacity: int, ctx=None) -> "AudioRing":
+        ctx = ctx or multiprocessing.get_context("spawn")
+        shm = SharedMemory(create=True, size=_HEADER.size + capacity)
+        _HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, capacity, ctx.Semaphore(0), owner=True)
+
+    def __getstate__(self):
+        return self._shm.name, self.capacity, self._available
+
+    def __setstate__(self, state):
+        # Дочерний процесс spawn делит resource_tracker с создателем буфера:
+        # память удаляет только владелец (close на стороне агента)
+        name, capacity, available = state
+        self.__init__(SharedMemory(name=name), capacity, available, owner=False)
+
+    def write(self, data) -> None:
+        view = memoryview(data).cast("B")
+        if len(view) > self.capacity:
+            view = view[-self.capacity:]
+        n = len(view)
+        buf = self._shm.buf
+        written = _COUNTER.unpack_from(buf, 0)[0]
+        pos = written % self.capacity
+        first = min(n, self.capacity - pos)
+        start = _HEADER.size + pos
+        buf[start:start + first] = view[:first]
+        if first < n:
+            buf[_HEADER.size:_HEADER.size + n - first] = view[first:]
+        _COUNTER.pack_into(buf, 0, written + n)
+        self._available.release()
+
+    def read(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Весь накопленный звук (не больше ёмкости) или None, если за timeout ничего не пришло."""
+        while True:
+            if not self._available.acquire(timeout=timeout):
+                return None
+            # Забираем сразу всё записанное — лишние сигналы семафора снимаем
+            while self._available.acquire(block=False):
+                pass
+            buf = self._shm.buf
+            written, read = _HEADER.unpack_from(buf, 0)
+            if written - read > self.capacity:
+                self.dropped += written - read - self.capacity
+                read = written - self.capacity
+            n = written - read
+            if n == 0:
+                # Сигнал от записи, которую уже забрали прошлым чтением
+                continue
+            pos = read % self.capacity
+            first = min(n, self.capacity - pos)
+            start = _HEADER.size + pos
+            data = bytes(buf[start:start + first])
+            if first < n:
+                data += bytes(buf[_HEADER.size:_HEADER.size + n - first])
+            _COUNTER.pack_into(buf, _COUNTER.size, written)
+            return data
+
+    def close(self) -> None:
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _speech_main(model_path: str, samplerate: int, blocksize: int, capture: bool,
+                 recognizer_factory: Optional[Callable], ring: AudioRing, events,
+                 muted, stop) -> None:
+    """Тело процесса распознавания."""
+    try:
+        if recognizer_factory is not None:
+            rec = recognizer_factory(samplerate)
+        else:
+            import vosk
+            rec = vosk.KaldiRecognizer(vosk.Model(model_path), samplerate)
+        stream = None
+        if capture:
+            import sounddevice as sd
+
+            def callback(indata, frames, time_, status):
+                if status:
+                    print(status, file=sys.stderr)
+                if not muted.is_set():
+                    ring.write(indata)
+            stream = sd.RawInputStream(samplerate=samplerate, blocksize=blocksize, dtype="int16",
+                                       channels=1, callback=callback)
+            stream.start()
+    except Exception as e:
+        events.put(("error", f"{type(e).__name__}: {e}"))
+        ring.close()
+        return
+
+    events.put(("ready", os.getpid()))
+    try:
+        while not stop.is_set():
+            data = ring.read(timeout=0.5)
+            if not data:
+                continue
+            if rec.AcceptWaveform(data):
+                events.put(("final", json.loads(rec.Result()).get("text", "")))
+            else:
+                events.put(("partial", json.loads(rec.PartialResult()).get("partial", "")))
+    except Exception as e:
+        events.put(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        if stream is not None:
+            stream.close()
+        ring.close()
+
+
+class SpeechProcess:
+    """Процесс захвата и распознавания речи.
+
+    События — кортежи ("final" | "partial", текст) в том же порядке, в каком
+    раньше главный цикл получал Result() и PartialResult() от KaldiRecognizer.
+    recognizer_factory(samplerate) заменяет Vosk (функция уровня модуля:
+    она передаётся в процесс по имени).
+    """
+
+    def __init__(self, model_path: str, samplerate: int = 16000, blocksize: int = 8000,
+                 capture: bool = True, recognizer_factory: Optional[Callable] = None,
+                 ring_seconds: float = 10.0):
+        ctx = multiprocessing.get_context("spawn")
+        self.ring = AudioRing.create(int(samplerate * 2 * ring_seconds), ctx)
+        self._events = ctx.Queue()
+        self._muted = ctx.Event()
+        self._stop = ctx.Event()
+        self._process = ctx.Process(
+            target=_speech_main, name="vera-speech", daemon=True,
+            args=(model_path, samplerate, blocksize, capture, recognizer_factory,
+                  self.ring, self._events, self._muted, self._stop),
+        )
+
+    def start(self, timeout: float = 120.0) -> int:
+        """Запускает процесс и ждёт загрузки модели. Возвращает pid процесса."""
+        self._process.start()
+        try:
+            kind, value = self._events.get(timeout=timeout)
+        except queue.Empty:
+            self.shutdown()
+            raise RuntimeError("процесс распознавания не запустился")
+        if kind != "ready":
+            self.shutdown()
+            raise RuntimeError(value)
+        return value
+
+    def set_muted(self, muted: bool) -> None:
+        if muted:
+            self._muted.set()
+        else:
+            self._muted.clear()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[tuple[str, str]]:
+        """Следующее событие или None по истечении timeout."""
+        try:
+            kind, value = self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if kind == "error":
+            raise RuntimeError(f"ошибка процесса распознавания: {value}")
+        return kind, value
+
+    def events(self, should_stop: Callable[[], bool]) -> Iterator[tuple[str, str]]:
+        while not should_stop():
+            event = self.get(timeout=0.5)
+            if event is not None:
+                yield event
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._process.is_alive():
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+        self.ring.close()
@@ -0,0 +1,137 @@
+"""Фазы запуска агента: замер времени, параллельная загрузка и отложенный импорт.
+
+startup() в main/agent.py делит запуск на именованные фазы. Независимые
+фазы (модели llama.cpp и Vosk, индекс приложений, классификатор намерений)
+выполняются в отдельных потоках. Тяжёлые пакеты веб-поиска, Telegram и документов
+импортируются при первом вызове через lazy_function. С ключом
+--profile-startup печатается время каждой фазы и самые медленные импорты
+(по python -X importtime).
+"""
+import importlib
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable
+
+PROFILE_FLAG = "--profile-startup"
+
+
+def profiling_requested() -> bool:
+    return PROFILE_FLAG in sys.argv
+
+
+class StartupProfiler:
+    """Время фаз запуска (по настенным часам) и поток, в котором они шли."""
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases: list[tuple[str, float, str]] = []  # (фаза, секунды, поток)
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.phases.append((name, elapsed, threading.current_thread().name))
+
+    def run_parallel(self, **jobs: Callable[[], Any]) -> dict[str, Any]:
+        """Выполняет независимые фазы в отдельных потоках и ждёт все.
+
+        Возвращает результаты по именам; исключение первой упавшей фазы
+        пробрасывается вызывающему после завершения остальных.
+        """
+        results: dict[str, Any] = {}
+        errors: dict[str, BaseException] = {}
+
+        def run(name: str, job: Callable[[], Any]) -> None:
+            try:
+                with self.phase(name):
+                    results[name] = job()
+            except BaseException as e:
+                errors[name] = e
+
+        threads = [threading.Thread(target=run, args=(name, job), name=f"startup-{name}", daemon=True)
+                   for name, job in jobs.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name in jobs:
+            if name in errors:
+                raise errors[name]
+        return results
+
+    def total(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def report(self) -> str:
+        lines = ["[STARTUP] Фазы запуска:"]
+        for name, elapsed, thread in self.phases:
+            where = "" if thread == "MainThread" else f"  ({thread})"
+            lines.append(f"  {name:<16} {elapsed * 1000:8.0f} мс{where}")
+        lines.append(f"  {'итого':<16} {self.total() * 1000:8.0f} мс")
+        return "\n".join(lines)
+
+
+def import_offenders(module: str = "main.agent", top: int = 15) -> list[tuple[float, float, str]]:
+    """Самые медленные импорты module в отдельном процессе: (суммарно мс, собственное мс, модуль).
+
+    Импорт main.agent не загружает моделей (загрузка — в startup()), поэтому
+    замер показывает только стоимость импорта пакетов.
+    """
+    if getattr(sys, "frozen", False):
+        # В сборке PyInstaller sys.executable — сам Vera.exe, а не интерпретатор
+        print("[STARTUP] Замер импортов доступен только при запуске из исходников")
+        return []
+    try:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[STARTUP] Не удалось замерить импорты: {e}")
+        return []
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.strip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def format_offenders(rows: list[tuple[float, float, str]]) -> str:
+    lines = ["[STARTUP] Самые медленные импорты (суммарно / собственное время):"]
+    for cumulative, own, name in rows:
+        lines.append(f"  {cumulative:8.1f} мс {own:8.1f} мс  {name}")
+    return "\n".join(lines)
+
+
+def lazy_function(module: str, name: str) -> Callable:
+    """Функция name из module, которая импортирует модуль при первом вызове.
+
+    __name__ совпадает с исходной функцией: по нему маршрутизация определяет
+    намерение обработчика (HANDLER_INTENTS).
+    """
+    target: list[Callable] = []
+    lock = threading.Lock()
+
+    def call(*args, **kwargs):
+        if not target:
+            with lock:
+                if not target:
+                    target.append(getattr(importlib.import_module(module), name))
+        return target[0](*args, **kwargs)
+
+    call.__name__ = call.__qualname__ = name
+    call.__module__ = module
+    return call
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from main.model_lock import PreemptibleLock
+
+SUMMARY_PROMPT = (
+    "Сожми разговор голосовой помощницы Веры с пользователем в краткую сводку "
+    "на русском (до 5 предложений). Сохрани факты о пользователе, его просьбы "
+    "и договорённости, опусти приветствия и повторы. Ответь только сводкой."
+)
+
+
+class ConversationSummarizer:
+    """Фоновое сжатие старых реплик диалога в краткую сводку.
+
+    Когда история в CONV_HISTORY превышает порог токенов, во время простоя
+    (между репликами пользователя) старые реплики заменяются сводкой, а в
+    истории остаются только последние keep_turns ходов. Модель берётся только
+    если свободна, а запрос пользователя прерывает сжатие.
+    """
+
+    def __init__(self, history: deque, count_tokens: Callable[[str], int],
+                 generate: Callable[[list], str], llm_lock: PreemptibleLock,
+                 threshold_tokens: int = 2048, keep_turns: int = 2,
+                 idle_seconds: float = 5.0,
+                 get_summary: Callable[[], str] = lambda: "",
+                 set_summary: Optional[Callable[[str], None]] = None):
+        self._history = history
+        self._count_tokens = count_tokens
+        self._generate = generate
+        self._llm_lock = llm_lock
+        self.threshold_tokens = threshold_tokens
+        self.keep_turns = keep_turns
+        self.idle_seconds = idle_seconds
+        # Сводка хранится снаружи (HistoryLogger), чтобы переживать перезапуск и очистку истории
+        self._get_summary = get_summary
+        self._set_summary = set_summary
+
+        self._cond = threading.Condition()
+        self._last_activity = time.monotonic()
+        self._pending = False  # touch() был после последней проверки порога
+        self._quit = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def touch(self) -> None:
+        """Отмечает активность пользователя и будит поток для проверки порога."""
+        with self._cond:
+            self._last_activity = time.monotonic()
+            self._pending = True
+            self._cond.notify()
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._quit = True
+            self._cond.notify()
+
+    def history_tokens(self) -> int:
+        return sum(self._count_tokens(m.get("content") or "") for m in list(self._history))
+
+    def _over_threshold(self) -> bool:
+        return len(self._history) > self.keep_turns * 2 and self.history_tokens() > self.threshold_tokens
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                # Спим до следующей активности (touch() до входа в wait не теряется);
+                # после неё ждём, пока пользователь замолчит
+                while not self._pending and not self._quit:
+                    self._cond.wait()
+                self._pending = False
+                while not self._quit:
+                    idle = time.monotonic() - self._last_activity
+                    if idle >= self.idle_seconds:
+                        break
+                    self._cond.wait(self.idle_seconds - idle)
+                if self._quit:
+                    return
+            try:
+                if self._over_threshold():
+                    self.summarize_once()
+            except Exception as e:
+                print(f"[SUMMARY] Ошибка сжатия истории: {e}")
+
+    def summarize_once(self) -> bool:
+        """Сжимает старые реплики в сводку. False — модель занята или сжимать нечего."""
+        # Если модель занята запросом, откладываем до следующего простоя
+        if not self._llm_lock.acquire_background():
+            return False
+        try:
+            old = list(self._history)[:-self.keep_turns * 2] if self.keep_turns else list(self._history)
+            if not old:
+                return False
+            dialogue = "\n".join(
+                f"{'Пользователь' if m.get('role') == 'user' else 'Вера'}: {m.get('content', '')}" for m in old
+            )
+            previous = self._get_summary()
+            if previous:
+                dialogue = f"Сводка прошлого разговора: {previous}\n\n{dialogue}"
+            messages = [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": dialogue},
+            ]
+            summary = self._generate(messages)
+            if self._llm_lock.should_yield():
+                return False  # Генерацию оборвал запрос пользователя — сводка неполная
+        finally:
+            self._llm_lock.release()
+
+        summary = re.sub(r"<think>.*?</think>", "", summary or "", flags=re.DOTALL).strip()
+        if not summary:
+            return False
+        # Удаляем из истории ровно сжатые реплики: новые за это время добавлялись только в конец
+        old_ids = {id(m) for m in old}
+        while self._history and id(self._history[0]) in old_ids:
+            self._history.popleft()
+        print(f"[SUMMARY] Сжато реплик: {len(old)}, сводка: {len(summary)} симв.")
+        if self._set_summary:
+            self._set_summary(summary)
+        return True
@@ -0,0 +1,124 @@
+import json
+import re
+from typing import Optional
+
+# Тег вызова инструмента из system_prompt.txt
+TOOL_CALL_TAG = "<|tool_call|>"
+
+WEB_SEARCH_SCHEMA = {
+    "type": "object",
+    "properties": {"query": {"type": "string"}},
+    "required": ["query"],
+}
+
+_BASE_RULES = {
+    "ws": '[ ]?',
+    "nl": '[\\n]?',
+    "string": '"\\"" ( [^"\\\\\\x7F\\x00-\\x1F] | "\\\\" ( ["\\\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] ) )* "\\""',
+    "integer": '"-"? [0-9]+',
+    "number": '"-"? [0-9]+ ( "." [0-9]+ )?',
+    "boolean": '"true" | "false"',
+    # Обычный ответ: непустой текст без последовательности "<|", т.е. без тегов вызова
+    "text": '[^<] ( [^<] | "<" [^|] )*',
+}
+
+
+def _literal(value: str) -> str:
+    """GBNF-литерал для строки."""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _json_literal(value) -> str:
+    """GBNF-литерал для JSON-значения (const / enum)."""
+    return _literal(json.dumps(value, ensure_ascii=False))
+
+
+class _GrammarBuilder:
+    """Перевод подмножества JSON Schema (object, array, string, integer, number,
+    boolean, enum, const, anyOf) в правила GBNF."""
+
+    def __init__(self):
+        self.rules: dict[str, str] = dict(_BASE_RULES)
+
+    def _add(self, name: str, body: str) -> str:
+        name = re.sub(r"[^a-z0-9-]", "-", name.lower())
+        base, i = name, 2
+        while name in self.rules and self.rules[name] != body:
+            name = f"{base}-{i}"
+            i += 1
+        self.rules[name] = body
+        return name
+
+    def visit(self, schema: dict, name: str) -> str:
+        if "const" in schema:
+            return self._add(name, _json_literal(schema["const"]))
+        if "enum" in schema:
+            return self._add(name, " | ".join(_json_literal(v) for v in schema["enum"]))
+        if "anyOf" in schema:
+            alts = [self.visit(s, f"{name}-{i}") for i, s in enumerate(schema["anyOf"])]
+            return self._add(name, " | ".join(alts))
+        kind = schema.get("type")
+        if kind == "object":
+            return self._object(schema, name)
+        if kind == "array":
+            item = self.visit(schema.get("items", {"type": "string"}), f"{name}-item")
+            return self._add(name, f'"[" ws ( {item} ( "," ws {item} )* )? ws "]"')
+        if kind in ("string", "integer", "number", "boolean"):
+            return kind
+        raise ValueError(f"Неподдерживаемая схема: {schema}")
+
+    def _object(self, schema: dict, name: str) -> str:
+        props = schema.get("properties", {})
+        required = [k for k in props if k in schema.get("required", [])]
+        optional = [k for k in props if k not in required]
+        parts = []
+        for i, key in enumerate(required):
+            value = self.visit(props[key], f"{name}-{key}")
+            sep = "" if i == 0 else '"," ws '
+            parts.append(f'{sep}{_json_literal(key)} ws ":" ws {value}')
+        for key in optional:
+            # Необязательные поля — в порядке объявления, каждое можно пропустить
+            value = self.visit(props[key], f"{name}-{key}")
+            sep = '"," ws ' if required else ""
+            parts.append(f'( {sep}{_json_literal(key)} ws ":" ws {value} )?')
+        body = " ".join(parts)
+        return self._add(name, f'"{{" ws {body} ws "}}"' if body else '"{" ws "}"')
+
+    def render(self, root: str) -> str:
+        lines = [f"root ::= {root}"]
+        lines += [f"{name} ::= {body}" for name, body in self.rules.items()]
+        return "\n".join(lines) + "\n"
+
+
+def build_tool_call_grammar(schemas: dict) -> str:
+    """GBNF: либо обычный текст, либо один вызов инструмента по схеме его аргументов.
+
+    Грамматика заканчивается на закрывающей скобке JSON, поэтому генерация
+    останавливается сразу, как только объект вызова закрыт.
+    """
+    builder = _GrammarBuilder()
+    calls = []
+    for tool_name, schema in schemas.items():
+        args = builder.visit(schema, f"args-{tool_name}")
+        calls.append(builder._add(
+            f"call-{tool_name}",
+            f'"{{" ws "\\"name\\"" ws ":" ws {_json_literal(tool_name)} ws "," ws '
+            f'"\\"arguments\\"" ws ":" ws {args} ws "}}"',
+        ))
+    call = builder._add("call", f'{_literal(TOOL_CALL_TAG)} nl ( {" | ".join(calls)} )')
+    return builder.render(f"{call} | text")
+
+
+def parse_tool_call_reply(text: str) -> Optional[dict]:
+    """Разбирает ответ, сгенерированный по грамматике: вызов инструмента или None для текста."""
+    s = (text or "").strip()
+    if not s.startswith(TOOL_CALL_TAG):
+        return None
+    payload = s[len(TOOL_CALL_TAG):].strip()
+    if payload.endswith(TOOL_CALL_TAG):
+        payload = payload[:-len(TOOL_CALL_TAG)].strip()
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and data.get("name") else None
@@ -1,6 +1,10 @@
-from .read_document import execute_read_document
-from .code_interpreter import execute_code_interpreter
-from .telegram import execute_telegram_tool
+from main.startup import lazy_function
+
+# Модули инструментов импортируются при первом вызове: telethon, python-docx и PyPDF2
+# нужны не в каждом сеансе и заметно замедляют запуск
+execute_read_document = lazy_function(f"{__name__}.read_document", "execute_read_document")
+execute_code_interpreter = lazy_function(f"{__name__}.code_interpreter", "execute_code_interpreter")
+execute_telegram_tool = lazy_function(f"{__name__}.telegram", "execute_telegram_tool")
 
 TOOLS = {
     "read_document": execute_read_document,
@@ -8,4 +12,49 @@ TOOLS = {
     "telegram": execute_telegram_tool,
 }
 
-__all__ = ["TOOLS", "execute_read_document", "execute_code_interpreter", "execute_telegram_tool"]
+
+def _telegram_action(action: str, **fields) -> dict:
+    return {
+        "type": "object",
+        "properties": {"action": {"const": action}, **fields},
+        "required": ["action", *fields],
+    }
+
+
+_STRING = {"type": "string"}
+
+# JSON-схемы аргументов инструментов: по ним строится грамматика вызова (main/tool_grammar.py)
+TOOL_SCHEMAS = {
+    "read_document": {
+        "type": "object",
+        "properties": {"filename": _STRING},
+        "required": ["filename"],
+    },
+    "code_interpreter": {
+        "type": "object",
+        "properties": {"code": _STRING},
+        "required": ["code"],
+    },
+    "telegram": {
+        "anyOf": [
+            _telegram_action("send_message", contact=_STRING, message=_STRING),
+            _telegram_action("send_batch", recipients={
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"contact": _STRING, "message": _STRING},
+                    "required": ["contact", "message"],
+                },
+            }),
+            _telegram_action("read_chat", contact=_STRING),
+            _telegram_action("start_auth", phone=_STRING),
+            _telegram_action("enter_code", code=_STRING),
+            _telegram_action("enter_password", password=_STRING),
+            _telegram_action("check_auth"),
+            _telegram_action("check_who_wrote"),
+            _telegram_action("logout"),
+        ],
+    },
+}
+
+__all__ = ["TOOLS", "TOOL_SCHEMAS", "execute_read_document", "execute_code_interpreter", "execute_telegram_tool"]
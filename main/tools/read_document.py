@@ -97,7 +97,8 @@ def _read_pdf(file_path: Path) -> str:
     return "\n".join(text_parts)
 
 
-def read_document(filename: str) -> str:
+def read_document(filename: str, max_length: int = MAX_TEXT_LENGTH) -> str:
+    """Текст документа; max_length <= 0 — без обрезки (для пересказа по частям)."""
     print(f"[READ_DOC] Поиск файла: {filename}")
     
     # Ищем файл через общую функцию из file_operations
@@ -131,8 +132,8 @@ def read_document(filename: str) -> str:
                 return f"Формат файла '{suffix}' не поддерживается."
         
         # Обрезаем слишком длинный текст
-        if len(content) > MAX_TEXT_LENGTH:
-            content = content[:MAX_TEXT_LENGTH] + f"\n\n[... текст обрезан, всего {len(content)} символов]"
+        if 0 < max_length < len(content):
+            content = content[:max_length] + f"\n\n[... текст обрезан, всего {len(content)} символов]"
         
         if not content.strip():
             return f"Файл '{file_path.name}' пустой."
@@ -0,0 +1,278 @@
+"""Трассировка задержек по этапам обработки фразы.
+
+trace() открывает трассу реплики с собственным id, span(stage) замеряет этап
+внутри текущей трассы: распознавание, маршрутизацию, каждый опробованный
+обработчик, загрузку и разбор страниц, генерацию модели. Текущая трасса
+хранится в contextvars; для пулов потоков контекст передаётся через bind().
+Вне трассы span() почти ничего не стоит, поэтому фоновые вызовы (сжатие
+истории, прогрев) не замеряются.
+
+Законченная трасса — одна строка JSON в data/traces.jsonl (при превышении
+размера файл переименовывается в traces.jsonl.1). Этапы, которые
+завершаются позже трассы (начало звучания ответа), дописываются отдельной
+строкой с тем же trace_id. stage_stats() считает p50/p95 по этапам для /stats.
+"""
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+_enabled = True
+_path: Optional[Path] = None
+_max_bytes = 5 * 1024 * 1024
+_write_lock = threading.Lock()
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("vera_trace", default=None)
+
+# Этапы, которые закончатся после трассы: ключ -> (trace_id, начало трассы, начало этапа, этап).
+# complete() может прийти раньше expect() (озвучивание из кэша) — тогда ждёт его в _completed
+_pending: dict[Any, tuple[str, float, float, str]] = {}
+_completed: dict[Any, float] = {}
+_late_order: deque = deque()
+_LATE_MAX = 64
+
+
+def configure(path: Path, enabled: bool = True, max_mb: float = 5) -> None:
+    global _enabled, _path, _max_bytes
+    _enabled = enabled
+    _path = Path(path)
+    _max_bytes = int(max_mb * 1024 * 1024)
+
+
+class Span:
+    """Этап трассы; set() добавляет к нему атрибуты (число токенов, адрес, ошибка)."""
+
+    __slots__ = ("attrs", "active")
+
+    def __init__(self, active: bool):
+        self.attrs: dict[str, Any] = {}
+        self.active = active
+
+    def set(self, **attrs) -> None:
+        if self.active:
+            self.attrs.update(attrs)
+
+
+class Trace:
+    def __init__(self, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, seconds: float, attrs: Optional[dict] = None) -> None:
+        entry = {"stage": stage, "start_ms": round((start - self.started) * 1000, 2),
+                 "ms": round(seconds * 1000, 2)}
+        if attrs:
+            entry.update(attrs)
+        with self._lock:
+            self.spans.append(entry)
+
+    def record(self) -> dict:
+        return {"trace_id": self.id, "ts": _timestamp(self.wall), **self.attrs,
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 2), "spans": self.spans}
+
+
+def _timestamp(wall: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(wall)) + f".{int(wall % 1 * 1000):03d}"
+
+
+@contextmanager
+def trace(**attrs):
+    """Трасса одной реплики (attrs — источник и текст). Вложенный вызов продолжает внешнюю трассу."""
+    if not _enabled or _current.get() is not None:
+        yield _current.get()
+        return
+    tr = Trace(**attrs)
+    token = _current.set(tr)
+    try:
+        yield tr
+    finally:
+        _current.reset(token)
+        _write(tr.record())
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    tr = _current.get()
+    if tr is None:
+        yield Span(False)
+        return
+    sp = Span(True)
+    sp.attrs.update(attrs)
+    start = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        tr.add(stage, start, time.perf_counter() - start, sp.attrs)
+
+
+def record(stage: str, seconds: float, **attrs) -> None:
+    """Этап, замеренный до начала трассы (например, распознавание речи до её открытия)."""
+    tr = _current.get()
+    if tr is not None:
+        tr.add(stage, time.perf_counter() - seconds, seconds, attrs)
+
+
+def current_id() -> Optional[str]:
+    tr = _current.get()
+    return tr.id if tr is not None else None
+
+
+def bind(fn: Callable) -> Callable:
+    """fn, выполняемая в копии текущего контекста: спаны из пула потоков попадут в трассу."""
+    return partial(contextvars.copy_context().run, fn)
+
+
+def expect(key: Any, stage: str) -> None:
+    """Запоминает начало этапа, который завершится после трассы (complete(key))."""
+    tr = _current.get()
+    if tr is None:
+        return
+    now = time.perf_counter()
+    with _write_lock:
+        finished = _completed.pop(key, None)
+        if finished is None:
+            _pending[key] = (tr.id, tr.started, now, stage)
+            _remember(key)
+    if finished is not None:
+        _write_late(tr.id, tr.started, now, finished, stage)
+
+
+def complete(key: Any) -> None:
+    now = time.perf_counter()
+    with _write_lock:
+        item = _pending.pop(key, None)
+        if item is None:
+            _completed[key] = now
+            _remember(key)
+    if item is not None:
+        _write_late(*item[:3], now, item[3])
+
+
+def _remember(key: Any) -> None:
+    # Ключи без пары (реплика без трассы, отменённая речь) не копятся
+    _late_order.append(key)
+    while len(_late_order) > _LATE_MAX:
+        old = _late_order.popleft()
+        _pending.pop(old, None)
+        _completed.pop(old, None)
+
+
+def _write_late(trace_id: str, trace_start: float, start: float, end: float, stage: str) -> None:
+    _write({"trace_id": trace_id, "ts": _timestamp(time.time()),
+            "spans": [{"stage": stage, "start_ms": round((start - trace_start) * 1000, 2),
+                       "ms": round(max(0.0, end - start) * 1000, 2)}]})
+
+
+def _llama_context(llm):
+    # SerializedModel -> Llama -> _LlamaContext -> указатель llama_context
+    model = getattr(llm, "model", llm)
+    return getattr(getattr(model, "_ctx", None), "ctx", None)
+
+
+def traced_completion(llm, stage: str = "llm", **kwargs) -> dict:
+    """llm.create_chat_completion с этапом в трассе: токены промпта и ответа, скорость их обработки.
+
+    Раздельное время обработки промпта и генерации берётся из счётчиков
+    llama.cpp (llama_perf_context), если они доступны; иначе скорость
+    считается по всему вызову.
+    """
+    with span(stage) as sp:
+        ctx = _llama_context(llm) if sp.active else None
+        perf = None
+        if ctx is not None:
+            try:
+                import llama_cpp
+                llama_cpp.llama_perf_context_reset(ctx)
+                perf = llama_cpp
+            except Exception:
+                perf = None
+        t0 = time.perf_counter()
+        result = llm.create_chat_completion(**kwargs)
+        elapsed = time.perf_counter() - t0
+        if sp.active:
+            usage = result.get("usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            sp.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            data = None
+            if perf is not None:
+                try:
+                    data = perf.llama_perf_context(ctx)
+                except Exception:
+                    data = None
+            if data is not None and data.t_eval_ms > 0:
+                sp.set(prompt_eval_ms=round(data.t_p_eval_ms, 1), generation_ms=round(data.t_eval_ms, 1),
+                       prompt_tps=round(data.n_p_eval / (data.t_p_eval_ms / 1000), 1) if data.t_p_eval_ms > 0 else None,
+                       generation_tps=round(data.n_eval / (data.t_eval_ms / 1000), 1))
+            elif elapsed > 0 and completion_tokens:
+                sp.set(generation_tps=round(completion_tokens / elapsed, 1))
+    return result
+
+
+def _write(entry: dict) -> None:
+    if _path is None:
+        return
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _write_lock:
+        try:
+            if _path.exists() and _path.stat().st_size + len(line) > _max_bytes:
+                _path.replace(_path.with_name(_path.name + ".1"))
+            with _path.open("a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            print(f"[TRACE] Не удалось записать трассу: {e}")
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def stage_stats(path: Optional[Path] = None, last: int = 1000) -> list[tuple[str, int, float, float]]:
+    """(этап, число замеров, p50 мс, p95 мс) по последним last строкам трасс, включая итог реплики."""
+    path = Path(path or _path)
+    lines: deque = deque(maxlen=last)
+    for file in (path.with_name(path.name + ".1"), path):
+        try:
+            with file.open(encoding="utf-8") as f:
+                lines.extend(f)
+        except OSError:
+            continue
+    durations: dict[str, list[float]] = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if "total_ms" in entry:
+            durations.setdefault("total", []).append(entry["total_ms"])
+        for sp in entry.get("spans", ()):
+            durations.setdefault(sp["stage"], []).append(sp["ms"])
+    stats = []
+    for stage, values in durations.items():
+        values.sort()
+        stats.append((stage, len(values), _percentile(values, 0.5), _percentile(values, 0.95)))
+    stats.sort(key=lambda row: row[3], reverse=True)
+    return stats
+
+
+def format_stats(stats: list[tuple[str, int, float, float]]) -> str:
+    if not stats:
+        return "[STATS] Трасс пока нет."
+    width = max(24, max(len(row[0]) for row in stats) + 2)
+    lines = ["[STATS] Задержки по этапам, мс:", f"  {'этап':<{width}}{'число':>7}{'p50':>10}{'p95':>10}"]
+    for stage, count, p50, p95 in stats:
+        lines.append(f"  {stage:<{width}}{count:>7}{p50:>10.1f}{p95:>10.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,361 @@
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import wave
+from collections import deque
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+from main.tts_cache import AudioCache
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+
+# Фразы, которые озвучиваются постоянно — рендерятся заранее при старте потока
+STOCK_PHRASES = (
+    "Я слушаю. Какую команду выполнить?",
+    "Таймер отключён.",
+    "Команды выполнены.",
+)
+
+# Разбиение на предложения: пока звучит одно, следующее уже синтезируется
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+")
+
+# Аудио для плеера: WAV-буфер в памяти или готовый файл из дискового кэша
+Audio = Union[bytes, Path]
+
+
+def wav_duration(wav: Audio) -> float:
+    """Длительность WAV (буфер или файл) в секундах."""
+    try:
+        source = str(wav) if isinstance(wav, Path) else io.BytesIO(wav)
+        with wave.open(source, "rb") as w:
+            rate = w.getframerate() or 1
+            return w.getnframes() / float(rate)
+    except Exception:
+        return 0.0
+
+
+class WavPlayer:
+    """Асинхронное воспроизведение WAV через winsound с возможностью остановки."""
+
+    def __init__(self):
+        self._slot = 0
+        self._dir = Path(tempfile.gettempdir())
+
+    def play(self, wav: Audio) -> float:
+        """Запускает воспроизведение и сразу возвращает длительность в секундах."""
+        if isinstance(wav, Path):
+            # Попадание в дисковый кэш: играем файл как есть, без копирования
+            path = wav
+        else:
+            # winsound не поддерживает SND_MEMORY | SND_ASYNC, поэтому играем из файла.
+            # Два файла по очереди: следующий буфер пишется, пока звучит предыдущий.
+            path = self._dir / f"vera_tts_{os.getpid()}_{self._slot}.wav"
+            self._slot ^= 1
+            path.write_bytes(wav)
+        winsound.PlaySound(str(path), winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_NODEFAULT)
+        return wav_duration(wav)
+
+    def stop(self) -> None:
+        try:
+            winsound.PlaySound(None, 0)
+        except Exception:
+            pass
+
+
+class TTSWorker:
+    """Фоновый поток синтеза речи.
+
+    Поток спит на условной переменной, пока очередь пуста. Каждый вызов speak()
+    получает id, по которому реплику можно отменить. Пока звучит текущее
+    предложение, следующее синтезируется в WAV-буфер. Если задан дисковый кэш,
+    повторяющиеся ответы берутся из него без синтеза. on_audio_start(id)
+    вызывается, когда у реплики зазвучало первое предложение.
+    """
+
+    def __init__(self, settings: dict, stock_phrases: Iterable[str] = STOCK_PHRASES,
+                 engine_factory: Optional[Callable] = None, player=None,
+                 cache: Optional[AudioCache] = None,
+                 on_audio_start: Optional[Callable[[int], None]] = None):
+        self._settings = dict(settings)
+        self._on_audio_start = on_audio_start
+        self._started_id: Optional[int] = None
+        self._cache = cache
+        self._stock_phrases = tuple(stock_phrases)
+        self._engine_factory = engine_factory or (pyttsx3.init if pyttsx3 else None)
+        self._player = player if player is not None else (WavPlayer() if winsound else None)
+        self._engine = None
+        self._render_path = Path(tempfile.gettempdir()) / f"vera_tts_{os.getpid()}_render.wav"
+
+        self._cond = threading.Condition()
+        self._queue: deque[tuple[int, str]] = deque()  # (id реплики, предложение)
+        self._next_id = 1
+        self._current_id: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._quit = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Готовые фразы — байты в памяти: файлы дискового кэша вытесняются по LRU
+        self._phrase_cache: dict[str, bytes] = {}
+        self._prefetched: Optional[tuple[int, str, Audio]] = None
+        self._settings_changed = False
+
+    # --- Публичный API -------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def speak(self, text: str, interrupt: bool = True) -> int:
+        """Ставит текст в очередь. При interrupt=True прерывает текущую речь. Возвращает id реплики."""
+        text = (text or "").strip()
+        if text in self._stock_phrases:
+            sentences = [text]  # Готовая фраза из кэша звучит целиком
+        else:
+            sentences = [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s.strip()]
+        if interrupt:
+            self.stop()
+        with self._cond:
+            utt_id = self._next_id
+            self._next_id += 1
+            for s in sentences:
+                self._queue.append((utt_id, s))
+            self._cond.notify()
+        return utt_id
+
+    def cancel(self, utt_id: int) -> bool:
+        """Отменяет конкретную реплику (в очереди или звучащую сейчас)."""
+        with self._cond:
+            before = len(self._queue)
+            self._queue = deque(item for item in self._queue if item[0] != utt_id)
+            removed = before != len(self._queue)
+            if self._prefetched and self._prefetched[0] == utt_id:
+                self._prefetched = None
+            playing = self._current_id == utt_id
+            if playing:
+                self._current_id = None
+                self._stop_event.set()
+        if playing:
+            self._stop_playback()
+        return removed or playing
+
+    def stop(self) -> None:
+        """Прерывает текущую речь и очищает очередь."""
+        with self._cond:
+            self._queue.clear()
+            self._prefetched = None
+            self._current_id = None
+            self._stop_event.set()
+        self._stop_playback()
+
+    def shutdown(self, timeout: float = 0.5) -> None:
+        with self._cond:
+            self._quit = True
+            self._queue.clear()
+            self._current_id = None
+            self._stop_event.set()
+            self._cond.notify_all()
+        self._stop_playback()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._cache is not None:
+            self._cache.flush()
+
+    def update_settings(self, settings: dict) -> None:
+        """Новые голос, скорость и громкость; движок перенастраивается в потоке синтеза перед следующей репликой."""
+        with self._cond:
+            self._settings = dict(settings)
+            self._settings_changed = True
+
+    def is_speaking(self) -> bool:
+        with self._cond:
+            return self._current_id is not None or bool(self._queue)
+
+    # --- Поток синтеза -------------------------------------------------
+
+    def _init_engine(self) -> None:
+        engine = self._engine_factory()
+        self._configure_engine(engine)
+        self._engine = engine
+
+    def _configure_engine(self, engine) -> None:
+        voices = engine.getProperty('voices')
+        voice_index = self._settings.get("voice_index", 0)
+        if voices and 0 <= voice_index < len(voices):
+            engine.setProperty('voice', voices[voice_index].id)
+        engine.setProperty('rate', self._settings.get("rate", 180))
+        engine.setProperty('volume', self._settings.get("volume", 1.0))
+
+    def _apply_settings(self) -> None:
+        with self._cond:
+            if not self._settings_changed:
+                return
+            self._settings_changed = False
+            # Готовые фразы и синтезированное заранее звучат старым голосом
+            self._phrase_cache.clear()
+            self._prefetched = None
+        self._configure_engine(self._engine)
+
+    def _synthesize(self, text: str) -> Optional[bytes]:
+        self._engine.save_to_file(text, str(self._render_path))
+        self._engine.runAndWait()
+        try:
+            return self._render_path.read_bytes()
+        except Exception:
+            return None
+
+    def _cache_key(self, text: str) -> str:
+        s = self._settings
+        return AudioCache.make_key(text, s.get("voice_index"), s.get("rate"), s.get("volume"))
+
+    def _render(self, text: str) -> Optional[Audio]:
+        cached = self._phrase_cache.get(text)
+        if cached is not None:
+            return cached
+        if self._cache is None:
+            return self._synthesize(text)
+        key = self._cache_key(text)
+        path = self._cache.get(key)
+        if path is not None:
+            return path
+        wav = self._synthesize(text)
+        if wav:
+            self._cache.put(key, wav)
+        return wav
+
+    def _prerender_stock_phrases(self) -> None:
+        for phrase in self._stock_phrases:
+            if self._quit:
+                return
+            try:
+                wav = self._render(phrase)
+                if isinstance(wav, Path):
+                    wav = wav.read_bytes()
+                if wav:
+                    self._phrase_cache[phrase] = wav
+            except Exception as e:
+                print(f"[TTS] Не удалось подготовить фразу '{phrase}': {e}")
+
+    def _take_prefetched(self, utt_id: int, text: str) -> Optional[Audio]:
+        with self._cond:
+            item = self._prefetched
+            self._prefetched = None
+        if item and item[0] == utt_id and item[1] == text:
+            return item[2]
+        return None
+
+    def _prefetch_next(self) -> None:
+        """Синтезирует следующее предложение очереди, пока звучит текущее."""
+        with self._cond:
+            if not self._queue:
+                return
+            utt_id, text = self._queue[0]
+        wav = self._render(text)
+        if wav is None:
+            return
+        with self._cond:
+            # Очередь могла измениться во время синтеза
+            if self._queue and self._queue[0] == (utt_id, text):
+                self._prefetched = (utt_id, text, wav)
+
+    def _speak_direct(self, text: str) -> None:
+        """Фолбэк без плеера: синхронная речь через движок."""
+        self._engine.say(text)
+        self._engine.runAndWait()
+
+    def _audio_started(self, utt_id: int) -> None:
+        if self._on_audio_start is None or self._started_id == utt_id:
+            return
+        self._started_id = utt_id
+        try:
+            self._on_audio_start(utt_id)
+        except Exception as e:
+            print(f"[TTS] Ошибка обработчика начала речи: {e}")
+
+    def _play(self, utt_id: int, text: str) -> None:
+        if self._player is None:
+            self._audio_started(utt_id)
+            self._speak_direct(text)
+            return
+        wav = self._take_prefetched(utt_id, text) or self._render(text)
+        with self._cond:
+            if self._current_id != utt_id or wav is None:
+                return  # Реплику отменили во время синтеза
+            # Запуск под блокировкой: stop()/cancel() не проскочат между проверкой и play()
+            self._stop_event.clear()
+            started = time.monotonic()
+            duration = self._player.play(wav)
+        self._audio_started(utt_id)
+        self._prefetch_next()
+        remaining = duration - (time.monotonic() - started)
+        if remaining > 0:
+            self._stop_event.wait(remaining)
+
+    def _loop(self) -> None:
+        while True:
+            if self._cache is not None:
+                with self._cond:
+                    idle = not self._queue
+                if idle:
+                    # Индекс LRU записывается, когда очередь опустела, а не после каждого предложения
+                    self._cache.flush()
+            with self._cond:
+                while not self._queue and not self._quit:
+                    self._cond.wait()
+                if self._quit:
+                    return
+                utt_id, text = self._queue.popleft()
+                self._current_id = utt_id
+            try:
+                self._apply_settings()
+                self._play(utt_id, text)
+            except Exception as e:
+                print(f"[TTS] Ошибка озвучивания: {e}")
+            with self._cond:
+                if self._current_id == utt_id and not any(i == utt_id for i, _ in self._queue):
+                    self._current_id = None
+
+    def _stop_playback(self) -> None:
+        if self._player is not None:
+            self._player.stop()
+        elif self._engine is not None:
+            try:
+                self._engine.stop()
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        if self._engine_factory is None:
+            print("[TTS] pyttsx3 не установлен, озвучивание недоступно")
+            return
+        retry_count = 0
+        max_retries = 3
+
+        while retry_count < max_retries and not self._quit:
+            try:
+                self._init_engine()
+                if self._player is not None and not self._phrase_cache:
+                    self._prerender_stock_phrases()
+                self._loop()
+                return  # Нормальное завершение
+            except Exception as e:
+                retry_count += 1
+                print(f"[TTS] Критическая ошибка TTS потока (попытка {retry_count}/{max_retries}): {e}")
+                if retry_count >= max_retries:
+                    print("[TTS] ФАТАЛЬНО: TTS поток остановлен после множественных сбоев")
+                    print("[TTS] Агент продолжит работу, но озвучивание недоступно")
+                    break
+                time.sleep(1)  # Пауза перед повторной попыткой
@@ -0,0 +1,120 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from user.json_storage import load_json, save_json
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_tts_key_text(text: str) -> str:
+    """Нормализует текст для ключа кэша: регистр и пробелы не влияют на звучание."""
+    return _WS_RE.sub(" ", (text or "").strip().lower())
+
+
+class AudioCache:
+    """Дисковый кэш синтезированной речи.
+
+    Ключ — хэш нормализованного текста и параметров голоса (голос, скорость,
+    громкость). Файлы вытесняются по LRU, когда суммарный размер превышает max_bytes.
+    Порядок LRU сохраняется на диск только по flush(): его вызывает владелец
+    кэша (поток TTS в простое и при завершении), а не каждый get()/put().
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = cache_dir / "index.json"
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # ключ -> размер в байтах
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def make_key(text: str, voice, rate, volume) -> str:
+        raw = f"{normalize_tts_key_text(text)}|{voice}|{rate}|{volume}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.wav"
+
+    def _load(self) -> None:
+        data = load_json(self._index_path, {})
+        indexed = list(data.get("lru", []))
+        # Файлы, записанные после последнего flush() (сбой процесса), считаются самыми старыми
+        known = set(indexed)
+        try:
+            orphans = [f.stem for f in self.cache_dir.glob("*.wav") if f.stem not in known]
+        except OSError:
+            orphans = []
+        # Порядок в индексе — от давно использованных к недавним
+        for key in orphans + indexed:
+            path = self._path(key)
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def flush(self) -> None:
+        """Сохраняет порядок LRU на диск."""
+        with self._lock:
+            if not self._dirty:
+                return
+            keys = list(self._entries.keys())
+            self._dirty = False
+        save_json(self._index_path, {"lru": keys}, "TTS_CACHE")
+
+    def get(self, key: str) -> Optional[Path]:
+        """Путь к WAV из кэша или None."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            if not path.exists():
+                self._total_bytes -= self._entries.pop(key)
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            self._dirty = True
+            return path
+
+    def put(self, key: str, wav: bytes) -> Optional[Path]:
+        if not wav or len(wav) > self.max_bytes:
+            return None
+        path = self._path(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(wav)
+        except Exception as e:
+            print(f"[TTS_CACHE] Ошибка записи: {e}")
+            return None
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(wav)
+            self._total_bytes += len(wav)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(old_key)
+            self._dirty = True
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+        return path
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
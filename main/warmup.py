@@ -0,0 +1,188 @@
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from main.model_lock import PreemptibleLock
+
+_PREFETCH_CHUNK = 16 * 1024 * 1024
+
+# Шаблон системного сообщения chatml (как в llama_cpp.llama_chat_format.format_chatml)
+_CHATML_SYSTEM = "<|im_start|>system\n{content}<|im_end|>\n"
+
+
+class ModelWarmup:
+    """Фоновый прогрев модели при старте и после долгого простоя.
+
+    Прогрев состоит из трёх шагов: чтение файла модели (страницы mmap попадают
+    в файловый кэш ОС), вычисление префикса системного промпта (KV-кэш
+    llama.cpp переиспользует его в следующем запросе) и крошечная генерация.
+    Все шаги уступают модель запросу пользователя через PreemptibleLock.
+    """
+
+    def __init__(self, llm, lock: PreemptibleLock, model_path: str,
+                 system_prompt: Callable[[], str], chat_format: str = "",
+                 idle_seconds: float = 600.0, prefetch: bool = True,
+                 logits_processor: Optional[Callable] = None):
+        self._llm = llm
+        self._lock = lock
+        self._model_path = Path(model_path) if model_path else None
+        self._system_prompt = system_prompt
+        self._chat_format = chat_format
+        self.idle_seconds = idle_seconds
+        self._prefetch_enabled = prefetch
+        self._logits_processor = logits_processor
+
+        self._cond = threading.Condition()
+        self._last_activity = time.monotonic()
+        self._quit = False
+        self._thread: Optional[threading.Thread] = None
+        self._warm = False  # Прогрев уже выполнен после последней активности
+        self._report_next: Optional[str] = "cold"  # Какой первый ответ ещё не отражён в логе
+        # "cold" — первая работа модели после загрузки (префикс и генерация прогрева либо
+        # запрос пользователя, опередивший прогрев), "warm" — первый ответ после прогрева
+        self.first_response_ms: dict[str, float] = {}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def touch(self) -> None:
+        """Отмечает активность пользователя: отсчёт простоя начинается заново."""
+        with self._cond:
+            self._last_activity = time.monotonic()
+            self._warm = False
+            self._cond.notify()
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._quit = True
+            self._cond.notify()
+
+    def record_response(self, seconds: float) -> None:
+        """Учитывает время ответа модели; первый ответ после старта/прогрева пишется в лог."""
+        with self._cond:
+            kind = self._report_next
+            self._report_next = None
+        if kind is None:
+            return
+        ms = seconds * 1000
+        self.first_response_ms[kind] = ms
+        label = "после прогрева" if kind == "warm" else "без прогрева (холодный старт)"
+        print(f"[WARMUP] Первый ответ модели {label}: {ms:.0f} мс")
+
+    # --- Шаги прогрева -------------------------------------------------
+
+    def _prefetch_file(self) -> int:
+        """Читает файл модели, чтобы страницы весов оказались в кэше ОС. Возвращает прочитанные байты."""
+        if not self._prefetch_enabled or self._model_path is None or not self._model_path.is_file():
+            return 0
+        total = 0
+        buf = bytearray(_PREFETCH_CHUNK)
+        with self._model_path.open("rb", buffering=0) as f:
+            while not self._quit and not self._lock.should_yield():
+                n = f.readinto(buf)
+                if not n:
+                    break
+                total += n
+        return total
+
+    def _prime_prefix(self) -> int:
+        """Вычисляет префикс системного промпта порциями по n_batch. Возвращает число токенов."""
+        if self._chat_format != "chatml":
+            return 0
+        llm = self._llm
+        prefix = _CHATML_SYSTEM.format(content=self._system_prompt())
+        tokens = llm.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+        # Часть префикса может уже лежать в KV-кэше (прошлый прогрев или запрос)
+        cached = 0
+        for a, b in zip(list(llm.input_ids[:llm.n_tokens]), tokens):
+            if a != b:
+                break
+            cached += 1
+        if cached == len(tokens):
+            return cached
+        if cached == 0:
+            llm.reset()
+        else:
+            llm.n_tokens = cached  # eval() сам отбросит KV-кэш после этой позиции
+        step = max(1, int(getattr(llm, "n_batch", 512)))
+        for i in range(cached, len(tokens), step):
+            if self._lock.should_yield() or self._quit:
+                break  # Уже вычисленная часть префикса тоже пригодится запросу
+            llm.eval(tokens[i:i + step])
+        return llm.n_tokens
+
+    def _tiny_generation(self) -> None:
+        kwargs = {"max_tokens": 1, "temperature": 0.0}
+        if self._logits_processor is not None:
+            kwargs["logits_processor"] = self._logits_processor
+        self._llm.create_chat_completion(
+            messages=[
+                {"role": "system", "content": self._system_prompt()},
+                {"role": "user", "content": "Привет"},
+            ],
+            **kwargs,
+        )
+
+    def warm_once(self) -> bool:
+        """Один прогрев. False — прерван запросом пользователя или модель занята."""
+        t0 = time.perf_counter()
+        prefetched = self._prefetch_file()
+        t_prefetch = time.perf_counter() - t0
+
+        if not self._lock.acquire_background():
+            return False
+        try:
+            t1 = time.perf_counter()
+            primed = self._prime_prefix()
+            t_prime = time.perf_counter() - t1
+            if self._lock.should_yield():
+                return False
+            t2 = time.perf_counter()
+            self._tiny_generation()
+            t_gen = time.perf_counter() - t2
+            if self._lock.should_yield():
+                return False
+        finally:
+            self._lock.release()
+
+        with self._cond:
+            self._warm = True
+            cold = self._report_next == "cold"
+            self._report_next = "warm"
+            if cold:
+                # Прогрев при старте первым обратился к модели: его префикс и генерация — холодный замер
+                self.first_response_ms["cold"] = (t_prime + t_gen) * 1000
+        if cold:
+            print(f"[WARMUP] Первый ответ модели без прогрева (холодный старт, префикс и 1 токен): "
+                  f"{self.first_response_ms['cold']:.0f} мс")
+        print(f"[WARMUP] Модель прогрета: файл {prefetched / 1024 / 1024:.0f} МБ за {t_prefetch:.1f} с, "
+              f"префикс {primed} ток. за {t_prime * 1000:.0f} мс, генерация {t_gen * 1000:.0f} мс")
+        return True
+
+    def _run(self) -> None:
+        try:
+            self.warm_once()
+        except Exception as e:
+            print(f"[WARMUP] Ошибка прогрева: {e}")
+        while True:
+            with self._cond:
+                # Ждём активности, затем простоя длиной idle_seconds
+                while not self._quit and self._warm:
+                    self._cond.wait()
+                while not self._quit:
+                    idle = time.monotonic() - self._last_activity
+                    if idle >= self.idle_seconds:
+                        break
+                    self._cond.wait(self.idle_seconds - idle)
+                if self._quit:
+                    return
+            try:
+                if not self.warm_once():
+                    # Прерваны или модель занята — повторим после следующего простоя
+                    self.touch()
+            except Exception as e:
+                print(f"[WARMUP] Ошибка прогрева: {e}")
+                self.touch()
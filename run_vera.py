@@ -2,6 +2,7 @@ import sys
 import os
 import json
 import ctypes
+import multiprocessing
 
 # Устанавливаем корректный путь для PyInstaller bundle
 if getattr(sys, 'frozen', False):
@@ -132,6 +133,16 @@ def activate_existing_window(title: str):
         print(f"[INIT] Ошибка активации окна: {e}")
 
 if __name__ == "__main__":
+    # Дочерние процессы (распознавание речи, разбор страниц, пересказ документов) в сборке PyInstaller
+    multiprocessing.freeze_support()
+
+    # Сервер моделей: в сборке агент запускает его как "Vera.exe --model-server"
+    if "--model-server" in sys.argv:
+        init_data_folder()
+        from main import model_server
+        model_server.main([arg for arg in sys.argv[1:] if arg != "--model-server"])
+        sys.exit(0)
+
     # Проверка на единственный экземпляр (только для Windows)
     try:
         import win32event
@@ -0,0 +1,18 @@
+"""Перечитывание конфигурации: секции меняются на месте."""
+from main.config_manager import _update_in_place
+
+
+def test_nested_dicts_keep_identity():
+    inner = {"a": 1, "b": 2}
+    section = {"nested": inner, "stale": True}
+    _update_in_place(section, {"nested": {"a": 5}, "fresh": 1})
+    # Ссылка, сохранённая модулем, видит новые значения
+    assert section["nested"] is inner
+    assert inner == {"a": 5}
+    assert section == {"nested": {"a": 5}, "fresh": 1}
+
+
+def test_type_change_replaces_value():
+    section = {"x": {"a": 1}, "y": 3}
+    _update_in_place(section, {"x": 2, "y": {"b": 1}})
+    assert section == {"x": 2, "y": {"b": 1}}
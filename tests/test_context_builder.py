@@ -0,0 +1,92 @@
+"""ContextBuilder: бюджет токенов и стабильный префикс промпта между ходами."""
+import random
+from collections import deque
+
+from main.context_builder import MESSAGE_OVERHEAD_TOKENS, ContextBuilder
+
+SYSTEM = "ты голосовой ассистент вера"
+
+
+def whitespace_tokenize(data: bytes) -> list[str]:
+    return data.decode("utf-8").split()
+
+
+def words(n: int, word: str = "слово") -> str:
+    return " ".join([word] * n)
+
+
+def test_count_tokens_and_fallback():
+    builder = ContextBuilder(whitespace_tokenize, 100)
+    assert builder.count_tokens("раз два три") == 3
+    assert builder.message_tokens({"role": "user", "content": "раз два"}) == 2 + MESSAGE_OVERHEAD_TOKENS
+
+    def broken(data: bytes):
+        raise RuntimeError("нет модели")
+    assert ContextBuilder(broken, 100).count_tokens("абвгд") == 3
+
+
+def test_build_never_exceeds_budget():
+    rng = random.Random(7)
+    for _ in range(300):
+        budget = rng.randint(60, 600)
+        builder = ContextBuilder(whitespace_tokenize, budget, low_water=rng.choice((0.3, 0.6, 0.9)))
+        history: deque = deque()
+        for turn in range(rng.randint(1, 30)):
+            user_text = words(rng.randint(1, 40), "вопрос")
+            messages = builder.build(SYSTEM, history, user_text, summary=words(rng.randint(0, 20), "сводка"))
+            fixed = builder.message_tokens(messages[0]) + builder.message_tokens(messages[-1])
+            if fixed <= budget:
+                assert builder.prompt_tokens(messages) <= budget
+            assert messages[0]["role"] == "system" and messages[-1]["content"] == user_text
+            history.append({"role": "user", "content": user_text})
+            history.append({"role": "assistant", "content": words(rng.randint(1, 60), "ответ")})
+
+
+def test_prefix_is_stable_until_budget_is_exceeded():
+    budget, low_water = 400, 0.6
+    builder = ContextBuilder(whitespace_tokenize, budget, low_water=low_water)
+    history: deque = deque()
+    previous = None
+    shifts = 0
+    for turn in range(60):
+        user_text = words(10, f"вопрос{turn}")
+        messages = builder.build(SYSTEM, history, user_text)
+        available = budget - builder.message_tokens(messages[0]) - builder.message_tokens(messages[-1])
+        window = messages[1:-1]
+        if previous is not None and len(previous) > 2:
+            prev_window = previous[1:-1]
+            if window and window[0] is prev_window[0]:
+                # Окно не сдвинулось: прошлый промпт без запроса — префикс нового (KV-кэш переиспользуется)
+                assert messages[:len(previous) - 1] == previous[:-1]
+            else:
+                shifts += 1
+                # Окно сдвинуто сразу до low_water, а не на одно сообщение
+                assert builder.prompt_tokens(window) <= int(available * low_water)
+                # Сдвиг только тогда, когда прежнее окно с новыми репликами не помещалось
+                start = next(i for i, m in enumerate(history) if m is prev_window[0])
+                assert builder.prompt_tokens(list(history)[start:]) > available
+        if window:
+            assert window[0]["role"] == "user"
+        previous = messages
+        history.append({"role": "user", "content": user_text})
+        history.append({"role": "assistant", "content": words(20, f"ответ{turn}")})
+    # 60 ходов по ~54 токена при окне ~340 токенов: сдвиги редкие, но они есть
+    assert 3 <= shifts <= 30
+
+
+def test_window_restarts_when_first_message_leaves_history():
+    builder = ContextBuilder(whitespace_tokenize, 1000)
+    history = deque(maxlen=4)
+    for turn in range(6):
+        messages = builder.build(SYSTEM, history, f"вопрос {turn}")
+        # Первое сообщение прошлого окна вытеснено из deque: окно начинается с начала истории
+        assert messages[1:-1] == list(history)
+        history.append({"role": "user", "content": f"вопрос {turn}"})
+        history.append({"role": "assistant", "content": f"ответ {turn}"})
+
+
+def test_oversized_request_drops_history():
+    builder = ContextBuilder(whitespace_tokenize, 50)
+    history = [{"role": "user", "content": "привет"}, {"role": "assistant", "content": "здравствуй"}]
+    messages = builder.build(SYSTEM, history, words(60))
+    assert [m["role"] for m in messages] == ["system", "user"]
@@ -0,0 +1,38 @@
+"""Пересказ документов: замена экземпляра при смене настроек."""
+import threading
+
+from main.doc_summarizer import DocumentSummarizer
+
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def test_retire_waits_for_running_summary():
+    started, release = threading.Event(), threading.Event()
+
+    def generate(messages):
+        started.set()
+        release.wait(2.0)
+        return "пересказ"
+    summarizer = DocumentSummarizer(generate, _count_tokens, n_ctx=4096, max_tokens=64)
+    closed = []
+    summarizer.shutdown = lambda: closed.append(True)
+    result = []
+    worker = threading.Thread(target=lambda: result.append(summarizer.summarize("слово " * 50)))
+    worker.start()
+    assert started.wait(2.0)
+    summarizer.retire()
+    # Пул закрывается только после того, как документ дочитан
+    assert closed == []
+    release.set()
+    worker.join(2.0)
+    assert result == ["пересказ"] and closed == [True]
+
+
+def test_retire_when_idle_closes_at_once():
+    summarizer = DocumentSummarizer(lambda messages: "", _count_tokens, n_ctx=4096)
+    closed = []
+    summarizer.shutdown = lambda: closed.append(True)
+    summarizer.retire()
+    assert closed == [True]
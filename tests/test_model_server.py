@@ -0,0 +1,118 @@
+"""Протокол сервера моделей на заглушках (--fake): вызовы, отмена генерации, ключ."""
+import json
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+
+from main.model_server import (FakeLlama, ModelHost, ModelServer, ModelServerClient, ModelServerError,
+                               PreemptionFlag, RemoteLlama, RemoteRecognizer)
+
+KEY = b"k" * 32
+WORD_DELAY = 0.02
+LONG_PROMPT = " ".join(["слово"] * 50)  # ~1 с генерации заглушкой
+
+
+@pytest.fixture
+def server():
+    host = ModelHost(fake=True, fake_token_delay=WORD_DELAY)
+    host.load({})
+    srv = ModelServer(host, ("127.0.0.1", 0), KEY)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    thread.join(5)
+
+
+@pytest.fixture
+def client(server):
+    c = ModelServerClient(server.address, KEY)
+    yield c
+    c.close()
+
+
+def _chat(text: str) -> dict:
+    return {"messages": [{"role": "user", "content": text}]}
+
+
+def test_fake_llama_echo_and_tokens():
+    llm = FakeLlama()
+    assert llm.tokenize("два слова".encode("utf-8")) == [1, 6, 8]
+    reply = llm.create_chat_completion(**_chat("привет"))
+    assert reply["choices"][0]["message"]["content"] == "Эхо: привет"
+
+
+def test_rpc_calls(client):
+    info = client.call("ping")
+    assert info["ready"] and info["fake"] and not info["error"]
+    llm = RemoteLlama(client)
+    assert llm.tokenize("а бв".encode("utf-8"), False) == [4, 5]
+    assert llm.token_eos() == 2
+    assert llm.n_ctx() == 4096
+    assert llm.create_chat_completion(**_chat("как дела"))["choices"][0]["message"]["content"] == "Эхо: как дела"
+    with pytest.raises(ModelServerError, match="неизвестный метод"):
+        client.call("shutdown_now")
+    with pytest.raises(ModelServerError, match="ValueError"):
+        client.call("recognizer_call", 1, "__init__")
+
+
+def test_recognizer(client):
+    rec = RemoteRecognizer(client, 16000)
+    results = [rec.AcceptWaveform(b"\0" * 320) for _ in range(4)]
+    assert results == [False, False, False, True]
+    assert json.loads(rec.Result()) == {"text": ""}
+    rec.close()
+
+
+def test_preemptible_chat_is_cancelled(client):
+    started = time.monotonic()
+    flag = PreemptionFlag(lambda: time.monotonic() - started > 0.1)
+    reply = RemoteLlama(client).create_chat_completion(logits_processor=flag, **_chat(LONG_PROMPT))
+    words = reply["choices"][0]["message"]["content"].split()
+    assert 0 < len(words) < 30
+    assert time.monotonic() - started < 0.8
+
+
+def test_request_ids_are_unique_between_clients(server, client):
+    other = ModelServerClient(server.address, KEY)
+    try:
+        ours, theirs = client.next_request_id(), other.next_request_id()
+        assert ours != theirs
+        result = {}
+
+        def generate():
+            result["reply"] = client.call("chat", _chat(LONG_PROMPT), ours, True)
+        thread = threading.Thread(target=generate)
+        thread.start()
+        time.sleep(0.1)
+        # Другой клиент с тем же порядковым номером запроса не отменяет чужую генерацию
+        assert other.call("cancel", theirs) is False
+        thread.join(5)
+        assert len(result["reply"]["choices"][0]["message"]["content"].split()) == 51
+    finally:
+        other.close()
+
+
+def test_recognizer_does_not_wait_for_generation(client):
+    rec = RemoteRecognizer(client, 16000)
+    thread = threading.Thread(target=client.call, args=("chat", _chat(LONG_PROMPT)))
+    thread.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    rec.AcceptWaveform(b"\0" * 320)
+    assert time.monotonic() - started < 0.3
+    assert thread.is_alive()
+    thread.join(5)
+    rec.close()
+
+
+def test_wrong_key_is_rejected(server):
+    with pytest.raises(AuthenticationError):
+        Client(server.address, authkey=b"x" * 32)
+    # Сервер продолжает обслуживать клиентов с верным ключом
+    good = ModelServerClient(server.address, KEY)
+    assert good.call("ping")["ready"]
+    good.close()
@@ -0,0 +1,45 @@
+"""Составные команды: порядок ответов и контекст подкоманд в пуле."""
+import contextvars
+import time
+
+from main.multitask import execute_multitask, parse_multitask
+
+ANSWERS = {
+    "какая погода в москве": "В Москве +5.",
+    "открой блокнот": "Открываю блокнот.",
+    "скажи курс доллара": "Доллар 90 рублей.",
+    "закрой калькулятор": "Закрываю калькулятор.",
+}
+
+
+def test_responses_keep_command_order():
+    def route(cmd):
+        # Справки завершаются в обратном порядке
+        time.sleep(0.05 if "погода" in cmd else 0.0)
+        return ANSWERS[cmd]
+    text = "какая погода в москве и открой блокнот и скажи курс доллара и закрой калькулятор"
+    assert parse_multitask(text) == list(ANSWERS)
+    is_multi, response = execute_multitask(text, route)
+    assert is_multi
+    assert response == " ".join(ANSWERS.values())
+
+
+def test_many_actions_are_summarized():
+    is_multi, response = execute_multitask("открой блокнот и закрой калькулятор и открой браузер",
+                                           lambda cmd: "Готово.")
+    assert is_multi and response == "Выполнено команд: 3."
+
+
+def test_subcommand_context_does_not_leak():
+    var = contextvars.ContextVar("intent", default="")
+    seen = {}
+
+    def route(cmd):
+        var.set(cmd)
+        time.sleep(0.02)
+        seen[cmd] = var.get()
+        return cmd
+    execute_multitask("какая погода в москве и скажи курс доллара", route)
+    # Параллельные справки видят только своё значение
+    assert seen == {"какая погода в москве": "какая погода в москве",
+                    "скажи курс доллара": "скажи курс доллара"}
@@ -0,0 +1,130 @@
+"""Запуск приложений по расписанию: догон после сна и выключения, поддельные часы."""
+import datetime
+import json
+
+import pytest
+
+# main.commands подключает модули Windows (winreg, pywin32, pycaw)
+pytest.importorskip("winreg")
+
+import main.scheduler
+from main.commands import scheduled_apps
+from main.scheduler import Scheduler
+
+CATCH_UP_SEC = 30 * 60
+
+
+class FakeClock:
+    def __init__(self, start: datetime.datetime):
+        self.now = start.timestamp()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def set(self, when: datetime.datetime) -> None:
+        self.now = when.timestamp()
+
+
+@pytest.fixture
+def apps(monkeypatch, tmp_path):
+    clock = FakeClock(datetime.datetime(2024, 3, 1, 8, 0))
+    sched = Scheduler(clock=clock)
+    opened = []
+    monkeypatch.setattr(main.scheduler, "_service", sched)
+    monkeypatch.setattr(scheduled_apps, "catch_up_seconds", lambda: CATCH_UP_SEC)
+    monkeypatch.setattr(scheduled_apps, "_SCHEDULED_APPS_FILE", tmp_path / "scheduled_apps.json")
+    monkeypatch.setattr(scheduled_apps, "_OPEN_APP_CB", lambda name: opened.append(name) or True)
+    monkeypatch.setattr(scheduled_apps, "_SPEAK_CB", None)
+    scheduled_apps._scheduled_apps.clear()
+    yield clock, sched, opened
+    scheduled_apps._scheduled_apps.clear()
+
+
+def _next(sched: Scheduler) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(sched.next_deadline())
+
+
+def test_fires_at_time_and_reschedules(apps):
+    clock, sched, opened = apps
+    task = scheduled_apps.add_scheduled_app("блокнот", "09:00", "daily")
+    assert _next(sched) == datetime.datetime(2024, 3, 1, 9, 0)
+    clock.set(datetime.datetime(2024, 3, 1, 9, 0))
+    assert sched.run_pending() == 1
+    assert opened == ["блокнот"] and task.last_run == "2024-03-01-09-00"
+    assert _next(sched) == datetime.datetime(2024, 3, 2, 9, 0)
+
+
+def test_month_end(apps):
+    clock, sched, opened = apps
+    clock.set(datetime.datetime(2024, 1, 31, 23, 0))
+    scheduled_apps.add_scheduled_app("почта", "00:30", "daily")
+    once = scheduled_apps.add_scheduled_app("отчёт", "10:00", "once", "2024-02-29")
+    assert _next(sched) == datetime.datetime(2024, 2, 1, 0, 30)
+    clock.set(datetime.datetime(2024, 2, 1, 0, 30))
+    assert sched.run_pending() == 1
+    assert _next(sched) == datetime.datetime(2024, 2, 2, 0, 30)
+    # Одноразовый запуск 29 февраля срабатывает и больше не планируется;
+    # ежедневный за 02.02 давно просрочен и только пропускается
+    clock.set(datetime.datetime(2024, 2, 29, 10, 0))
+    assert sched.run_pending() == 2
+    assert opened == ["почта", "отчёт"]
+    assert not once.enabled and once.job_id == 0
+    assert _next(sched) == datetime.datetime(2024, 3, 1, 0, 30)
+
+
+def test_short_suspend_is_caught_up(apps):
+    clock, sched, opened = apps
+    scheduled_apps.add_scheduled_app("блокнот", "09:00", "daily")
+    # Сон с 8:55 до 9:20 — меньше окна догона: запуск выполняется с опозданием
+    clock.set(datetime.datetime(2024, 3, 1, 9, 20))
+    assert sched.run_pending() == 1
+    assert opened == ["блокнот"]
+    assert _next(sched) == datetime.datetime(2024, 3, 2, 9, 0)
+
+
+def test_long_suspend_skips_missed_runs_once(apps):
+    clock, sched, opened = apps
+    task = scheduled_apps.add_scheduled_app("блокнот", "09:00", "daily")
+    # Проспали три дня: один пропуск без запуска и без лавины догоняющих срабатываний
+    clock.set(datetime.datetime(2024, 3, 4, 11, 0))
+    assert sched.run_pending() == 1
+    assert opened == [] and task.last_run is None
+    assert sched.run_pending() == 0
+    assert _next(sched) == datetime.datetime(2024, 3, 5, 9, 0)
+
+
+def test_dst_keeps_wall_time(apps, monkeypatch):
+    import time
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset есть только на POSIX")
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    try:
+        clock, sched, opened = apps
+        clock.set(datetime.datetime(2024, 3, 30, 8, 0))
+        scheduled_apps.add_scheduled_app("блокнот", "09:00", "daily")
+        first = sched.next_deadline()
+        clock.now = first
+        assert sched.run_pending() == 1
+        assert sched.next_deadline() - first == 23 * 3600
+        assert _next(sched) == datetime.datetime(2024, 3, 31, 9, 0)
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
+
+
+def test_load_catches_up_runs_missed_while_off(apps):
+    clock, sched, opened = apps
+    data = [{"app_name": "блокнот", "time": "09:00", "recurring": "daily",
+             "created_at": "2024-02-01-10-00", "last_run": "2024-02-29-09-00"},
+            {"app_name": "почта", "time": "07:00", "recurring": "daily",
+             "created_at": "2024-02-01-10-00", "last_run": "2024-02-29-07-00"}]
+    scheduled_apps._SCHEDULED_APPS_FILE.write_text(json.dumps(data), encoding="utf-8")
+    # Программа была выключена до 9:10: запуск в 9:00 догоняется, в 7:00 — уже нет
+    clock.set(datetime.datetime(2024, 3, 1, 9, 10))
+    scheduled_apps._load_scheduled_apps()
+    assert sched.run_pending() == 1
+    assert opened == ["блокнот"]
+    saved = {t["app_name"]: t["last_run"]
+             for t in json.loads(scheduled_apps._SCHEDULED_APPS_FILE.read_text(encoding="utf-8"))}
+    assert saved == {"блокнот": "2024-03-01-09-10", "почта": "2024-02-29-07-00"}
@@ -0,0 +1,116 @@
+"""Планировщик и правила повторения с поддельными часами."""
+import datetime
+import threading
+import time
+
+import pytest
+
+from main.scheduler import Scheduler, next_occurrence
+
+
+class FakeClock:
+    def __init__(self, start: float):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def berlin_tz(monkeypatch):
+    """Локальное время с переходом на летнее (31.03.2024) и зимнее (27.10.2024) время."""
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset есть только на POSIX")
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def dt(*args) -> datetime.datetime:
+    return datetime.datetime(*args)
+
+
+def test_next_occurrence_month_and_year_end():
+    assert next_occurrence("00:30", "daily", dt(2024, 1, 31, 23, 59)) == dt(2024, 2, 1, 0, 30)
+    assert next_occurrence("08:00", "daily", dt(2024, 2, 28, 9, 0)) == dt(2024, 2, 29, 8, 0)
+    assert next_occurrence("08:00", "daily", dt(2023, 2, 28, 9, 0)) == dt(2023, 3, 1, 8, 0)
+    assert next_occurrence("07:00", "daily", dt(2024, 12, 31, 7, 0)) == dt(2025, 1, 1, 7, 0)
+    # Пятница 31.05 -> понедельник 03.06; суббота 30.11 -> воскресенье 01.12
+    assert next_occurrence("09:00", "weekdays", dt(2024, 5, 31, 18, 0)) == dt(2024, 6, 3, 9, 0)
+    assert next_occurrence("10:00", "weekends", dt(2024, 11, 30, 11, 0)) == dt(2024, 12, 1, 10, 0)
+
+
+def test_next_occurrence_once_and_bad_time():
+    assert next_occurrence("12:15", "once", dt(2024, 1, 1), "2024-02-29") == dt(2024, 2, 29, 12, 15)
+    assert next_occurrence("12:15", "once", dt(2024, 1, 1), "2023-02-29") is None
+    assert next_occurrence("утро", "daily", dt(2024, 1, 1)) is None
+    # Строго после after: совпадение со временем правила переносит на следующий день
+    assert next_occurrence("12:15", "daily", dt(2024, 1, 1, 12, 15)) == dt(2024, 1, 2, 12, 15)
+
+
+def test_next_occurrence_keeps_wall_time_across_dst(berlin_tz):
+    spring = next_occurrence("09:00", "daily", dt(2024, 3, 30, 9, 0))
+    autumn = next_occurrence("09:00", "daily", dt(2024, 10, 26, 9, 0))
+    assert spring == dt(2024, 3, 31, 9, 0) and autumn == dt(2024, 10, 27, 9, 0)
+    # Сутки перехода короче и длиннее 24 часов, а срабатывание остаётся в 9:00
+    assert spring.timestamp() - dt(2024, 3, 30, 9, 0).timestamp() == 23 * 3600
+    assert autumn.timestamp() - dt(2024, 10, 26, 9, 0).timestamp() == 25 * 3600
+
+
+def test_run_pending_order_and_cancel():
+    clock = FakeClock(1000.0)
+    sched = Scheduler(clock=clock)
+    fired = []
+    sched.schedule(1030, fired.append, "b")
+    sched.schedule(1010, fired.append, "a")
+    dropped = sched.schedule(1020, fired.append, "x")
+    assert sched.run_pending() == 0
+    assert sched.cancel(dropped) and not sched.cancel(dropped)
+    assert sched.next_deadline() == 1010
+    clock.now = 1030
+    assert sched.run_pending() == 2
+    assert fired == ["a", "b"] and len(sched) == 0
+
+
+def test_suspended_interval_fires_overdue_jobs_once():
+    clock = FakeClock(1000.0)
+    sched = Scheduler(clock=clock)
+    fired = []
+    for deadline in (1100, 1200, 5000):
+        sched.schedule(deadline, fired.append, deadline)
+    # Компьютер «спал» час: всё просроченное срабатывает при первом пробуждении
+    clock.now = 4600
+    assert sched.run_pending() == 2
+    assert fired == [1100, 1200]
+    assert sched.run_pending() == 0
+    assert sched.next_deadline() == 5000
+
+
+def test_thread_notices_clock_jump_within_max_wait():
+    clock = FakeClock(1000.0)
+    sched = Scheduler(clock=clock, max_wait=0.05)
+    fired = threading.Event()
+    sched.schedule(1000 + 3600, fired.set)
+    sched.start()
+    try:
+        time.sleep(0.1)
+        assert not fired.is_set()
+        # Часы ушли вперёд без уведомления планировщика (сон, перевод часов)
+        clock.now += 3600
+        assert fired.wait(1.0)
+    finally:
+        sched.shutdown()
+
+
+def test_thread_wakes_for_earlier_job():
+    sched = Scheduler()
+    fired = threading.Event()
+    sched.schedule(time.time() + 3600, lambda: None)
+    sched.start()
+    try:
+        sched.schedule(time.time() + 0.05, fired.set)
+        assert fired.wait(1.0)
+    finally:
+        sched.shutdown()
@@ -0,0 +1,38 @@
+"""Фоновое сжатие истории: пробуждение по активности пользователя."""
+import threading
+from collections import deque
+
+from main.model_lock import PreemptibleLock
+from main.summarizer import ConversationSummarizer
+
+
+def _summarizer(done: threading.Event) -> ConversationSummarizer:
+    history = deque({"role": "user" if i % 2 == 0 else "assistant", "content": "слово " * 10} for i in range(8))
+
+    def generate(messages):
+        done.set()
+        return "Сводка."
+    return ConversationSummarizer(history, lambda s: len(s.split()), generate, PreemptibleLock(),
+                                  threshold_tokens=20, keep_turns=1, idle_seconds=0.05)
+
+
+def test_touch_before_thread_waits_is_not_lost():
+    done = threading.Event()
+    summarizer = _summarizer(done)
+    # Активность до того, как поток дошёл до ожидания
+    summarizer.touch()
+    summarizer.start()
+    try:
+        assert done.wait(2.0)
+    finally:
+        summarizer.shutdown()
+
+
+def test_no_summary_without_activity():
+    done = threading.Event()
+    summarizer = _summarizer(done)
+    summarizer.start()
+    try:
+        assert not done.wait(0.2)
+    finally:
+        summarizer.shutdown()
@@ -0,0 +1,36 @@
+"""Прогрев модели: холодный и тёплый замер первого ответа."""
+from main.model_lock import PreemptibleLock
+from main.warmup import ModelWarmup
+
+
+class _Llm:
+    def __init__(self):
+        self.calls = 0
+
+    def create_chat_completion(self, messages, **kwargs):
+        self.calls += 1
+        return {"choices": [{"message": {"content": "п"}}]}
+
+
+def _warmup() -> ModelWarmup:
+    return ModelWarmup(_Llm(), PreemptibleLock(), "", lambda: "Ты Вера.", prefetch=False)
+
+
+def test_startup_warmup_is_cold_and_first_reply_is_warm():
+    warmup = _warmup()
+    assert warmup.warm_once()
+    assert set(warmup.first_response_ms) == {"cold"}
+    warmup.record_response(0.25)
+    assert warmup.first_response_ms["warm"] == 250
+    # Следующие ответы замеры не меняют
+    warmup.record_response(1.0)
+    assert warmup.first_response_ms["warm"] == 250
+
+
+def test_reply_before_warmup_is_cold():
+    warmup = _warmup()
+    warmup.record_response(0.5)
+    assert warmup.warm_once()
+    assert warmup.first_response_ms == {"cold": 500}
+    warmup.record_response(0.1)
+    assert warmup.first_response_ms["warm"] == 100
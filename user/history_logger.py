@@ -13,6 +13,7 @@ class HistoryEntry:
     user_text: str
     assistant_response: str
     command_type: str = "general"  # general, web_search, app_control, etc.
+    intent: str = ""  # Кто ответил: намерение обработчика, web_search, llm (разметка для классификатора)
     
     def to_dict(self) -> dict:
         return asdict(self)
@@ -31,6 +32,7 @@ class HistoryLogger:
         self.file_path = file_path
         self.max_entries = max_entries
         self.entries: List[HistoryEntry] = []
+        self.summary: str = ""  # Сводка старой части разговора для LLM
         self._load()
     
     def _load(self) -> None:
@@ -39,6 +41,7 @@ class HistoryLogger:
             HistoryEntry.from_dict(e) 
             for e in data.get('history', [])
         ]
+        self.summary = data.get('summary', '')
     
     def _save(self) -> None:
         # Ограничиваем размер истории
@@ -48,6 +51,7 @@ class HistoryLogger:
         data = {
             'history': [e.to_dict() for e in self.entries],
             'total_interactions': len(self.entries),
+            'summary': self.summary,
             'last_updated': time.time()
         }
         save_json(self.file_path, data, "История")
@@ -56,17 +60,23 @@ class HistoryLogger:
         self, 
         user_text: str, 
         assistant_response: str, 
-        command_type: str = "general"
+        command_type: str = "general",
+        intent: str = ""
     ) -> None:
         entry = HistoryEntry(
             timestamp=time.time(),
             user_text=user_text.strip(),
             assistant_response=assistant_response.strip(),
-            command_type=command_type
+            command_type=command_type,
+            intent=intent
         )
         self.entries.append(entry)
         self._save()
     
+    def set_summary(self, summary: str) -> None:
+        self.summary = summary.strip()
+        self._save()
+    
     def get_recent(self, count: int = 10) -> List[HistoryEntry]:
         return self.entries[-count:] if self.entries else []
     
@@ -94,6 +104,7 @@ class HistoryLogger:
         """Очищает историю. Возвращает количество удалённых записей."""
         count = len(self.entries)
         self.entries.clear()
+        self.summary = ""
         self._save()
         return count
     
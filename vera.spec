@@ -55,6 +55,24 @@ project_hiddenimports = [
     # модули проекта
     'main',
     'main.agent',
+    'main.activation',
+    'main.context_builder',
+    'main.summarizer',
+    'main.model_lock',
+    'main.warmup',
+    'main.llm_tuning',
+    'main.tool_grammar',
+    'main.intent_classifier',
+    'main.response_cache',
+    'main.doc_summarizer',
+    'main.scheduler',
+    'main.indexed_store',
+    'main.startup',
+    'main.model_server',
+    'main.speech_process',
+    'main.tracing',
+    'main.tts',
+    'main.tts_cache',
     'main.config_manager',
     'main.lang_ru',
     'main.multitask',
@@ -72,6 +90,7 @@ project_hiddenimports = [
     'web',
     'web.async_fetch',
     'web.currency',
+    'web.parse_pool',
     'web.weather',
     'web.web_search',
     'web.web_utils',
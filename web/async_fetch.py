@@ -4,7 +4,9 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple
 from threading import Lock
 
-from web.web_utils import DEFAULT_HEADERS, extract_visible_text
+from main.tracing import bind, span
+from web.parse_pool import visible_text
+from web.web_utils import DEFAULT_HEADERS
 
 
 def _fetch_single_url(
@@ -12,6 +14,13 @@ def _fetch_single_url(
     timeout: float = 3.0,
     max_bytes: int = 70000
 ) -> Tuple[str, str]:
+    with span("fetch.page", url=url) as sp:
+        url, text = _download(url, timeout, max_bytes)
+        sp.set(chars=len(text))
+        return url, text
+
+
+def _download(url: str, timeout: float, max_bytes: int) -> Tuple[str, str]:
     try:
         headers = DEFAULT_HEADERS.copy()
         resp = requests.get(
@@ -44,8 +53,8 @@ def _fetch_single_url(
         except Exception:
             html = buf.decode("utf-8", errors="ignore")
         
-        # Парсим текст
-        text = extract_visible_text(html)[:1500]
+        # Парсим текст (в пуле процессов, если он включён)
+        text = visible_text(html)[:1500]
         return url, text
         
     except Exception:
@@ -66,10 +75,10 @@ def fetch_urls_sync(
     # Используем ThreadPoolExecutor для параллельных запросов
     max_workers = min(len(urls), 10)  # Не больше 10 потоков
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Запускаем все задачи
+    with span("fetch", urls=len(urls)) as sp, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Запускаем все задачи (в контексте трассы текущей фразы)
         future_to_url = {
-            executor.submit(_fetch_single_url, url, timeout): url 
+            executor.submit(bind(_fetch_single_url), url, timeout): url 
             for url in urls
         }
         
@@ -101,5 +110,6 @@ def fetch_urls_sync(
                         
             except Exception:
                 continue
+        sp.set(sources=len(results))
     
     return results
@@ -0,0 +1,60 @@
+"""Разбор HTML в пуле процессов.
+
+BeautifulSoup на чистом Python держит GIL: пока потоки загрузки разбирают
+страницы, распознавание речи и TTS в процессе агента ждут. С
+processes.web_parse_workers > 0 разбор уходит в отдельные процессы, а поток
+загрузки только ждёт результата (без GIL). Модуль лёгкий: requests и
+BeautifulSoup импортируются при первом разборе.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from main.tracing import span
+
+_workers = 0
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def set_parse_workers(workers: int) -> None:
+    global _workers
+    _workers = max(0, int(workers))
+
+
+def _extract(html: str) -> str:
+    from web.web_utils import extract_visible_text
+    return extract_visible_text(html)
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: fork процесса с потоками агента небезопасен
+            _pool = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def visible_text(html: str) -> str:
+    """extract_visible_text в пуле процессов или, если пул выключен, в текущем потоке."""
+    pool = _get_pool()
+    with span("parse", kb=len(html) // 1024, pool=pool is not None):
+        if pool is None:
+            return _extract(html)
+        try:
+            return pool.submit(_extract, html).result()
+        except Exception as e:
+            print(f"[WEB] Ошибка разбора в пуле процессов, разбираю в потоке: {e}")
+            return _extract(html)
+
+
+def shutdown_parse_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -6,6 +6,7 @@ from urllib.parse import urlparse, quote_plus
 from typing import Optional
 import requests
 
+from main.tracing import span, traced_completion
 from web.web_utils import get_default_headers, fetch_url, search_duckduckgo
 
 _WEB_SUMMARY_PROMPT = """Ты — Вера, голосовая помощница. Тебе дан контекст из веб-поиска.
@@ -111,7 +112,9 @@ def web_search_answer(query: str, web_cfg: dict, system_prompt: str, llm, last_s
             return answer
         # else:
             # print(f"[CACHE] Кэш пропущен для запроса: {query}")
-    links = _get_search_links(query, web_cfg)
+    with span("search") as sp:
+        links = _get_search_links(query, web_cfg)
+        sp.set(links=len(links))
     if not links:
         return "Не нашла подходящих результатов."
 
@@ -219,7 +222,7 @@ def web_search_answer(query: str, web_cfg: dict, system_prompt: str, llm, last_s
     except Exception:
         gen_args["max_tokens"] = int(web_cfg.get("llm_max_tokens", 128))
     try:
-        result = llm.create_chat_completion(messages=messages, **gen_args)
+        result = traced_completion(llm, "llm.web", messages=messages, **gen_args)
         answer = result["choices"][0]["message"]["content"].strip()
         # Удаляем теги мышления, если они все же появились
         answer = re.sub(r"<think>.*?</think>", "", answer, flags=re.DOTALL).strip()
@@ -5,6 +5,8 @@ from bs4 import BeautifulSoup
 from typing import Optional, List
 from urllib.parse import urlparse, quote_plus
 
+from web.parse_pool import visible_text
+
 # Пул User-Agent для ротации (минимизация блокировок)
 _USER_AGENTS = [
     # Chrome Windows
@@ -191,7 +193,7 @@ def fetch_url(url: str, headers: dict, web_cfg: dict, log_page_errors: bool = Fa
             html = buf.decode(enc, errors="ignore")
         except Exception:
             html = buf.decode("utf-8", errors="ignore")
-        text = extract_visible_text(html)[:web_per_page_limit]
+        text = visible_text(html)[:web_per_page_limit]
         if not text:
             return None
         return url, text